@@ -0,0 +1,56 @@
+"""Бенчмарк параллельного опроса: время цикла по числу тенантов и потоков.
+Для каждой пары (тенантов, потоков) прогоняет bench_pipeline на локальной
+замене API Практикума и Telegram и печатает медиану цикла и ускорение
+относительно опроса по очереди.
+
+    python benchmarks/bench_fanout.py --tenants 10 50 200 \
+        --workers 1 4 16 --latency 0.02
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import run  # noqa: E402
+
+HEADER = '{:>8} {:>8} {:>12} {:>12} {:>10}'.format(
+    'тенантов', 'потоков', 'цикл p50, с', 'опросов/с', 'ускорение')
+ROW = '{tenants:>8} {workers:>8} {p50:>12.4f} {polls_per_second:>12.1f} ' \
+      '{speedup:>9.1f}x'
+
+
+def sweep(tenants, workers, cycles=5, latency=0.02, homeworks=1):
+    """Результаты run для всех сочетаний числа тенантов и потоков."""
+    results = []
+    for count in tenants:
+        baseline = None
+        for size in workers:
+            result = run(count, cycles, latency, homeworks, workers=size)
+            baseline = baseline or result['p50']
+            result['speedup'] = baseline / result['p50']
+            results.append(result)
+    return results
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает таблицу."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, nargs='+',
+                        default=[10, 50, 200])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16],
+                        help='размеры пула; первый - база для ускорения')
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='задержка ответа API, с')
+    parser.add_argument('--homeworks', type=int, default=1,
+                        help='работ в каждом ответе API')
+    args = parser.parse_args()
+    print(HEADER)
+    for result in sweep(args.tenants, args.workers, args.cycles,
+                        args.latency, args.homeworks):
+        print(ROW.format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Бенчмарк журнала переходов: запись и запросы на миллионах записей.
+Пишет журнал с N переходами (работы проходят reviewing -> rejected ->
+reviewing -> approved) и замеряет запросы через mmap.
+
+    python benchmarks/bench_history.py --transitions 2000000
+"""
+import argparse
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from poller.history import HistoryLog, HistoryReader  # noqa: E402
+
+CYCLE = ('reviewing', 'rejected', 'reviewing', 'approved')
+REPORT = (
+    'переходов {transitions}, получателей {tenants}, файл {file_mb:.1f} МБ\n'
+    '  запись                {write:10.3f} с\n'
+    '  медиана в reviewing   {time_in:10.3f} с ({median_hours:.2f} ч)\n'
+    '  отказы одного тенанта {rejections:10.3f} с ({rejected} шт.)\n'
+    '  пиковый RSS           {rss_mb:10.1f} МБ'
+)
+
+
+def write(path, transitions, tenants):
+    """Пишет журнал и возвращает время записи."""
+    started = time.perf_counter()
+    history = HistoryLog(path)
+    moment = 1790000000
+    for number in range(transitions):
+        homework, step = divmod(number, len(CYCLE))
+        moment += 600
+        history.append(f'student-{homework % tenants}', f'hw-{homework}',
+                       CYCLE[step - 1] if step else None, CYCLE[step],
+                       moment, moment + 5)
+    history.close()
+    return time.perf_counter() - started
+
+
+def timed(function):
+    """Результат function и время его вычисления."""
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+
+def run(transitions=2000000, tenants=1000):
+    """Замеры для журнала с transitions переходами."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'history.bin')
+        write_seconds = write(path, transitions, tenants)
+        with HistoryReader(path) as reader:
+            durations, time_in = timed(lambda: reader.time_in('reviewing'))
+            rejected, rejections = timed(lambda: list(reader.select(
+                'student-7', status='rejected')))
+        file_mb = os.path.getsize(path) / 1024 / 1024
+    return dict(
+        transitions=transitions,
+        tenants=tenants,
+        file_mb=file_mb,
+        write=write_seconds,
+        time_in=time_in,
+        median_hours=statistics.median(durations) / 3600,
+        rejections=rejections,
+        rejected=len(rejected),
+        rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    )
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает отчёт."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transitions', type=int, default=2000000)
+    parser.add_argument('--tenants', type=int, default=1000)
+    args = parser.parse_args()
+    print(REPORT.format(**run(args.transitions, args.tenants)))
+
+
+if __name__ == '__main__':
+    main()
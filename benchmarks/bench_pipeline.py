@@ -0,0 +1,121 @@
+"""Сквозной бенчмарк цепочки опрос -> проверка -> уведомление.
+Запускает локальную замену API Практикума и Telegram (poller.standin)
+и гоняет через неё настоящие функции модуля homework.
+
+    python benchmarks/bench_pipeline.py --tenants 200 --latency 0.01
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import homework  # noqa: E402
+from poller.engine import PollingEngine  # noqa: E402
+from poller.schedule import PollSchedule  # noqa: E402
+from poller.standin import STATUSES, StandIn  # noqa: E402
+from poller.tenants import Tenant, TenantRegistry  # noqa: E402
+
+TELEGRAM_TOKEN = '1234:benchmark'
+REPORT = (
+    'тенантов {tenants}, потоков {workers}, циклов {cycles}, '
+    'задержка API {latency} с, работ в ответе {homeworks}\n'
+    '  опросов/с           {polls_per_second:10.1f}\n'
+    '  уведомлений/с       {messages_per_second:10.1f}\n'
+    '  цикл p50            {p50:10.4f} с\n'
+    '  цикл p99            {p99:10.4f} с\n'
+    '  пиковый RSS         {rss_mb:10.1f} МБ'
+)
+
+
+def percentile(values, share):
+    """Значение, ниже которого лежит доля share измерений."""
+    ordered = sorted(values)
+    return ordered[min(int(share * len(ordered)), len(ordered) - 1)]
+
+
+def make_registry(tenants):
+    """Реестр из tenants тенантов с токенами token-N."""
+    registry = TenantRegistry()
+    for number in range(tenants):
+        registry.add(Tenant(id=str(number), token=f'token-{number}',
+                            chat_id=str(number)))
+    return registry
+
+
+def build_engine(standin, tenants, **options):
+    """Движок, который опрашивает всех тенантов в каждом цикле."""
+    import telegram
+
+    homework.ENDPOINT = standin.endpoint
+    bot = telegram.Bot(token=TELEGRAM_TOKEN, base_url=standin.telegram_url)
+    return PollingEngine(
+        make_registry(tenants),
+        fetch=homework.get_api_answer,
+        check=homework.check_response,
+        parse=homework.parse_status,
+        send=partial(homework.send_message, bot),
+        error_template=homework.MESSAGE_ERRORS,
+        schedule=PollSchedule(dict.fromkeys(STATUSES, 0), idle=0,
+                              minimum=0, maximum=0),
+        **options,
+    )
+
+
+def run(tenants=50, cycles=20, latency=0.0, homeworks=1, comment_size=0,
+        change_every=3, telegram_latency=0.0, workers=1):
+    """Прогоняет cycles циклов и возвращает показатели."""
+    with StandIn(latency=latency, homeworks=homeworks,
+                 comment_size=comment_size, change_every=change_every,
+                 telegram_latency=telegram_latency) as standin:
+        engine = build_engine(standin, tenants, workers=workers)
+        durations = []
+        started = time.perf_counter()
+        for _ in range(cycles):
+            cycle_started = time.perf_counter()
+            engine.run_once()
+            durations.append(time.perf_counter() - cycle_started)
+        elapsed = time.perf_counter() - started
+    return dict(
+        tenants=tenants,
+        workers=workers,
+        cycles=cycles,
+        latency=latency,
+        homeworks=homeworks,
+        polls_per_second=standin.polls / elapsed,
+        messages_per_second=standin.messages / elapsed,
+        p50=percentile(durations, 0.5),
+        p99=percentile(durations, 0.99),
+        rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    )
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает отчёт."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, default=50)
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='задержка ответа API, с')
+    parser.add_argument('--homeworks', type=int, default=1,
+                        help='работ в каждом ответе API')
+    parser.add_argument('--comment-size', type=int, default=0,
+                        help='длина комментария ревьюера, символов')
+    parser.add_argument('--change-every', type=int, default=3,
+                        help='статус меняется каждые N опросов (0 - никогда)')
+    parser.add_argument('--telegram-latency', type=float, default=0.0,
+                        help='задержка ответа Telegram, с')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='размер пула потоков опроса')
+    args = parser.parse_args()
+    print(REPORT.format(**run(
+        args.tenants, args.cycles, args.latency, args.homeworks,
+        args.comment_size, args.change_every, args.telegram_latency,
+        args.workers)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Бенчмарк памяти: работы из ответа API словарями и записями Homework.
+Строит ответ API с N работами, разбирает его json.loads и сравнивает
+память, которую занимают список словарей, список записей после
+check_response и индекс статусов тенанта, построенный из тех и других.
+
+    python benchmarks/bench_records.py --homeworks 100000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import homework  # noqa: E402
+from poller.diff import homework_key  # noqa: E402
+
+STATUSES = ('reviewing', 'rejected', 'approved')
+REPORT = (
+    'работ {homeworks}\n'
+    '  словари из json           {raw_mb:10.1f} МБ\n'
+    '  записи Homework           {records_mb:10.1f} МБ\n'
+    '  индекс статусов: словари  {raw_index_mb:10.1f} МБ\n'
+    '  индекс статусов: записи   {records_index_mb:10.1f} МБ\n'
+    '  check_response            {check_seconds:10.4f} с'
+)
+
+
+def make_body(homeworks, comment_size=200):
+    """Тело ответа API с homeworks работами, как их отдаёт Практикум."""
+    return json.dumps({'homeworks': [
+        {'id': number,
+         'status': STATUSES[number % 3],
+         'homework_name': f'student__hw{number % 20}.zip',
+         'reviewer_comment': 'x' * comment_size,
+         'date_updated': '2026-10-18T10:00:00Z',
+         'lesson_name': f'Спринт {number % 20}'}
+        for number in range(homeworks)], 'current_date': 0}).encode()
+
+
+def measure(build):
+    """Результат build и память, которую он удерживает, в байтах."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def run(homeworks=100000, comment_size=200):
+    """Замеры для ответа с homeworks работами."""
+    body = make_body(homeworks, comment_size)
+    raw, raw_size = measure(lambda: json.loads(body))
+    started = time.perf_counter()
+    homework.check_response(raw)
+    check_seconds = time.perf_counter() - started
+    del raw
+    # Ответ разбирается внутри замера и сразу освобождается: в память
+    # записей и индексов входят только строки, которые они удерживают.
+    _, records_size = measure(
+        lambda: homework.check_response(json.loads(body)))
+    _, raw_index = measure(lambda: {
+        homework_key(item): item['status']
+        for item in json.loads(body)['homeworks']})
+    _, records_index = measure(lambda: {
+        homework_key(item): item.status
+        for item in homework.check_response(json.loads(body))})
+    megabyte = 1024 * 1024
+    return dict(
+        homeworks=homeworks,
+        raw_mb=raw_size / megabyte,
+        records_mb=records_size / megabyte,
+        raw_index_mb=raw_index / megabyte,
+        records_index_mb=records_index / megabyte,
+        check_seconds=check_seconds,
+    )
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает отчёт."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--homeworks', type=int, default=100000)
+    parser.add_argument('--comment-size', type=int, default=200,
+                        help='длина комментария ревьюера, символов')
+    args = parser.parse_args()
+    print(REPORT.format(**run(args.homeworks, args.comment_size)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Прогон трассы ответов API через настоящий конвейер под виртуальными часами.
+Трасса пишется ботом при TRACE_FILE или генерируется (--synthetic):
+неделя, за которую у каждого тенанта каждые 6 часов меняется статус
+одной из работ. Отчёт показывает, во сколько раз прогон быстрее
+реального времени, и проверяет, что уведомления не повторяются.
+
+    python benchmarks/bench_replay.py trace.jsonl
+    python benchmarks/bench_replay.py --synthetic 100 --days 7
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import homework  # noqa: E402
+from poller.engine import PollingEngine  # noqa: E402
+from poller.replay import (ReplayApi, VirtualClock, load_trace,  # noqa: E402
+                           replay)
+from poller.schedule import PollSchedule  # noqa: E402
+from poller.tenants import Tenant, TenantRegistry, current_tenant  # noqa
+
+STATUSES = ('reviewing', 'rejected', 'approved')
+CHANGE_EVERY = 6 * 3600
+START = 1790812800
+REPORT = (
+    'тенантов {tenants}, записей трассы {entries}, '
+    'период {hours:.1f} ч\n'
+    '  прогон                {wall:10.3f} с ({speedup:.0f}x быстрее)\n'
+    '  циклов                {cycles:10d}\n'
+    '  запросов к трассе     {requests:10d}\n'
+    '  уведомлений           {messages:10d}\n'
+    '  повторов подряд       {duplicates:10d}'
+)
+
+
+def synthetic_trace(tenants=10, days=7, poll_every=600):
+    """Трасса: каждые 6 часов у тенанта меняется статус одной из работ."""
+    trace = []
+    for number in range(tenants):
+        homeworks = {}
+        changes = 0
+        for moment in range(START, START + days * 86400, poll_every):
+            while START + changes * CHANGE_EVERY <= moment:
+                homeworks[f'hw{changes // 3}'] = (
+                    STATUSES[changes % 3], START + changes * CHANGE_EVERY)
+                changes += 1
+            trace.append({'time': moment, 'tenant': f'student-{number}',
+                          'from_date': 0, 'answer': {
+                              'homeworks': [
+                                  {'id': name, 'homework_name': name,
+                                   'status': status,
+                                   'date_updated': datetime.fromtimestamp(
+                                       updated, timezone.utc).isoformat()}
+                                  for name, (status, updated)
+                                  in sorted(homeworks.items())],
+                              'current_date': moment}})
+    return trace
+
+
+def build_engine(api, clock, sent):
+    """Движок с функциями homework и расписанием из его настроек."""
+    registry = TenantRegistry()
+    for tenant_id in api.tenants():
+        registry.add(Tenant(id=tenant_id, token='replay', chat_id=tenant_id,
+                            timestamp=int(api.start)))
+
+    def send(message):
+        sent.append((current_tenant.get().chat_id, message))
+        return True
+
+    return PollingEngine(
+        registry,
+        fetch=api,
+        check=homework.check_response,
+        parse=homework.parse_status,
+        send=send,
+        error_template=homework.MESSAGE_ERRORS,
+        schedule=PollSchedule(homework.POLL_INTERVALS,
+                              homework.POLL_INTERVAL_IDLE,
+                              homework.POLL_INTERVAL_MIN,
+                              homework.POLL_INTERVAL_MAX),
+        clock=clock,
+        overlap=homework.POLL_OVERLAP,
+    )
+
+
+def duplicates(sent):
+    """Сколько раз чат получил то же сообщение, что и предыдущее."""
+    last = {}
+    count = 0
+    for chat, message in sent:
+        count += last.get(chat) == message
+        last[chat] = message
+    return count
+
+
+def run(trace):
+    """Прогоняет трассу и возвращает показатели."""
+    clock = VirtualClock()
+    api = ReplayApi(trace, clock)
+    clock.now = api.start
+    sent = []
+    engine = build_engine(api, clock, sent)
+    started = time.perf_counter()
+    cycles = replay(engine, clock, api.end, homework.RETRY_PERIOD)
+    wall = time.perf_counter() - started
+    return dict(
+        tenants=len(api.tenants()),
+        entries=len(trace),
+        hours=(api.end - api.start) / 3600,
+        wall=wall,
+        speedup=(api.end - api.start) / wall if wall else 0,
+        cycles=cycles,
+        requests=api.requests,
+        messages=len(sent),
+        duplicates=duplicates(sent),
+        sent=sent,
+        engine=engine,
+    )
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает отчёт."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('trace', nargs='?', help='файл трассы (TRACE_FILE)')
+    parser.add_argument('--synthetic', type=int, metavar='TENANTS',
+                        help='сгенерировать трассу для TENANTS тенантов')
+    parser.add_argument('--days', type=int, default=7)
+    args = parser.parse_args()
+    if args.synthetic:
+        trace = synthetic_trace(args.synthetic, args.days)
+    elif args.trace:
+        with open(args.trace, encoding='utf-8') as file:
+            trace = load_trace(file)
+    else:
+        parser.error('нужен файл трассы или --synthetic')
+    result = run(trace)
+    print(REPORT.format(**result))
+    if result['duplicates']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Бенчмарк времени импорта модуля homework.
+Каждый замер - отдельный процесс Python, поэтому кэш модулей не мешает.
+Завершается с кодом 1, если медиана превышает бюджет или при импорте
+загрузились тяжёлые зависимости.
+
+    python benchmarks/bench_startup.py --runs 10 --budget 0.15 \
+        --record benchmarks/startup.jsonl
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Зависимости, которые должны загружаться только при первом использовании.
+HEAVY = ('telegram', 'requests', 'httpx', 'asyncio', 'http.server')
+PROBE = (
+    'import json, sys, time\n'
+    'started = time.perf_counter()\n'
+    'import homework\n'
+    'elapsed = time.perf_counter() - started\n'
+    'print(json.dumps([elapsed, [name for name in {heavy!r} '
+    'if name in sys.modules]]))\n'
+)
+REPORT = (
+    'импорт homework, замеров {runs}\n'
+    '  медиана             {median:10.4f} с\n'
+    '  максимум            {max:10.4f} с\n'
+    '  бюджет              {budget:10.4f} с\n'
+    '  тяжёлые модули      {heavy}'
+)
+OVER_BUDGET = 'Импорт homework дольше бюджета: {median:.4f} > {budget:.4f} с.'
+HEAVY_LOADED = 'При импорте homework загружены: {heavy}.'
+
+
+def measure():
+    """Время импорта homework в новом процессе и загруженные модули."""
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(heavy=HEAVY)],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run(runs=10, budget=0.15):
+    """Выполняет runs замеров и возвращает показатели."""
+    timings = []
+    heavy = set()
+    for _ in range(runs):
+        elapsed, loaded = measure()
+        timings.append(elapsed)
+        heavy.update(loaded)
+    return dict(
+        time=int(time.time()),
+        python=platform.python_version(),
+        runs=runs,
+        median=statistics.median(timings),
+        max=max(timings),
+        budget=budget,
+        heavy=sorted(heavy),
+    )
+
+
+def main():
+    """Разбирает аргументы, печатает отчёт и проверяет бюджет."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=0.15,
+                        help='допустимая медиана времени импорта, с')
+    parser.add_argument('--record', help='дописать результат в файл JSONL')
+    args = parser.parse_args()
+    result = run(args.runs, args.budget)
+    print(REPORT.format(**dict(result, heavy=', '.join(result['heavy'])
+                               or '-')))
+    if args.record:
+        with open(args.record, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(result) + '\n')
+    if result['heavy']:
+        sys.exit(HEAVY_LOADED.format(heavy=', '.join(result['heavy'])))
+    if result['median'] > args.budget:
+        sys.exit(OVER_BUDGET.format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,35 @@
 import logging
+import math
 import os
+import platform
 import time
 import sys
+import threading
+from contextlib import ExitStack
+from functools import partial
 
 from dotenv import load_dotenv
-import requests
-import telegram
+
+from poller.breaker import CLOSED, CircuitBreaker, UpstreamError
+from poller.coalesce import SingleFlight
+from poller.deadline import bounded
+from poller.engine import PollingEngine
+from poller.errors import ErrorDigest
+from poller.history import HistoryLog
+from poller.http import build_session, httpx_timeout
+from poller.lifecycle import POLL_NOW, RELOAD, Lifecycle
+from poller.logs import file_handler, start_log_listener
+from poller.metrics import API_REQUESTS, REGISTRY, serve
+from poller.outbound import OutboundQueue, QueuedBot
+from poller.outbox import Outbox
+from poller.payload import Payload, PayloadCache
+from poller.records import Homework, to_record
+from poller.replay import Recorder
+from poller.schedule import PollSchedule
+from poller.sharding import LeaseBoard, Shard
+from poller.store import StateStore
+from poller.stream import stream_payload
+from poller.tenants import Tenant, TenantRegistry, current_tenant
 
 load_dotenv()
 
@@ -13,15 +37,63 @@ load_dotenv()
 PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TENANTS_FILE = os.getenv('TENANTS_FILE')
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 0))
+HTTP_KEEPALIVE = float(os.getenv('HTTP_KEEPALIVE', 5))
+HTTP2 = os.getenv('HTTP2', '').lower() in ('1', 'true', 'yes')
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+LOOP_DEADLINE = float(os.getenv('LOOP_DEADLINE', 300))
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG').upper()
+LOG_FILE = os.getenv('LOG_FILE', __file__ + '.log')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUPS = int(os.getenv('LOG_BACKUPS', 5))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')
+SHARD_DB = os.getenv('SHARD_DB')
+SHARD_WORKER = os.getenv('SHARD_WORKER') or os.getenv('DYNO')
+SHARD_LEASE_TTL = float(os.getenv('SHARD_LEASE_TTL', 90))
+BREAKER_THRESHOLD = int(os.getenv('BREAKER_THRESHOLD', 5))
+BREAKER_BACKOFF = float(os.getenv('BREAKER_BACKOFF', 30))
+BREAKER_BACKOFF_MAX = float(os.getenv('BREAKER_BACKOFF_MAX', 1800))
+SHUTDOWN_GRACE = float(os.getenv('SHUTDOWN_GRACE', 20))
+ERROR_DIGEST_PERIOD = float(os.getenv('ERROR_DIGEST_PERIOD', 3600))
+POLL_INTERVALS = PollSchedule.parse(os.getenv('POLL_INTERVALS', ''))
+POLL_INTERVAL_IDLE = float(os.getenv('POLL_INTERVAL_IDLE', 1200))
+POLL_INTERVAL_MIN = float(os.getenv('POLL_INTERVAL_MIN', 60))
+POLL_INTERVAL_MAX = float(os.getenv('POLL_INTERVAL_MAX', 3600))
+POLL_OVERLAP = int(os.getenv('POLL_OVERLAP', 60))
+STATE_DB = os.getenv('STATE_DB')
+HISTORY_FILE = os.getenv('HISTORY_FILE')
+TRACE_FILE = os.getenv('TRACE_FILE')
+OUTBOX_DB = os.getenv('OUTBOX_DB')
+OUTBOX_BACKOFF = float(os.getenv('OUTBOX_BACKOFF', 30))
+OUTBOX_BACKOFF_MAX = float(os.getenv('OUTBOX_BACKOFF_MAX', 3600))
+STATE_BATCH_SIZE = int(os.getenv('STATE_BATCH_SIZE', 100))
+STREAM_PARSE = os.getenv('STREAM_PARSE', '').lower() in ('1', 'true', 'yes')
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 64 * 1024))
+TELEGRAM_QUEUE = os.getenv('TELEGRAM_QUEUE', '').lower() in (
+    '1', 'true', 'yes')
+TELEGRAM_RATE = float(os.getenv('TELEGRAM_RATE', 30))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', 1))
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+POLL_WORKERS = int(os.getenv('POLL_WORKERS', 1))
+ASYNC_MODE = os.getenv('ASYNC_MODE', '').lower() in ('1', 'true', 'yes')
+ASYNC_CONCURRENCY = int(os.getenv('ASYNC_CONCURRENCY', 100))
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL',
+                             'https://api.telegram.org/bot')
 
 
 RETRY_PERIOD = 600
+PAYLOAD_CACHE = PayloadCache()
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
 
 VARIABLES = ('PRACTICUM_TOKEN',
              'TELEGRAM_TOKEN',
              'TELEGRAM_CHAT_ID')
+TENANTS_VARIABLES = ('TELEGRAM_TOKEN',)
 
 HOMEWORK_VERDICTS = {
     'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
@@ -33,7 +105,7 @@ HOMEWORK_VERDICTS = {
 CHECK_VARIABLES = 'Проверьте переменные окружения! {name}.'
 SEND_MESSAGE_OK = 'Удачная отправка сообщения в Telegram: {value}'
 SEND_MESSAGE_FAIL = 'Ошибка при отправке сообщения в Telegram: {value}.{error}'
-CHECK_REQUEST_API = ('Ошибка при запросе к API: {url}, {headers}, {value}'
+CHECK_REQUEST_API = ('Ошибка при запросе к API: {url}, {headers}'
                      '. {params}. {error}')
 CHECK_CODE_REQUEST_API = ('Код ошибки при запросе к API: {url}, {headers}'
                           ', {value}. {params}.')
@@ -43,6 +115,9 @@ CHECK_TYPE_DICT = ('Ответ API не соответствует словар
                    'Передан тип данных {type}')
 CHECK_TYPE_LIST = ('В ответе API ключ homeworks '
                    'не соответствует списку list(). Передан тип данных {type}')
+CHECK_TYPE_HOMEWORK = ('Работа в списке homeworks ответа API '
+                       'не соответствует словарю (dict). '
+                       'Передан тип данных {type}')
 CHECK_KEYS = 'В ответе API нет ключа {value}.'
 CHECK_HOMEWORK_STATUS = ('В ответе API не содержится статус домашней работы:'
                          '{value}.')
@@ -50,13 +125,48 @@ CHECK_HOMEWORK_NAME = ('В ответе функции `parse_status`'
                        'не содержится название домашней работы.')
 CHANGE_STATUS = 'Изменился статус проверки работы "{name}". {value}'
 MESSAGE_ERRORS = 'Произошел сбой: {error}'
+TENANTS_RELOADED = 'Список получателей перечитан: {count}.'
+TENANTS_RELOAD_FAIL = 'Не удалось перечитать список получателей: {error}'
+POLL_NOW_REQUESTED = 'Запрошен внеочередной опрос всех получателей.'
+SHARD_WITHOUT_STATE = ('Для SHARD_DB нужен общий для воркеров STATE_DB: '
+                       'иначе при переезде тенанта уведомления повторятся.')
+TRACE_STREAMED = ('TRACE_FILE несовместим с STREAM_PARSE: потоковый '
+                  'ответ API нельзя записать в трассу.')
+OUTBOX_QUEUED = ('OUTBOX_DB несовместим с TELEGRAM_QUEUE: очередь в памяти '
+                 'не сообщает, доставлено ли сообщение.')
+HTTP2_WITHOUT_POOL = ('HTTP2 работает только с общим пулом соединений: '
+                      'задайте HTTP_POOL_SIZE > 0.')
+SHUTDOWN_STARTED = 'Получен сигнал остановки, завершаем работу.'
+SHUTDOWN_QUEUE_LEFT = 'Не отправлено сообщений из очереди: {depth}.'
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def http_get(**request_parameters):
+    """Выполняет GET-запрос.
+    При HTTP_POOL_SIZE > 0 все запросы идут через одну общую сессию
+    с пулом keep-alive соединений, иначе через requests.get. Сессия
+    создаётся один раз, даже если первые запросы идут из пула потоков.
+    """
+    global _session
+    if not HTTP_POOL_SIZE:
+        import requests
+        return requests.get(**request_parameters)
+    with _session_lock:
+        if _session is None:
+            _session = build_session(HTTP_POOL_SIZE, HTTP_KEEPALIVE, HTTP2)
+    return _session.get(**request_parameters)
 
 
 def check_tokens():
     """Проверяет доступность переменных окружения.
     Если отсутствует хотя бы одна переменная окружения выходим.
+    При заданном TENANTS_FILE токен и чат берутся из файла тенантов.
     """
-    results = [name for name in VARIABLES if not globals()[name]]
+    variables = TENANTS_VARIABLES if TENANTS_FILE else VARIABLES
+    results = [name for name in variables if not globals()[name]]
     if results:
         logging.critical(CHECK_VARIABLES.format(name=results))
         raise ValueError(CHECK_VARIABLES.format(name=results))
@@ -65,14 +175,38 @@ def check_tokens():
 def send_message(bot, message):
     """Отправляет сообщение в Telegram чат TELEGRAM_CHAT_ID.
     Принимает на вход два параметра: экземпляр класса
-    Bot и строку с текстом сообщения.
+    Bot и строку с текстом сообщения. Во время опроса тенанта
+    сообщение уходит в чат этого тенанта. Для очереди отправки
+    (QueuedBot) возвращает квитанцию о доставке.
     """
+    tenant = current_tenant.get()
     try:
-        bot.send_message(
-            chat_id=TELEGRAM_CHAT_ID,
-            text=message
+        receipt = bot.send_message(
+            chat_id=tenant.chat_id if tenant else TELEGRAM_CHAT_ID,
+            text=message,
+            timeout=bounded(HTTP_READ_TIMEOUT)
         )
         logging.debug(SEND_MESSAGE_OK.format(value=message))
+        return receipt if isinstance(bot, QueuedBot) else True
+    except Exception as error:
+        logging.exception(SEND_MESSAGE_FAIL.format(
+            value=message, error=error))
+        return False
+
+
+async def async_send_message(client, message):
+    """Асинхронный вариант send_message через Telegram Bot API.
+    Принимает httpx.AsyncClient и строку с текстом сообщения.
+    """
+    tenant = current_tenant.get()
+    try:
+        response = await client.post(
+            f'{TELEGRAM_API_URL}{TELEGRAM_TOKEN}/sendMessage',
+            json={'chat_id': tenant.chat_id if tenant else TELEGRAM_CHAT_ID,
+                  'text': message},
+            timeout=httpx_timeout(request_timeout()))
+        response.raise_for_status()
+        logging.debug(SEND_MESSAGE_OK.format(value=message))
         return True
     except Exception as error:
         logging.exception(SEND_MESSAGE_FAIL.format(
@@ -85,29 +219,135 @@ def get_api_answer(timestamp):
     В качестве параметра в функцию передается временная метка.
     В случае успешного запроса должна вернуть ответ API, приведя его
     из формата JSON к типам данных Python.
+    Во время опроса тенанта запрос делается с его токеном, а ответ,
+    не изменившийся с прошлой обработки, возвращается без декодирования
+    как Payload с unchanged=True. При STREAM_PARSE работы разбираются
+    и проверяются по мере чтения тела.
     """
-    request_parameters = dict(
-        url=ENDPOINT, headers=HEADERS, params={'from_date': timestamp})
+    import requests
+
+    request_parameters = build_request(timestamp)
+    stream = {'stream': True} if STREAM_PARSE else {}
+    started = time.monotonic()
     try:
-        homework_statuses = requests.get(**request_parameters)
+        homework_statuses = http_get(**request_parameters, **stream)
     except requests.RequestException as error:
+        API_REQUESTS.observe(time.monotonic() - started,
+                             outcome=type(error).__name__)
+        raise ConnectionError(CHECK_REQUEST_API.format(
+            **request_parameters, error=error))
+    API_REQUESTS.observe(time.monotonic() - started,
+                         outcome=homework_statuses.status_code)
+    return handle_response(homework_statuses, request_parameters,
+                           STREAM_PARSE)
+
+
+async def async_get_api_answer(client, timestamp):
+    """Асинхронный вариант get_api_answer на httpx.AsyncClient.
+    Ответ проверяется и декодируется так же, как в get_api_answer;
+    потоковый разбор (STREAM_PARSE) здесь не применяется.
+    """
+    import httpx
+
+    request_parameters = build_request(timestamp)
+    started = time.monotonic()
+    try:
+        homework_statuses = await client.get(**{
+            **request_parameters,
+            'timeout': httpx_timeout(request_parameters['timeout'])})
+    except httpx.HTTPError as error:
+        API_REQUESTS.observe(time.monotonic() - started,
+                             outcome=type(error).__name__)
         raise ConnectionError(CHECK_REQUEST_API.format(
             **request_parameters, error=error))
-    if homework_statuses.status_code != 200:
-        raise ValueError(CHECK_CODE_REQUEST_API.format(
-            **request_parameters, value=homework_statuses.status_code))
+    API_REQUESTS.observe(time.monotonic() - started,
+                         outcome=homework_statuses.status_code)
+    return handle_response(homework_statuses, request_parameters, False)
+
+
+def build_request(timestamp):
+    """Параметры запроса к API для текущего тенанта."""
+    tenant = current_tenant.get()
+    headers = HEADERS
+    if tenant is not None:
+        headers = {'Authorization': f'OAuth {tenant.token}',
+                   **PAYLOAD_CACHE.headers(tenant)}
+    return dict(url=ENDPOINT, headers=headers, params={'from_date': timestamp},
+                timeout=request_timeout())
+
+
+def request_key(timestamp):
+    """Ключ, по которому одинаковые запросы к API объединяются.
+    Ответ get_api_answer зависит только от токена, from_date и
+    валидаторов прошлого ответа тенанта: подписчики одного токена
+    с одинаковым состоянием получают общий ответ.
+    """
+    tenant = current_tenant.get()
+    if tenant is None:
+        return None
+    return tenant.token, timestamp, tenant.etag, tenant.digest
+
+
+def request_timeout():
+    """Таймауты соединения и чтения, урезанные до остатка цикла опроса."""
+    return bounded(HTTP_CONNECT_TIMEOUT), bounded(HTTP_READ_TIMEOUT)
+
+
+def handle_response(homework_statuses, request_parameters, stream):
+    """Проверяет код ответа API и приводит тело к типам данных Python.
+    Потоковый ответ закрывается здесь же, если до разбора тела дело
+    не дошло: при ошибке или неизменившемся ответе.
+    """
+    with ExitStack() as stack:
+        if stream:
+            stack.callback(homework_statuses.close)
+        tenant = current_tenant.get()
+        validators = (None, None)
+        if (tenant is not None
+                and homework_statuses.status_code in (200, 304)):
+            unchanged, validators = PAYLOAD_CACHE.match(
+                tenant, homework_statuses, digest=not stream)
+            if unchanged is not None:
+                return unchanged
+        if homework_statuses.status_code >= 500:
+            raise UpstreamError(CHECK_CODE_REQUEST_API.format(
+                **request_parameters, value=homework_statuses.status_code),
+                homework_statuses.status_code)
+        if homework_statuses.status_code != 200:
+            raise ValueError(CHECK_CODE_REQUEST_API.format(
+                **request_parameters, value=homework_statuses.status_code))
+        payload = decode_response(
+            homework_statuses, request_parameters, validators, stream)
+        # Дальше ответ закрывает разбор тела.
+        stack.pop_all()
+        return payload
+
+
+def decode_response(homework_statuses, request_parameters, validators,
+                    stream):
+    """Приводит тело успешного ответа API к типам данных Python.
+    При stream возвращает Payload, работы которого разбираются
+    по мере чтения тела.
+    """
+    if stream:
+        payload = stream_payload(homework_statuses, STREAM_CHUNK_SIZE)
+        payload.etag = validators[0]
+        return payload
     result = homework_statuses.json()
     for key in ['code', 'error']:
         if key in result:
             raise ValueError(CHECK_RESPONSE_API.format(
                 **request_parameters, name=key, value=result[key]))
+    if isinstance(result, dict):
+        return Payload(result, *validators)
     return result
 
 
 def check_response(response):
     """Проверяет ответ API на соответствие документации.
     В качестве параметра функция получает ответ API, приведенный
-    к типам данных Python.
+    к типам данных Python. За тот же проход по списку работ
+    возвращает их компактные записи Homework.
     """
     if not isinstance(response, dict):
         raise TypeError(CHECK_TYPE_DICT.format(
@@ -118,6 +358,13 @@ def check_response(response):
     if not isinstance(data, list):
         raise TypeError(CHECK_TYPE_LIST.format(
             type=type(data)))
+    records = []
+    for homework in data:
+        if not isinstance(homework, (dict, Homework)):
+            raise TypeError(CHECK_TYPE_HOMEWORK.format(
+                type=type(homework)))
+        records.append(to_record(homework))
+    return records
 
 
 def parse_status(homework):
@@ -137,40 +384,253 @@ def parse_status(homework):
         name=homework_name, value=HOMEWORK_VERDICTS[status])
 
 
+def load_tenants(timestamp):
+    """Собирает реестр тенантов.
+    Тенант из переменных окружения PRACTICUM_TOKEN/TELEGRAM_CHAT_ID
+    дополняется тенантами из файла TENANTS_FILE (формат JSON Lines).
+    """
+    registry = TenantRegistry()
+    if PRACTICUM_TOKEN and TELEGRAM_CHAT_ID:
+        registry.add(Tenant(id=str(TELEGRAM_CHAT_ID), token=PRACTICUM_TOKEN,
+                            chat_id=TELEGRAM_CHAT_ID, timestamp=timestamp))
+    if TENANTS_FILE:
+        with open(TENANTS_FILE, encoding='utf-8') as file:
+            registry.load(file, timestamp)
+    return registry
+
+
+def start_outbound_queue(bot):
+    """Запускает очередь отправки с ограничением скорости Telegram.
+    Возвращает объект, который можно передавать в send_message вместо бота.
+    """
+    def deliver(chat_id, text):
+        bot.send_message(chat_id=chat_id, text=text,
+                         timeout=HTTP_READ_TIMEOUT)
+
+    queue = OutboundQueue(deliver, TELEGRAM_RATE, TELEGRAM_CHAT_RATE).start()
+    REGISTRY.gauge('telegram_queue_depth',
+                   'Сообщения в очереди отправки Telegram.',
+                   lambda: queue.depth)
+    return QueuedBot(queue)
+
+
+def open_store():
+    """Открывает хранилище состояния, если задан STATE_DB.
+    Когда воркеров несколько, изменения фиксируются сразу: иначе
+    открытая транзакция блокировала бы запись остальным воркерам.
+    """
+    if not STATE_DB:
+        return None
+    return StateStore(STATE_DB, 1 if SHARD_DB else STATE_BATCH_SIZE)
+
+
+def open_shard():
+    """Подключает воркер к общей таблице аренды, если задан SHARD_DB."""
+    if not SHARD_DB:
+        return None
+    if not STATE_DB:
+        raise ValueError(SHARD_WITHOUT_STATE)
+    worker = SHARD_WORKER or f'{platform.node()}-{os.getpid()}'
+    return Shard(LeaseBoard(SHARD_DB, worker, SHARD_LEASE_TTL))
+
+
+def open_history(shard=None):
+    """Открывает журнал переходов статусов, если задан HISTORY_FILE.
+    При шардировании у каждого воркера свой файл с суффиксом имени
+    воркера: журнал только дописывается одним процессом.
+    """
+    if not HISTORY_FILE:
+        return None
+    if shard is None:
+        return HistoryLog(HISTORY_FILE)
+    return HistoryLog(f'{HISTORY_FILE}.{shard.board.worker}')
+
+
+def open_outbox():
+    """Открывает outbox уведомлений, если задан OUTBOX_DB."""
+    if not OUTBOX_DB:
+        return None
+    if TELEGRAM_QUEUE:
+        raise ValueError(OUTBOX_QUEUED)
+    return Outbox(OUTBOX_DB, OUTBOX_BACKOFF, OUTBOX_BACKOFF_MAX)
+
+
+def create_engine(fetch, send, store=None):
+    """Собирает движок опроса тенантов с настройками из окружения.
+    При BREAKER_THRESHOLD > 0 запросы всех тенантов к ENDPOINT идут
+    через общий автомат защиты API. Подписчики одного токена получают
+    в цикле один общий ответ API; потоковый ответ (STREAM_PARSE) читается
+    только один раз, поэтому с ним запросы не объединяются.
+    При TRACE_FILE ответы API записываются в трассу для replay.
+    При OUTBOX_DB уведомления доставляются через outbox с повторами.
+    """
+    registry = load_tenants(int(time.time()))
+    if store is not None:
+        store.load(registry)
+    if TRACE_FILE and STREAM_PARSE:
+        raise ValueError(TRACE_STREAMED)
+    breaker = None
+    if BREAKER_THRESHOLD:
+        breaker = CircuitBreaker(ENDPOINT, BREAKER_THRESHOLD,
+                                 BREAKER_BACKOFF, BREAKER_BACKOFF_MAX)
+        fetch = breaker.wrap(fetch)
+    outbox = open_outbox()
+    shard = open_shard()
+    flights = None
+    if not STREAM_PARSE:
+        flights = SingleFlight(request_key)
+        fetch = flights.wrap(fetch)
+    if TRACE_FILE:
+        # Снаружи объединения запросов: в трассу попадает каждый
+        # подписчик токена, а не только тот, кто сделал общий запрос.
+        fetch = Recorder(TRACE_FILE).wrap(fetch)
+    if METRICS_PORT:
+        REGISTRY.gauge('homework_payload_cache_hit_ratio',
+                       'Доля неизменившихся ответов API.',
+                       lambda: PAYLOAD_CACHE.ratio())
+        if breaker is not None:
+            REGISTRY.gauge('homework_api_breaker_open',
+                           'Разомкнут ли автомат защиты API (0 или 1).',
+                           lambda: int(breaker.state != CLOSED))
+        if outbox is not None:
+            REGISTRY.gauge('telegram_outbox_depth',
+                           'Недоставленные сообщения в outbox.',
+                           lambda: outbox.depth)
+        serve(REGISTRY, METRICS_PORT, METRICS_HOST)
+    return PollingEngine(
+        registry,
+        fetch=fetch,
+        check=check_response,
+        parse=parse_status,
+        send=send,
+        error_template=MESSAGE_ERRORS,
+        schedule=PollSchedule(POLL_INTERVALS, POLL_INTERVAL_IDLE,
+                              POLL_INTERVAL_MIN, POLL_INTERVAL_MAX,
+                              RETRY_PERIOD),
+        store=store,
+        budget=LOOP_DEADLINE or None,
+        overlap=POLL_OVERLAP,
+        errors=ErrorDigest(ERROR_DIGEST_PERIOD),
+        shard=shard,
+        workers=POLL_WORKERS,
+        flights=flights,
+        history=open_history(shard),
+        outbox=outbox,
+    )
+
+
+def apply_signals(engine, lifecycle, store=None):
+    """Выполняет действия, запрошенные сигналами процесса."""
+    if lifecycle.take(RELOAD):
+        try:
+            registry = load_tenants(int(time.time()))
+            if store is not None:
+                store.load(registry)
+        except Exception as error:
+            logging.exception(TENANTS_RELOAD_FAIL.format(error=error))
+        else:
+            engine.sync(registry)
+            logging.info(TENANTS_RELOADED.format(count=len(engine.registry)))
+    if lifecycle.take(POLL_NOW):
+        logging.info(POLL_NOW_REQUESTED)
+        engine.expedite()
+
+
+def shutdown(engine, store=None, sender=None):
+    """Дожидается отправки сообщений из очереди, закрывает базы и журнал.
+    На всё отводится половина SHUTDOWN_GRACE: другая половина уходит
+    на завершение текущего цикла опроса. Изменения, сообщения о которых
+    не успели отправить, откатываются и сохраняются недоставленными.
+    Аренда тенантов отпускается, чтобы их сразу подхватили другие воркеры.
+    """
+    logging.info(SHUTDOWN_STARTED)
+    if isinstance(sender, QueuedBot) and not sender.queue.close(
+            SHUTDOWN_GRACE / 2):
+        logging.warning(SHUTDOWN_QUEUE_LEFT.format(
+            depth=sender.queue.depth))
+        sender.queue.abandon()
+    engine.restore()
+    if store is not None:
+        store.close()
+    if engine.history is not None:
+        engine.history.close()
+    if engine.outbox is not None:
+        engine.outbox.close()
+    if engine.shard is not None:
+        engine.shard.leave()
+
+
 def main():
-    """Основная логика работы бота."""
+    """Основная логика работы бота.
+    Токены проверяются до импорта python-telegram-bot: без них тяжёлая
+    библиотека не загружается вовсе. Ожидание между циклами прерывается
+    сигналами; по SIGTERM бот дорабатывает цикл, досылает сообщения
+    и сохраняет состояние. HTTP2 без HTTP_POOL_SIZE отвергается: запросы
+    без пула идут через requests.get по HTTP/1.1.
+    """
     check_tokens()
+    if HTTP2 and not HTTP_POOL_SIZE:
+        raise ValueError(HTTP2_WITHOUT_POOL)
+    import telegram
     bot = telegram.Bot(token=TELEGRAM_TOKEN)
 
-    old_status = None
-    old_message = None
-    timestamp = int(time.time())
-    while True:
+    store = open_store()
+    sender = start_outbound_queue(bot) if TELEGRAM_QUEUE else bot
+    engine = create_engine(get_api_answer, partial(send_message, sender),
+                           store)
+    with Lifecycle(partial(engine.drain, SHUTDOWN_GRACE / 2)) as lifecycle:
+        while not lifecycle.stopping:
+            # Просыпаемся не реже раза в RETRY_PERIOD, даже если ближайший
+            # опрос запланирован позже. Задержка округляется вверх: время
+            # цикла уже вычтено из неё, и без округления бот просыпался бы
+            # чуть раньше срока опроса ради пустого цикла.
+            delay = min(math.ceil(engine.run_once()), RETRY_PERIOD)
+            with lifecycle.interruptible():
+                time.sleep(delay)
+            apply_signals(engine, lifecycle, store)
+    shutdown(engine, store, sender)
+
+
+async def async_main():
+    """Основная логика работы бота на asyncio (ASYNC_MODE).
+    Тенанты, чей опрос подошёл, опрашиваются конкурентно, не более
+    ASYNC_CONCURRENCY одновременно.
+    """
+    check_tokens()
+    import asyncio
+    import httpx
+
+    store = open_store()
+    limits = httpx.Limits(max_connections=ASYNC_CONCURRENCY,
+                          keepalive_expiry=HTTP_KEEPALIVE)
+    loop = asyncio.get_running_loop()
+    async with httpx.AsyncClient(limits=limits, http2=HTTP2) as client:
+        engine = create_engine(partial(async_get_api_answer, client),
+                               partial(async_send_message, client), store)
+        lifecycle = Lifecycle(partial(engine.drain, SHUTDOWN_GRACE / 2))
+        lifecycle.attach(loop)
         try:
-            api_answer = get_api_answer(timestamp)
-            check_response(api_answer)
-            homeworks = api_answer.get('homeworks')
-            if homeworks:
-                homework = homeworks[0]
-                if (old_status != homework['status']
-                   and send_message(bot, parse_status(homework))):
-                    old_status = homework['status']
-                    timestamp = api_answer.get('current_date', timestamp)
-        except Exception as error:
-            message = MESSAGE_ERRORS.format(error=error)
-            logging.exception(message)
-            if old_message != message and send_message(bot, message):
-                old_message = message
-        time.sleep(RETRY_PERIOD)
+            while not lifecycle.stopping:
+                delay = await engine.run_once_async(ASYNC_CONCURRENCY)
+                await lifecycle.wait(min(math.ceil(delay), RETRY_PERIOD))
+                apply_signals(engine, lifecycle, store)
+        finally:
+            lifecycle.detach(loop)
+    shutdown(engine, store)
 
 
 if __name__ == '__main__':
     logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s [%(levelname)s] %(funcName)s %(message)s',
-        handlers=[logging.FileHandler(
-            __file__ + '.log',
-            mode='w'
-        ), logging.StreamHandler(sys.stdout)]
+        level=LOG_LEVEL,
+        handlers=[start_log_listener(
+            [file_handler(LOG_FILE, LOG_MAX_BYTES, LOG_BACKUPS,
+                          LOG_ROTATE_WHEN),
+             logging.StreamHandler(sys.stdout)],
+            json_lines=LOG_FORMAT == 'json',
+        )]
     )
-    main()
+    if ASYNC_MODE:
+        import asyncio
+        asyncio.run(async_main())
+    else:
+        main()
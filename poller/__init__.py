@@ -0,0 +1 @@
+"""Движок опроса API Практикум.Домашки для множества получателей."""
@@ -0,0 +1,163 @@
+import functools
+import logging
+import random
+import threading
+import time
+
+from poller.deadline import DeadlineExceeded
+from poller.metrics import BREAKER_REJECTED, BREAKER_TRANSITIONS
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+# Выше этой степени двойки пауза всё равно упирается в max_backoff.
+MAX_DOUBLINGS = 32
+BREAKER_OPENED = ('API {endpoint} недоступно: сбоев подряд {failures}, '
+                  'пробный запрос через {delay:.1f} с.')
+BREAKER_PROBE = 'API {endpoint}: пробный запрос после паузы.'
+BREAKER_CLOSED = 'API {endpoint} снова отвечает.'
+CIRCUIT_OPEN = 'API {endpoint} недоступно, запрос не отправлен.'
+
+
+class UpstreamError(ValueError):
+    """API ответило кодом 5xx: сбой на стороне сервиса, а не запроса."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitOpen(ConnectionError):
+    """Запрос не отправлен: автомат защиты API разомкнут."""
+
+
+def upstream_failed(error):
+    """Говорит ли ошибка о недоступности API: сбой соединения или 5xx."""
+    return (isinstance(error, (ConnectionError, UpstreamError))
+            and not isinstance(error, CircuitOpen))
+
+
+class CircuitBreaker:
+    """Автомат защиты одного адреса API, общий для всех тенантов.
+    После threshold сбоев подряд автомат размыкается: запросы не
+    отправляются и сразу завершаются CircuitOpen. Через паузу проходит
+    один пробный запрос (полуоткрытое состояние): удача замыкает
+    автомат, сбой снова размыкает его с вдвое большей паузой.
+    Пауза выбирается случайно от нуля до backoff * 2 ** n, но не больше
+    max_backoff (full jitter), чтобы воркеры не возвращались к API
+    одновременно. Ответы 4xx и прочие ошибки разбора сбоями API
+    не считаются.
+    """
+
+    def __init__(self, endpoint, threshold=5, backoff=30.0,
+                 max_backoff=1800.0, clock=time.monotonic,
+                 jitter=random.random):
+        self.endpoint = endpoint
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.jitter = jitter
+        self.state = CLOSED
+        self.failures = 0
+        self.openings = 0
+        self.retry_at = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Разрешает запрос или возбуждает CircuitOpen."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and self.clock() >= self.retry_at:
+                self._move(HALF_OPEN)
+                logging.info(BREAKER_PROBE.format(endpoint=self.endpoint))
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+        BREAKER_REJECTED.inc(endpoint=self.endpoint)
+        raise CircuitOpen(CIRCUIT_OPEN.format(endpoint=self.endpoint))
+
+    def record(self, error=None):
+        """Учитывает исход запроса: error=None - API ответило."""
+        if isinstance(error, DeadlineExceeded):
+            return self.abandon()
+        if error is not None and upstream_failed(error):
+            return self.failure()
+        return self.success()
+
+    def success(self):
+        """API ответило: автомат замыкается."""
+        with self._lock:
+            self._probing = False
+            self.failures = 0
+            self.openings = 0
+            if self.state != CLOSED:
+                self._move(CLOSED)
+                logging.info(BREAKER_CLOSED.format(endpoint=self.endpoint))
+
+    def failure(self):
+        """Сбой API: после threshold сбоев подряд автомат размыкается."""
+        with self._lock:
+            self._probing = False
+            if self.state == OPEN:
+                return
+            self.failures += 1
+            if self.state == CLOSED and self.failures < self.threshold:
+                return
+            delay = self.jitter() * min(
+                self.max_backoff,
+                self.backoff * 2 ** min(self.openings, MAX_DOUBLINGS))
+            self.openings += 1
+            self.retry_at = self.clock() + delay
+            self._move(OPEN)
+            logging.warning(BREAKER_OPENED.format(
+                endpoint=self.endpoint, failures=self.failures, delay=delay))
+
+    def abandon(self):
+        """Запрос прерван без ответа: пробный запрос можно повторить."""
+        with self._lock:
+            self._probing = False
+
+    def wrap(self, fetch):
+        """Функция fetch, запросы которой проходят через автомат.
+        Поддерживаются и обычные, и асинхронные функции.
+        """
+        import inspect
+
+        if inspect.iscoroutinefunction(fetch):
+            @functools.wraps(fetch)
+            async def guarded_async(*args, **kwargs):
+                self.allow()
+                try:
+                    result = await fetch(*args, **kwargs)
+                except Exception as error:
+                    self.record(error)
+                    raise
+                except BaseException:
+                    self.abandon()
+                    raise
+                self.record()
+                return result
+            return guarded_async
+
+        @functools.wraps(fetch)
+        def guarded(*args, **kwargs):
+            self.allow()
+            try:
+                result = fetch(*args, **kwargs)
+            except Exception as error:
+                self.record(error)
+                raise
+            except BaseException:
+                self.abandon()
+                raise
+            self.record()
+            return result
+        return guarded
+
+    def _move(self, state):
+        self.state = state
+        BREAKER_TRANSITIONS.inc(endpoint=self.endpoint, state=state)
@@ -0,0 +1,77 @@
+import functools
+import threading
+
+from poller.metrics import COALESCED
+
+
+class SingleFlight:
+    """Объединяет одинаковые запросы к API в пределах цикла опроса.
+    Первый вызов с данным ключом выполняет запрос, остальные вызовы
+    с тем же ключом - и одновременные, и последующие до reset() -
+    получают его результат или его исключение. Ключ вычисляет функция
+    key по аргументам вызова; None - вызов не объединяется.
+    Результат отдаётся всем вызовам один и тот же, поэтому его нельзя
+    изменять и нельзя объединять одноразовые (потоковые) ответы.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Забывает результаты: следующий вызов снова пойдёт в API."""
+        with self._lock:
+            self._calls.clear()
+
+    def wrap(self, fetch):
+        """Функция fetch с объединением одинаковых вызовов.
+        Поддерживаются и обычные, и асинхронные функции.
+        """
+        import inspect
+
+        if inspect.iscoroutinefunction(fetch):
+            return self._wrap_async(fetch)
+        return self._wrap_sync(fetch)
+
+    def _wrap_async(self, fetch):
+        @functools.wraps(fetch)
+        async def coalesced_async(*args):
+            import asyncio
+
+            key = self.key(*args)
+            if key is None:
+                return await fetch(*args)
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = asyncio.ensure_future(fetch(*args))
+            else:
+                COALESCED.inc()
+            # Отмена одного из ожидающих не отменяет общий запрос.
+            return await asyncio.shield(call)
+        return coalesced_async
+
+    def _wrap_sync(self, fetch):
+        @functools.wraps(fetch)
+        def coalesced(*args):
+            from concurrent.futures import Future
+
+            key = self.key(*args)
+            if key is None:
+                return fetch(*args)
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = Future()
+            if not leader:
+                COALESCED.inc()
+                return call.result()
+            try:
+                result = fetch(*args)
+            except BaseException as error:
+                call.set_exception(error)
+                raise
+            call.set_result(result)
+            return result
+        return coalesced
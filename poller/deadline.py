@@ -0,0 +1,58 @@
+import contextvars
+import time
+
+from poller.metrics import DEADLINES
+
+
+DEADLINE_EXCEEDED = ('Цикл опроса не уложился в {budget} с: '
+                     'этап {stage} отменён.')
+# Таймаут не может быть нулевым: requests и httpx его не принимают.
+MIN_TIMEOUT = 0.001
+
+# Дедлайн текущего цикла опроса. Через него функции модуля homework
+# урезают таймауты запросов до оставшегося времени цикла.
+current_deadline = contextvars.ContextVar('current_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Время цикла опроса истекло до начала очередного этапа."""
+
+    def __init__(self, stage, budget):
+        super().__init__(DEADLINE_EXCEEDED.format(stage=stage, budget=budget))
+        self.stage = stage
+
+
+class Deadline:
+    """Бюджет времени одного цикла опроса в секундах."""
+
+    def __init__(self, budget, clock=time.monotonic):
+        self.budget = budget
+        self.clock = clock
+        self.expires = clock() + budget
+
+    def remaining(self):
+        """Сколько секунд осталось до дедлайна."""
+        return max(self.expires - self.clock(), 0)
+
+    @property
+    def expired(self):
+        """Истекло ли время цикла."""
+        return self.remaining() <= 0
+
+    def shorten(self, seconds):
+        """Оставляет до дедлайна не больше seconds секунд."""
+        self.expires = min(self.expires, self.clock() + seconds)
+
+    def check(self, stage):
+        """Бросает DeadlineExceeded и считает его, если время истекло."""
+        if self.expired:
+            DEADLINES.inc(stage=stage)
+            raise DeadlineExceeded(stage, self.budget)
+
+
+def bounded(timeout):
+    """Таймаут, урезанный до остатка дедлайна текущего цикла."""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return timeout
+    return max(min(timeout, deadline.remaining()), MIN_TIMEOUT)
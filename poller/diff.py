@@ -0,0 +1,29 @@
+from poller.records import timestamp
+
+
+def homework_key(homework):
+    """Ключ работы в индексе статусов: id, а без него - название."""
+    key = homework.get('id')
+    return str(key) if key is not None else homework.get('homework_name')
+
+
+def changed(index, homeworks):
+    """Сравнивает ответ API с индексом последних известных статусов.
+    index - словарь {ключ работы: статус}. За один проход по homeworks
+    (списку или потоку работ) выдаёт пары (ключ, работа) для работ,
+    статус которых отличается от сохранённого в индексе. API отдаёт
+    работы от новых к старым, события выдаются в хронологическом порядке;
+    в памяти держатся только изменившиеся работы.
+    """
+    transitions = []
+    for homework in homeworks:
+        key = homework_key(homework)
+        if index.get(key) != homework.get('status'):
+            transitions.append((key, homework))
+    return reversed(transitions)
+
+
+def updated_at(homework, default):
+    """Время последнего изменения работы (date_updated) в секундах."""
+    updated = timestamp(homework.get('date_updated'))
+    return default if updated is None else updated
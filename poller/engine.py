@@ -0,0 +1,757 @@
+import contextvars
+import logging
+import time
+from collections import defaultdict, deque
+
+from poller.deadline import Deadline, DeadlineExceeded, current_deadline
+from poller.diff import changed, updated_at
+from poller.errors import ErrorDigest
+from poller.metrics import (CHECK_FAILURES, DEADLINES, LOOP_SECONDS, MESSAGES,
+                            PARSE_OUTCOMES)
+from poller.schedule import DueQueue, PollSchedule
+from poller.tenants import Tenant, current_tenant
+
+
+MESSAGE_ERRORS = 'Произошел сбой: {error}'
+POLL_FINISHED = 'Опрос завершён за {elapsed:.3f} с.'
+DEADLINE_CANCELLED = 'Опрос тенанта {id} отменён по дедлайну цикла.'
+OUTBOX_SEND_FAIL = 'Ошибка отправки сообщения {key} из outbox: {error}'
+# posting: уведомление принято outbox или очередью отправки, и в журнал
+# history переход попадёт, когда сообщение действительно отправят.
+DEFERRED = 'deferred'
+
+
+class PollingEngine:
+    """Опрашивает API для всех тенантов реестра из одного процесса.
+    Функции запроса, проверки, разбора ответа и отправки сообщений
+    передаются снаружи: движок не зависит от модуля homework.
+    Каждый тенант опрашивается, когда наступает его время по расписанию.
+    Остальные параметры необязательны; что они включают, описано
+    у методов, которые их используют.
+    """
+
+    def __init__(self, registry, fetch, check, parse, send,
+                 error_template=MESSAGE_ERRORS, schedule=None,
+                 clock=time.time, store=None, budget=None, overlap=0,
+                 errors=None, shard=None, workers=1, flights=None,
+                 history=None, outbox=None):
+        self.registry = registry
+        self.fetch = fetch
+        self.check = check
+        self.parse = parse
+        self.send = send
+        self.error_template = error_template
+        self.schedule = schedule or PollSchedule()
+        self.clock = clock
+        self.store = store
+        self.budget = budget
+        self.overlap = overlap
+        self.errors = errors or ErrorDigest()
+        self.deadline = None
+        self.shard = shard
+        self.owned = None
+        self.workers = workers
+        self.flights = flights
+        self.history = history
+        self.outbox = outbox
+        self.queue = DueQueue()
+        self.planned = {}
+        self.receipts = deque()
+        for tenant in registry:
+            self.queue.push(tenant.id, 0)
+
+    def poll(self, tenant):
+        """Один цикл опроса тенанта: запрос, проверка, уведомление."""
+        self.settle(tenant, *self.collect(tenant))
+
+    def collect(self, tenant):
+        """Запрашивает API и готовит уведомления тенанта.
+        Возвращает (ответ API, изменения, ошибка); меняет только состояние
+        самого тенанта, поэтому тенантов можно обрабатывать в разных
+        потоках. Ошибку запроса или разбора обрабатывает settle.
+        """
+        self.check_deadline('poll')
+        return self.drive(self.collecting(tenant), self.fetch)
+
+    def settle(self, tenant, api_answer, transitions, error=None):
+        """Отправляет уведомления и сводки тенанта, сообщает о сбое."""
+        self.drive(self.settling(tenant, api_answer, transitions, error),
+                   self.deliver)
+
+    async def poll_async(self, tenant):
+        """То же, что poll, для асинхронных функций fetch и send."""
+        await self.settle_async(tenant, *await self.collect_async(tenant))
+
+    async def collect_async(self, tenant):
+        """То же, что collect, для асинхронной функции fetch."""
+        self.check_deadline('poll')
+        return await self.drive_async(self.collecting(tenant), self.fetch)
+
+    async def settle_async(self, tenant, api_answer, transitions,
+                           error=None):
+        """То же, что settle, для асинхронной функции send."""
+        await self.drive_async(
+            self.settling(tenant, api_answer, transitions, error),
+            self.deliver_async)
+
+    @staticmethod
+    def drive(steps, call):
+        """Выполняет шаги генератора steps, а ввод-вывод - функцией call.
+        Генератор выдаёт аргумент запроса и получает результат call или
+        её исключение; возвращается то, что вернул генератор. Шаги
+        опроса общие для обычного и асинхронного режимов, а отличаются
+        только drive и drive_async.
+        """
+        outcome, failed = None, False
+        try:
+            while True:
+                request = (steps.throw(outcome) if failed
+                           else steps.send(outcome))
+                try:
+                    outcome, failed = call(request), False
+                except DeadlineExceeded:
+                    raise
+                except Exception as error:
+                    outcome, failed = error, True
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            steps.close()
+
+    @staticmethod
+    async def drive_async(steps, call):
+        """То же, что drive, для асинхронной функции call."""
+        outcome, failed = None, False
+        try:
+            while True:
+                request = (steps.throw(outcome) if failed
+                           else steps.send(outcome))
+                try:
+                    outcome, failed = await call(request), False
+                except DeadlineExceeded:
+                    raise
+                except Exception as error:
+                    outcome, failed = error, True
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            steps.close()
+
+    def collecting(self, tenant):
+        """Шаги collect: выдаёт from_date запроса и получает ответ API."""
+        token = current_tenant.set(tenant)
+        started = time.monotonic()
+        try:
+            api_answer = yield self.since(tenant)
+            return api_answer, self.prepare(tenant, api_answer), None
+        except DeadlineExceeded:
+            raise
+        except Exception as error:
+            return None, [], error
+        finally:
+            self.log_timing(started)
+            current_tenant.reset(token)
+
+    def settling(self, tenant, api_answer, transitions, error=None):
+        """Шаги settle: выдаёт сообщения и получает результат отправки."""
+        token = current_tenant.set(tenant)
+        try:
+            for digest in self.errors.due(tenant.id, self.clock()):
+                yield digest
+            if error is not None:
+                raise error
+            if transitions:
+                delivered = []
+                for key, status, message in transitions:
+                    delivered.append((yield from self.posting(
+                        tenant, key, status, message)))
+                self.apply(tenant, api_answer, transitions, delivered)
+        except DeadlineExceeded:
+            raise
+        except Exception as error:
+            message = self.report(tenant, error)
+            if message is not None:
+                self.confirm(tenant, error, message, (yield message))
+        finally:
+            current_tenant.reset(token)
+
+    @staticmethod
+    def log_timing(started):
+        """Пишет в лог длительность запроса и разбора ответа тенанта."""
+        elapsed = time.monotonic() - started
+        logging.debug(POLL_FINISHED.format(elapsed=elapsed),
+                      extra={'elapsed': round(elapsed, 6)})
+
+    def since(self, tenant):
+        """Значение from_date для очередного запроса тенанта.
+        Это водяной знак тенанта минус overlap секунд: перекрытие окон
+        не даёт потерять изменения на их границе, а уже известные статусы
+        повторно не отправляются.
+        """
+        return max(tenant.since() - self.overlap, 0)
+
+    def prepare(self, tenant, api_answer):
+        """Проверяет ответ API и готовит уведомления об изменениях.
+        Возвращает список (ключ работы, статус, текст сообщения).
+        Неизменившийся ответ не проверяется и не разбирается.
+        Потоковый ответ, разбор которого прерван, закрывается сразу,
+        не дожидаясь сборщика мусора.
+        """
+        if getattr(api_answer, 'unchanged', False):
+            return []
+        try:
+            self.check_deadline('check')
+            return self.detect(tenant, api_answer, self.homeworks(api_answer))
+        except BaseException:
+            close = getattr(api_answer, 'close', None)
+            if close is not None:
+                close()
+            raise
+
+    def homeworks(self, api_answer):
+        """Проверенные работы ответа API.
+        Если check возвращает компактные записи работ, дальше ответ
+        хранит только их. Работы потокового ответа проверяются по одной.
+        """
+        if getattr(api_answer, 'streamed', False):
+            return self.validate_stream(api_answer['homeworks'])
+        homeworks = self.validate(api_answer)
+        if homeworks is None:
+            return api_answer.get('homeworks') or []
+        if isinstance(api_answer, dict):
+            api_answer['homeworks'] = homeworks
+        return homeworks
+
+    def validate_stream(self, homeworks):
+        """Проверяет работы потокового ответа по мере чтения.
+        Каждая работа проходит через check как ответ из одной работы;
+        ошибки формы ответа, найденные при чтении тела, тоже считаются
+        неудачными проверками.
+        """
+        iterator = iter(homeworks)
+        while True:
+            try:
+                homework = next(iterator)
+            except StopIteration:
+                return
+            except (TypeError, ValueError) as error:
+                CHECK_FAILURES.inc(error=type(error).__name__)
+                raise
+            records = self.validate({'homeworks': [homework]})
+            yield homework if records is None else records[0]
+
+    def detect(self, tenant, api_answer, homeworks):
+        """Находит изменившиеся работы и готовит уведомления о них.
+        Водяной знак сдвигается на current_date каждого проверенного
+        ответа; изменения запоминаются в pending до их доставки.
+        """
+        since = tenant.since()
+        transitions = []
+        updates = {}
+        for key, homework in changed(tenant.statuses, homeworks):
+            transitions.append(
+                (key, homework.get('status'), self.render(homework)))
+            updates[key] = updated_at(homework, since)
+        tenant.timestamp = api_answer.get('current_date', tenant.timestamp)
+        for key, updated in updates.items():
+            tenant.pending[key] = min(tenant.pending.get(key, updated),
+                                      updated)
+        if not transitions:
+            self.commit(tenant, api_answer)
+        return transitions
+
+    def apply(self, tenant, api_answer, transitions, delivered):
+        """Запоминает доставленные изменения.
+        Валидаторы ответа обновляются, только если доставлены все
+        изменения: иначе ответ нужно будет обработать заново.
+        """
+        for (key, status, _), ok in zip(transitions, delivered):
+            if not ok:
+                continue
+            previous, updated = self.remember(tenant, key, status)
+            if ok is not DEFERRED:
+                self.record(tenant.id, key, previous, status, updated)
+        if all(delivered):
+            self.commit(tenant, api_answer)
+
+    @staticmethod
+    def commit(tenant, api_answer):
+        """Запоминает валидаторы полностью обработанного ответа."""
+        tenant.etag = getattr(api_answer, 'etag', None)
+        tenant.digest = getattr(api_answer, 'digest', None)
+
+    @staticmethod
+    def check_deadline(stage):
+        """Отменяет этап stage, если дедлайн цикла уже истёк."""
+        deadline = current_deadline.get()
+        if deadline is not None:
+            deadline.check(stage)
+
+    def in_time(self, stage):
+        """Можно ли начинать этап stage: не истёк ли дедлайн цикла."""
+        try:
+            self.check_deadline(stage)
+        except DeadlineExceeded as error:
+            logging.warning(error)
+            return False
+        return True
+
+    def report(self, tenant, error):
+        """Логирует сбой опроса и учитывает его в сводке ошибок.
+        Возвращает текст сообщения, если о сбое нужно сообщить сразу:
+        это первая ошибка такого вида и не та же, что перед перезапуском.
+        О повторах тенант узнаёт из сводки errors (ErrorDigest) не чаще
+        раза в час.
+        """
+        message = self.error_template.format(error=error)
+        logging.exception(message)
+        if not self.errors.record(tenant.id, error, self.clock()):
+            return None
+        if tenant.last_error == message:
+            return None
+        return message
+
+    def confirm(self, tenant, error, message, delivered):
+        """Запоминает сообщение о сбое или забывает недоставленный сбой."""
+        if delivered:
+            tenant.last_error = message
+        else:
+            self.errors.discard(tenant.id, error)
+
+    def validate(self, api_answer):
+        """Проверяет ответ API и считает неудачные проверки.
+        Возвращает то, что вернула функция check.
+        """
+        try:
+            return self.check(api_answer)
+        except Exception as error:
+            CHECK_FAILURES.inc(error=type(error).__name__)
+            raise
+
+    def render(self, homework):
+        """Готовит текст уведомления и считает результаты разбора."""
+        try:
+            message = self.parse(homework)
+        except Exception as error:
+            PARSE_OUTCOMES.inc(outcome=type(error).__name__)
+            raise
+        PARSE_OUTCOMES.inc(outcome=homework.get('status'))
+        return message
+
+    def deliver(self, message):
+        """Отправляет сообщение и считает удачные и неудачные отправки.
+        После дедлайна цикла сообщение не отправляется: изменение
+        останется недоставленным и будет отправлено при следующем опросе.
+        """
+        if not self.in_time('send'):
+            return False
+        delivered = self.send(message)
+        MESSAGES.inc(result='ok' if delivered else 'fail')
+        return delivered
+
+    async def deliver_async(self, message):
+        """То же, что deliver, для асинхронной функции send."""
+        if not self.in_time('send'):
+            return False
+        delivered = await self.send(message)
+        MESSAGES.inc(result='ok' if delivered else 'fail')
+        return delivered
+
+    def posting(self, tenant, key, status, message):
+        """Уведомление об изменении: в outbox или на отправку.
+        С outbox (Outbox) уведомление только записывается в него, а
+        отправляет его dispatch после опросов цикла: статус работы
+        сдвигается сразу, и из-за сбоя Telegram API не опрашивается.
+        Тогда возвращается DEFERRED: статус запоминается сразу, а переход
+        попадает в журнал history при отправке сообщения из outbox.
+        Иначе возвращает, считать ли изменение доставленным. Если send вернула
+        квитанцию очереди отправки (Future), это тоже DEFERRED: исход
+        отправки обрабатывает restore, получив его через resolve.
+        """
+        if self.outbox is not None:
+            self.outbox.put(self.message_key(tenant, key, status), tenant,
+                            message, self.clock(), transition=(
+                                key, tenant.statuses.get(key), status,
+                                tenant.pending.get(key)))
+            return DEFERRED
+        previous = tenant.statuses.get(key), tenant.pending.get(key)
+        delivered = yield message
+        if hasattr(delivered, 'add_done_callback'):
+            delivered.add_done_callback(
+                lambda receipt: self.resolve(tenant, key, status, *previous,
+                                             receipt.result()))
+            return DEFERRED
+        return delivered
+
+    @staticmethod
+    def message_key(tenant, key, status):
+        """Ключ идемпотентности уведомления об изменении статуса.
+        Тот же переход, полученный из API повторно, даёт тот же ключ,
+        а возврат работы в прежний статус - новый: у него другое время
+        изменения.
+        """
+        return f'{tenant.id}/{key}/{status}/{tenant.pending.get(key)}'
+
+    def recipient(self, entry):
+        """Тенант, в чат которого уходит сообщение из outbox.
+        Для удалённого из реестра тенанта - записанный в outbox чат.
+        """
+        tenant = self.registry.get(entry.tenant_id)
+        if tenant is None:
+            tenant = Tenant(id=entry.tenant_id, token=None,
+                            chat_id=entry.chat_id)
+        return tenant
+
+    def outgoing(self):
+        """Шаги dispatch: выдаёт сообщения outbox, время которых подошло.
+        Отправляются только сообщения, захваченные этим воркером.
+        На время отправки текущим тенантом становится получатель.
+        После неудачи остальные сообщения того же чата ждут повтора,
+        а чат, сообщение которого захватил другой воркер, пропускается.
+        """
+        blocked = set()
+        for entry in self.outbox.due(self.clock()):
+            if entry.chat_id in blocked:
+                continue
+            if not self.in_time('send'):
+                break
+            if not self.outbox.claim(entry, self.clock()):
+                blocked.add(entry.chat_id)
+                continue
+            token = current_tenant.set(self.recipient(entry))
+            try:
+                delivered = yield entry.text
+            except DeadlineExceeded:
+                raise
+            except Exception as error:
+                logging.exception(OUTBOX_SEND_FAIL.format(
+                    key=entry.key, error=error))
+                delivered = False
+            finally:
+                current_tenant.reset(token)
+            self.outbox.done(entry, delivered, self.clock())
+            if not delivered:
+                blocked.add(entry.chat_id)
+            elif entry.transition is not None:
+                self.record(entry.tenant_id, *entry.transition)
+        self.outbox.prune(self.clock())
+
+    def dispatch(self):
+        """Отправляет сообщения outbox, время которых подошло."""
+        self.drive(self.outgoing(), self.deliver)
+
+    async def dispatch_async(self):
+        """То же, что dispatch, для асинхронной функции send."""
+        await self.drive_async(self.outgoing(), self.deliver_async)
+
+    def resolve(self, tenant, key, status, previous, updated, delivered):
+        """Запоминает исход отправки изменения очередью отправки.
+        Вызывается из потока очереди, поэтому только запоминает
+        изменение и время доставки: обрабатывает их restore в потоке
+        движка.
+        """
+        self.receipts.append((tenant, key, status, previous, updated,
+                              self.clock() if delivered else None))
+
+    def restore(self):
+        """Обрабатывает исходы отправок из очереди отправки.
+        Доставленный переход дописывается в журнал history со временем
+        доставки. У недоставленного статус работы и её водяной знак
+        возвращаются к прежним, а тенант опрашивается сразу: изменение
+        будет найдено и отправлено снова. Изменение, которое уже
+        сменилось более новым, не откатывается.
+        """
+        while self.receipts:
+            (tenant, key, status, previous, updated,
+             delivered) = self.receipts.popleft()
+            if delivered is not None:
+                self.record(tenant.id, key, previous, status, updated,
+                            delivered)
+                continue
+            if tenant.statuses.get(key) != status:
+                continue
+            if previous is None:
+                del tenant.statuses[key]
+            else:
+                tenant.statuses[key] = previous
+            if updated is not None:
+                tenant.pending[key] = min(tenant.pending.get(key, updated),
+                                          updated)
+            tenant.etag = tenant.digest = None
+            if self.store is not None:
+                self.store.save_status(tenant, key, previous)
+                self.store.save_tenant(tenant)
+            if self.registry.get(tenant.id) is tenant:
+                self.queue.advance(tenant.id, self.clock())
+
+    def remember(self, tenant, key, status):
+        """Запоминает доставленный статус работы и сохраняет его в store.
+        Возвращает прежний статус и время изменения из pending.
+        """
+        previous = tenant.statuses.get(key)
+        updated = tenant.pending.pop(key, None)
+        tenant.statuses[key] = status
+        tenant.last_status = status
+        if self.store is not None:
+            self.store.save_status(tenant, key, status)
+        return previous, updated
+
+    def record(self, tenant_id, key, previous, status, updated,
+               delivered=None):
+        """Дописывает переход в журнал history (HistoryLog), если он есть.
+        Переход записывается, когда сообщение о нём отправлено, а не когда
+        поставлено в очередь; delivered - время отправки, по умолчанию
+        текущее.
+        """
+        if self.history is not None:
+            self.history.append(tenant_id, key, previous, status, updated,
+                                self.clock() if delivered is None
+                                else delivered)
+
+    @staticmethod
+    def snapshot(tenant):
+        """Поля тенанта, которые сохраняются в хранилище."""
+        return tenant.since(), tenant.last_status, tenant.last_error
+
+    def due(self):
+        """Тенанты, время опроса которых наступило."""
+        for tenant_id in self.queue.pop_due(self.clock()):
+            tenant = self.registry.get(tenant_id)
+            if tenant is None:
+                continue
+            if self.owned is not None and tenant_id not in self.owned:
+                self.queue.push(tenant_id,
+                                self.clock() + self.shard.renew_every)
+                continue
+            yield tenant
+
+    def claim(self):
+        """Продлевает аренду шарда и запоминает тенантов воркера.
+        Опрашиваются только тенанты, арендованные этим воркером;
+        остальные due лишь перепроверяет при продлении аренды.
+        Тенанты делятся по токену: все подписчики токена достаются
+        одному воркеру и получают общий ответ API. Состояние тенантов,
+        перешедших от других воркеров, читается из общего хранилища.
+        """
+        tokens = {tenant.id: tenant.token for tenant in self.registry}
+        owned = self.shard.assign(list(tokens), tokens.get)
+        if self.owned is not None and self.store is not None:
+            for tenant_id in owned - self.owned:
+                self.store.load_tenant(self.registry.get(tenant_id))
+        self.owned = owned
+
+    def reschedule(self, tenant, before):
+        """Сохраняет изменившееся состояние в store и планирует опрос.
+        Подписчики одного токена опрашиваются в одном цикле, чтобы
+        получить общий ответ API: если опрос другого подписчика уже
+        запланирован раньше, тенант присоединяется к нему. Иначе время
+        отправки уведомлений разводило бы подписчиков по разным циклам.
+        Пока есть недоставленные изменения (pending), опрос повторяется
+        не позже schedule.retry: их статусы ещё не попали в statuses,
+        и по известным статусам повтор мог бы ждать часами.
+        """
+        if self.store is not None and self.snapshot(tenant) != before:
+            self.store.save_tenant(tenant)
+        now = self.clock()
+        when = now + self.schedule.interval(*tenant.statuses.values(),
+                                            pending=bool(tenant.pending))
+        planned = self.planned.get(tenant.token)
+        if planned is not None and now < planned < when:
+            when = planned
+        self.planned[tenant.token] = when
+        self.queue.push(tenant.id, when)
+
+    def defer(self, tenant, error):
+        """Переносит опрос тенанта, не уместившийся в цикл.
+        Водяной знак и валидаторы не обновлялись, поэтому в следующем
+        цикле ответ будет обработан заново.
+        """
+        logging.warning(error)
+        self.queue.push(tenant.id, self.clock())
+
+    def start(self):
+        """Начинает цикл: обновляет аренду и задаёт дедлайн цикла.
+        Если задан budget, цикл ограничен этим числом секунд: этапы,
+        до которых дошла очередь после дедлайна, отменяются, а тенанты,
+        которых не успели опросить, переносятся в следующий цикл. С шардом
+        цикл не длиннее периода продления аренды, чтобы аренда не истекла
+        посреди опроса. Результаты flights (SingleFlight, которым обёрнут
+        fetch) сбрасываются: подписчики одного токена получают в цикле
+        один общий ответ API.
+        """
+        budget = self.budget
+        self.restore()
+        if self.flights is not None:
+            self.flights.reset()
+        if self.shard is not None:
+            self.claim()
+            budget = min(budget or self.shard.renew_every,
+                         self.shard.renew_every)
+        deadline = Deadline(budget, self.clock) if budget else None
+        self.deadline = deadline
+        return time.monotonic(), deadline, current_deadline.set(deadline)
+
+    def drain(self, grace):
+        """Ограничивает текущий цикл grace секундами перед остановкой.
+        Тенанты, которых не успеют опросить, останутся в очереди.
+        """
+        if self.deadline is not None:
+            self.deadline.shorten(grace)
+
+    def expedite(self):
+        """Планирует опрос всех тенантов на текущий момент."""
+        self.queue.expedite(self.clock())
+
+    def sync(self, registry):
+        """Приводит реестр движка к новому списку тенантов.
+        Новые тенанты опрашиваются сразу, удалённые больше не опрашиваются,
+        у остальных обновляются токен и чат, а состояние опроса сохраняется.
+        """
+        fresh = {tenant.id: tenant for tenant in registry}
+        for tenant in self.registry:
+            if tenant.id not in fresh:
+                self.registry.remove(tenant.id)
+        for tenant_id, tenant in fresh.items():
+            current = self.registry.get(tenant_id)
+            if current is None:
+                self.registry.add(tenant)
+                self.queue.push(tenant_id, self.clock())
+            else:
+                current.token = tenant.token
+                current.chat_id = tenant.chat_id
+        tokens = {tenant.token for tenant in self.registry}
+        self.planned = {token: when for token, when in self.planned.items()
+                        if token in tokens}
+
+    def align(self):
+        """Выравнивает состояние подписчиков одного токена.
+        Подписчик, опрошенный отдельно (например, после неудачной
+        отправки), получает свой водяной знак, и общий ключ запроса
+        больше не совпадает. Когда все изменения подписчиков доставлены,
+        им присваиваются водяной знак и валидаторы того, чей водяной знак
+        раньше: ответ с него повторит только уже известные статусы.
+        """
+        groups = defaultdict(list)
+        for tenant in self.registry:
+            if tenant.pending or (self.owned is not None
+                                  and tenant.id not in self.owned):
+                continue
+            groups[tenant.token].append(tenant)
+        for subscribers in groups.values():
+            first = min(subscribers, key=lambda tenant: tenant.timestamp)
+            state = first.timestamp, first.etag, first.digest
+            for tenant in subscribers:
+                if (tenant.timestamp, tenant.etag, tenant.digest) == state:
+                    continue
+                tenant.timestamp, tenant.etag, tenant.digest = state
+                if self.store is not None:
+                    self.store.save_tenant(tenant)
+
+    def finish(self, started):
+        """Завершает цикл и возвращает секунды до следующего опроса.
+        С flights состояние подписчиков одного токена выравнивается.
+        """
+        if self.flights is not None:
+            self.align()
+        if self.store is not None:
+            self.store.flush()
+        if self.history is not None:
+            self.history.flush()
+        LOOP_SECONDS.observe(time.monotonic() - started)
+        next_time = self.queue.next_time()
+        if self.outbox is not None:
+            retry_time = self.outbox.next_time()
+            if retry_time is not None:
+                next_time = (retry_time if next_time is None
+                             else min(next_time, retry_time))
+        if next_time is None:
+            delay = self.schedule.idle
+        else:
+            delay = max(next_time - self.clock(), 0)
+        if self.shard is not None:
+            delay = min(delay, self.shard.renew_every)
+        return delay
+
+    def run_once(self):
+        """Опрашивает тенантов, чьё время опроса наступило.
+        При workers > 1 тенанты опрашиваются в пуле потоков poll_pooled.
+        Возвращает число секунд до следующего запланированного опроса.
+        """
+        started, _, token = self.start()
+        try:
+            if self.workers > 1:
+                self.poll_pooled(list(self.due()))
+            else:
+                for tenant in self.due():
+                    before = self.snapshot(tenant)
+                    try:
+                        self.poll(tenant)
+                    except DeadlineExceeded as error:
+                        self.defer(tenant, error)
+                        continue
+                    self.reschedule(tenant, before)
+            if self.outbox is not None:
+                self.dispatch()
+        finally:
+            current_deadline.reset(token)
+        return self.finish(started)
+
+    def poll_pooled(self, tenants):
+        """Опрашивает тенантов в пуле из workers потоков.
+        В потоках пула идут запросы к API, проверка и разбор ответов.
+        Уведомления, учёт ошибок и сохранение состояния выполняются
+        в вызывающем потоке по результатам в порядке расписания.
+        Начатые запросы не прерываются: их время ограничено таймаутами
+        HTTP, а дедлайн цикла отменяет ещё не начатые опросы.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(self.workers,
+                                thread_name_prefix='poll') as pool:
+            polls = [(tenant, self.snapshot(tenant), pool.submit(
+                contextvars.copy_context().run, self.collect, tenant))
+                for tenant in tenants]
+            for tenant, before, future in polls:
+                try:
+                    self.settle(tenant, *future.result())
+                except DeadlineExceeded as error:
+                    self.defer(tenant, error)
+                    continue
+                self.reschedule(tenant, before)
+
+    async def run_once_async(self, concurrency=100):
+        """То же, что run_once, но до concurrency опросов идут одновременно.
+        Функции fetch и send движка должны быть асинхронными. Запросы
+        и разбор ответов, не завершившиеся к дедлайну цикла, отменяются.
+        Отправку уведомлений дедлайн не прерывает: после него новые
+        сообщения не отправляются, как и в run_once, а уже доставленные
+        запоминаются, чтобы не уйти повторно.
+        """
+        import asyncio
+
+        started, deadline, token = self.start()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def poll(tenant):
+            before = self.snapshot(tenant)
+            try:
+                async with semaphore:
+                    collected = await asyncio.wait_for(
+                        self.collect_async(tenant),
+                        deadline.remaining() if deadline else None)
+                    await self.settle_async(tenant, *collected)
+            except DeadlineExceeded as error:
+                return self.defer(tenant, error)
+            except asyncio.TimeoutError:
+                DEADLINES.inc(stage='poll')
+                return self.defer(tenant, DEADLINE_CANCELLED.format(
+                    id=tenant.id))
+            self.reschedule(tenant, before)
+
+        try:
+            await asyncio.gather(*(poll(tenant) for tenant in self.due()))
+            if self.outbox is not None:
+                await self.dispatch_async()
+        finally:
+            current_deadline.reset(token)
+        return self.finish(started)
@@ -0,0 +1,88 @@
+import traceback
+from collections import OrderedDict, defaultdict
+
+from poller.metrics import ERRORS
+
+
+ERROR_KIND = '{type} в {site}'
+ERROR_DIGEST = 'Ошибок вида {kind} за последние {minutes} мин.: {count}.'
+
+
+def fingerprint(error):
+    """Отпечаток ошибки: тип исключения и место, где оно возбуждено.
+    Текст исключения в отпечаток не входит, поэтому ошибки сети
+    с разными подробностями считаются одной ошибкой.
+    """
+    frames = traceback.extract_tb(error.__traceback__)
+    site = f'{frames[-1].name}:{frames[-1].lineno}' if frames else ''
+    return type(error).__name__, site
+
+
+def error_kind(error):
+    """Читаемое название вида ошибки для сводки."""
+    frames = traceback.extract_tb(error.__traceback__)
+    return ERROR_KIND.format(type=type(error).__name__,
+                             site=frames[-1].name if frames else '?')
+
+
+class ErrorDigest:
+    """Считает ошибки тенантов по отпечаткам.
+    О первой ошибке вида сообщается сразу, повторы за период period
+    только считаются и попадают в сводку, которая уходит не чаще раза
+    за период. Счётчики хранятся в LRU не более чем на maxsize видов.
+    """
+
+    def __init__(self, period=3600, maxsize=1024):
+        self.period = period
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._owners = defaultdict(set)
+
+    def record(self, owner, error, now):
+        """Учитывает ошибку; True, если о ней нужно сообщить сразу."""
+        ERRORS.inc(kind=error_kind(error))
+        key = owner, fingerprint(error)
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry['count'] += 1
+            self._entries.move_to_end(key)
+            return False
+        self._entries[key] = {'kind': error_kind(error), 'since': now,
+                              'count': 0}
+        self._owners[owner].add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+        return True
+
+    def discard(self, owner, error):
+        """Забывает ошибку, о которой не удалось сообщить."""
+        self._remove((owner, fingerprint(error)))
+
+    def due(self, owner, now):
+        """Тексты сводок тенанта owner, период которых истёк."""
+        digests = []
+        for key in sorted(self._owners.get(owner, ()),
+                          key=lambda key: self._entries[key]['since']):
+            entry = self._entries[key]
+            if now - entry['since'] < self.period:
+                continue
+            if not entry['count']:
+                self._remove(key)
+                continue
+            digests.append(ERROR_DIGEST.format(
+                kind=entry['kind'], minutes=int(self.period // 60),
+                count=entry['count']))
+            entry['since'] = now
+            entry['count'] = 0
+        return digests
+
+    def _remove(self, key):
+        if self._entries.pop(key, None) is None:
+            return
+        owners = self._owners[key[0]]
+        owners.discard(key)
+        if not owners:
+            del self._owners[key[0]]
+
+    def __len__(self):
+        return len(self._entries)
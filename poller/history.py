@@ -0,0 +1,315 @@
+"""Журнал переходов статусов работ и запросы к нему.
+
+Медиана времени на проверке за месяц, все отказы одного получателя
+и число переходов по статусам:
+
+python -m poller.history time-in history.bin reviewing --month 2026-10
+python -m poller.history list history.bin --tenant student-1 -s rejected
+python -m poller.history count history.bin --since 2026-10-01
+"""
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+# Переход: тенант, работа, статус до и статус после (номера строк
+# словаря, 0 - нет значения), время изменения в API и время доставки.
+RECORD = struct.Struct('<IIIIqd')
+STRINGS_SUFFIX = '.strings'
+HOUR = 3600
+ROW = '{updated}\t{delivered}\t{tenant}\t{homework}\t{old} -> {new}'
+TIME_IN = ('в статусе {status}: работ {count}, медиана {median:.1f} ч, '
+           '90-й перцентиль {p90:.1f} ч')
+TIME_IN_EMPTY = 'в статусе {status}: выходов из статуса нет'
+COUNT = '{status}\t{count}'
+# Сколько записей распаковывать из одного куска отображения.
+CHUNK_RECORDS = 4096
+# Запись как массив 32-битных слов: номер поля - смещение в записи.
+WORDS = RECORD.size // 4
+
+
+class Transition(NamedTuple):
+    """Переход статуса работы из журнала."""
+
+    tenant: str
+    homework: str
+    old: Optional[str]
+    new: str
+    updated: int
+    delivered: float
+
+
+def read_strings(path):
+    """Строки словаря журнала по порядку номеров, начиная с 1.
+    Строка, запись которой оборвалась, не читается.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.endswith('\n')]
+
+
+def _trim(path, size):
+    """Обрезает файл до size байт, если он длиннее."""
+    if os.path.exists(path) and os.path.getsize(path) > size:
+        os.truncate(path, size)
+
+
+class HistoryLog:
+    """Журнал переходов статусов, открытый на дозапись.
+    Каждый переход - запись фиксированного размера RECORD в файле path;
+    тенанты, работы и статусы хранятся номерами строк словаря из файла
+    path.strings (строка JSON на значение). Запись, оборванная падением
+    процесса, отбрасывается при следующем открытии.
+    Журнал пишет один процесс: у каждого воркера свой файл.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        strings_path = path + STRINGS_SUFFIX
+        strings = read_strings(strings_path)
+        _trim(strings_path, sum(
+            len((json.dumps(value, ensure_ascii=False) + '\n').encode())
+            for value in strings))
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+            _trim(path, size - size % RECORD.size)
+        self.ids = {value: number
+                    for number, value in enumerate(strings, start=1)}
+        self._strings = open(strings_path, 'a', encoding='utf-8')
+        self._records = open(path, 'ab')
+
+    def intern(self, value):
+        """Номер строки value в словаре; новая строка дописывается."""
+        if value is None:
+            return 0
+        number = self.ids.get(value)
+        if number is None:
+            number = self.ids[value] = len(self.ids) + 1
+            self._strings.write(json.dumps(value, ensure_ascii=False) + '\n')
+        return number
+
+    def append(self, tenant, homework, old, new, updated, delivered):
+        """Дописывает переход статуса работы."""
+        self._records.write(RECORD.pack(
+            self.intern(tenant), self.intern(homework), self.intern(old),
+            self.intern(new), updated or 0, delivered))
+
+    def flush(self):
+        """Сбрасывает буферы на диск: сначала словарь, затем записи."""
+        self._strings.flush()
+        self._records.flush()
+
+    def close(self):
+        """Сбрасывает буферы и закрывает файлы."""
+        self.flush()
+        self._strings.close()
+        self._records.close()
+
+
+class HistoryReader:
+    """Чтение журнала переходов через mmap.
+    Записи не загружаются в память целиком: они распаковываются по одной
+    из отображения файла, а фильтры сравнивают номера строк словаря
+    до того, как запись превращается в Transition.
+    """
+
+    def __init__(self, path):
+        self.strings = [None, *read_strings(path + STRINGS_SUFFIX)]
+        self.ids = {value: number
+                    for number, value in enumerate(self.strings) if number}
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self.size = size - size % RECORD.size
+        self._map = (mmap.mmap(self._file.fileno(), 0,
+                               access=mmap.ACCESS_READ)
+                     if self.size else None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.size // RECORD.size
+
+    def close(self):
+        """Закрывает отображение и файл."""
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def chunks(self):
+        """Куски отображения по CHUNK_RECORDS записей.
+        В памяти держится только текущий кусок, а брошенный на середине
+        обход не мешает закрыть отображение.
+        """
+        step = RECORD.size * CHUNK_RECORDS
+        for offset in range(0, self.size, step):
+            yield self._map[offset:min(offset + step, self.size)]
+
+    def records(self):
+        """Сырые записи журнала: кортежи номеров и времён."""
+        for chunk in self.chunks():
+            yield from RECORD.iter_unpack(chunk)
+
+    def matching(self, field, number):
+        """Сырые записи, у которых поле field равно number.
+        Поле куска вынимается срезом массива, а совпадения ищутся
+        методом index без распаковки остальных записей.
+        """
+        for chunk in self.chunks():
+            words = array.array('I', chunk)
+            if sys.byteorder == 'big':
+                words.byteswap()
+            column = words[field::WORDS]
+            position = 0
+            while True:
+                try:
+                    position = column.index(number, position)
+                except ValueError:
+                    break
+                yield RECORD.unpack_from(chunk, position * RECORD.size)
+                position += 1
+
+    def decode(self, record):
+        """Transition из сырой записи."""
+        tenant, homework, old, new, updated, delivered = record
+        strings = self.strings
+        return Transition(strings[tenant], strings[homework], strings[old],
+                          strings[new], updated, delivered)
+
+    def select(self, tenant=None, homework=None, status=None, since=None,
+               until=None):
+        """Переходы, подходящие под все заданные условия.
+        status - новый статус; since и until ограничивают время
+        изменения в API (для записей без него - время доставки).
+        """
+        wanted = []
+        for field, value in ((0, tenant), (1, homework), (3, status)):
+            if value is not None:
+                if value not in self.ids:
+                    return
+                wanted.append((field, self.ids[value]))
+        records = self.matching(*wanted[0]) if wanted else self.records()
+        for record in records:
+            if any(record[field] != number for field, number in wanted):
+                continue
+            moment = record[4] or record[5]
+            if since is not None and moment < since:
+                continue
+            if until is not None and moment >= until:
+                continue
+            yield self.decode(record)
+
+    def time_in(self, status, tenant=None, since=None, until=None):
+        """Сколько секунд работы провели в статусе status.
+        Учитываются выходы из статуса в интервале [since, until).
+        """
+        number = self.ids.get(status)
+        owner = self.ids.get(tenant) if tenant is not None else None
+        if number is None or (tenant is not None and owner is None):
+            return []
+        entered = {}
+        durations = []
+        records = self.records() if owner is None else self.matching(
+            0, owner)
+        for record in records:
+            moment = record[4] or record[5]
+            key = record[0], record[1]
+            if record[2] == number and key in entered:
+                started = entered.pop(key)
+                if ((since is None or moment >= since)
+                        and (until is None or moment < until)):
+                    durations.append(moment - started)
+            if record[3] == number:
+                entered[key] = moment
+        return durations
+
+    def count(self, tenant=None, since=None, until=None):
+        """Число переходов по новому статусу."""
+        counts = {}
+        for transition in self.select(tenant, since=since, until=until):
+            counts[transition.new] = counts.get(transition.new, 0) + 1
+        return counts
+
+
+def _moment(value):
+    """Секунды UTC из даты YYYY-MM-DD."""
+    return int(datetime.strptime(value, '%Y-%m-%d').replace(
+        tzinfo=timezone.utc).timestamp())
+
+
+def _month(value):
+    """Границы месяца YYYY-MM в секундах UTC."""
+    start = datetime.strptime(value, '%Y-%m').replace(tzinfo=timezone.utc)
+    end = start.replace(year=start.year + start.month // 12,
+                        month=start.month % 12 + 1)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def _iso(moment):
+    return datetime.fromtimestamp(moment, timezone.utc).strftime(
+        '%Y-%m-%dT%H:%M:%SZ')
+
+
+def percentile(values, share):
+    """Значение, ниже которого лежит доля share значений."""
+    ordered = sorted(values)
+    return ordered[min(int(share * len(ordered)), len(ordered) - 1)]
+
+
+def main(argv=None):
+    """Разбирает аргументы командной строки и выполняет запрос."""
+    import argparse
+    import statistics
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    listing = commands.add_parser('list', help='переходы по условиям')
+    time_in = commands.add_parser('time-in', help='время в статусе')
+    count = commands.add_parser('count', help='переходы по статусам')
+    for command in (listing, time_in, count):
+        command.add_argument('path', help='файл журнала (HISTORY_FILE)')
+        command.add_argument('--tenant')
+        command.add_argument('--since', type=_moment, help='YYYY-MM-DD')
+        command.add_argument('--until', type=_moment, help='YYYY-MM-DD')
+        command.add_argument('--month', type=_month, help='YYYY-MM')
+    time_in.add_argument('state', help='статус, например reviewing')
+    listing.add_argument('--homework')
+    listing.add_argument('-s', '--status', help='новый статус')
+    listing.add_argument('--limit', type=int)
+    args = parser.parse_args(argv)
+    since, until = args.month or (args.since, args.until)
+    with HistoryReader(args.path) as reader:
+        if args.command == 'list':
+            rows = reader.select(args.tenant, args.homework, args.status,
+                                 since, until)
+            for number, row in enumerate(rows):
+                if args.limit is not None and number >= args.limit:
+                    break
+                print(ROW.format(**dict(
+                    row._asdict(), updated=_iso(row.updated),
+                    delivered=_iso(row.delivered))))
+        elif args.command == 'time-in':
+            durations = reader.time_in(args.state, args.tenant, since, until)
+            if not durations:
+                print(TIME_IN_EMPTY.format(status=args.state))
+            else:
+                print(TIME_IN.format(
+                    status=args.state, count=len(durations),
+                    median=statistics.median(durations) / HOUR,
+                    p90=percentile(durations, 0.9) / HOUR))
+        else:
+            for status, number in sorted(reader.count(
+                    args.tenant, since, until).items()):
+                print(COUNT.format(status=status, count=number))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+def httpx_timeout(timeout):
+    """Таймаут requests (число или пара connect/read) для httpx."""
+    import httpx
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+class HttpxSession:
+    """Обёртка над httpx.Client с интерфейсом requests.Session.get.
+    Ошибки транспорта httpx приводятся к requests.RequestException,
+    чтобы вызывающий код обрабатывал их одинаково.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, url, **kwargs):
+        """Выполняет GET-запрос через клиент httpx.
+        Тело читается целиком: потоковый разбор читает его кусками
+        из уже полученного ответа.
+        """
+        import httpx
+        import requests
+        kwargs.pop('stream', None)
+        if 'timeout' in kwargs:
+            kwargs['timeout'] = httpx_timeout(kwargs['timeout'])
+        try:
+            return self.client.get(url, **kwargs)
+        except httpx.HTTPError as error:
+            raise requests.RequestException(error) from error
+
+    def close(self):
+        """Закрывает соединения пула."""
+        self.client.close()
+
+
+def build_session(pool_size, keep_alive=5.0, http2=False):
+    """Создаёт сессию с пулом из pool_size соединений.
+    keep_alive - сколько секунд держать простаивающее соединение открытым
+    (0 - закрывать после каждого запроса). При http2 используется httpx,
+    иначе requests. У requests нет срока простоя соединения: keep_alive
+    лишь включает или выключает keep-alive. Обе библиотеки импортируются
+    только здесь.
+    """
+    if http2:
+        import httpx
+        return HttpxSession(httpx.Client(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size if keep_alive else 0,
+                keepalive_expiry=keep_alive or None,
+            ),
+        ))
+    import requests
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
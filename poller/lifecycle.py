@@ -0,0 +1,126 @@
+import signal
+from contextlib import contextmanager
+
+
+# Через сколько секунд будить процесс, если сигнал пришёл до начала сна.
+WAKE_DELAY = 0.001
+STOP = 'stopping'
+POLL_NOW = 'poll_now'
+RELOAD = 'reload'
+ACTIONS = {
+    'SIGTERM': STOP,
+    'SIGINT': STOP,
+    'SIGUSR1': POLL_NOW,
+    'SIGHUP': RELOAD,
+    'SIGALRM': None,
+}
+
+
+class Wakeup(InterruptedError):
+    """Прерывает ожидание следующего цикла опроса."""
+
+
+class Lifecycle:
+    """Сигналы процесса и прерываемое ожидание между циклами опроса.
+    SIGTERM и SIGINT завершают работу, SIGUSR1 запрашивает опрос всех
+    тенантов немедленно, SIGHUP - перечитывание списка тенантов.
+    Обработчик только выставляет флаг и, если процесс спит внутри
+    interruptible(), прерывает сон исключением Wakeup. Сами действия
+    выполняет основной цикл после пробуждения.
+    При выходе из контекста прежние обработчики сигналов возвращаются.
+    """
+
+    def __init__(self, on_stop=None):
+        self.on_stop = on_stop
+        self.stopping = False
+        self.poll_now = False
+        self.reload = False
+        self._sleeping = False
+        self._previous = {}
+        self._event = None
+
+    def __enter__(self):
+        for name in ACTIONS:
+            signum = getattr(signal, name, None)
+            if signum is not None:
+                self._previous[signum] = signal.signal(signum, self.handle)
+        return self
+
+    def __exit__(self, *exc_info):
+        for signum, handler in self._previous.items():
+            signal.signal(signum, handler)
+        self._previous.clear()
+
+    @property
+    def pending(self):
+        """Есть ли действия, ради которых нужно прервать ожидание."""
+        return self.stopping or self.poll_now or self.reload
+
+    def handle(self, signum, frame):
+        """Обработчик сигналов: запоминает действие и будит процесс."""
+        name = signal.Signals(signum).name
+        action = ACTIONS.get(name)
+        if action is not None:
+            setattr(self, action, True)
+        if action == STOP and self.on_stop is not None:
+            self.on_stop()
+        if self._event is not None:
+            self._event.set()
+        if self._sleeping:
+            self._sleeping = False
+            raise Wakeup(name)
+
+    @contextmanager
+    def interruptible(self):
+        """Блок, который сигнал прерывает исключением Wakeup.
+        Если сигнал пришёл раньше, процесс будится таймером сразу после
+        начала блока, поэтому сигнал не ждёт окончания сна.
+        """
+        self._sleeping = True
+        if self.pending and hasattr(signal, 'setitimer'):
+            signal.setitimer(signal.ITIMER_REAL, WAKE_DELAY)
+        try:
+            yield
+        except Wakeup:
+            pass
+        finally:
+            self._sleeping = False
+
+    def attach(self, loop):
+        """Подключает обработку сигналов к циклу событий asyncio."""
+        import asyncio
+
+        self._event = asyncio.Event()
+        for signum in self.signals():
+            loop.add_signal_handler(signum, self.handle, signum, None)
+        return self
+
+    def detach(self, loop):
+        """Отключает обработку сигналов от цикла событий."""
+        for signum in self.signals():
+            loop.remove_signal_handler(signum)
+        self._event = None
+
+    async def wait(self, seconds):
+        """Асинхронное ожидание seconds секунд, прерываемое сигналом."""
+        import asyncio
+
+        if self.pending:
+            return
+        self._event.clear()
+        try:
+            await asyncio.wait_for(self._event.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    @staticmethod
+    def signals():
+        """Номера сигналов, действия которых обрабатываются."""
+        return [getattr(signal, name) for name, action in ACTIONS.items()
+                if action is not None and hasattr(signal, name)]
+
+    def take(self, action):
+        """Возвращает флаг действия и сбрасывает его."""
+        value = getattr(self, action)
+        setattr(self, action, False)
+        return value
@@ -0,0 +1,85 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+
+from poller.tenants import current_tenant
+
+
+TEXT_FORMAT = '%(asctime)s [%(levelname)s] %(funcName)s %(message)s'
+# Дополнительные поля записи (extra), которые попадают в JSON.
+TIMINGS = ('elapsed',)
+
+
+class TenantFilter(logging.Filter):
+    """Добавляет к записи идентификатор опрашиваемого тенанта.
+    Контекст тенанта есть только в потоке опроса, поэтому его нужно
+    запомнить до того, как запись уйдёт в очередь.
+    """
+
+    def filter(self, record):
+        """Запоминает тенанта в поле tenant записи."""
+        tenant = current_tenant.get()
+        record.tenant = tenant.id if tenant is not None else None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись как одну строку JSON."""
+
+    def format(self, record):
+        """Строка JSON с временем, уровнем, тенантом и сообщением."""
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'func': record.funcName,
+            'tenant': getattr(record, 'tenant', None),
+            'message': record.getMessage(),
+        }
+        for name in TIMINGS:
+            if hasattr(record, name):
+                data[name] = getattr(record, name)
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler для очереди внутри процесса.
+    Стандартный prepare форматирует сообщение и трассировку, чтобы запись
+    можно было сериализовать; здесь это лишнее, и всё форматирование
+    выполняется в потоке QueueListener.
+    """
+
+    def prepare(self, record):
+        """Передаёт запись в очередь без форматирования."""
+        return record
+
+
+def file_handler(path, max_bytes=0, backups=5, when=''):
+    """Файловый обработчик с ротацией по времени (when) или по размеру."""
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=when, backupCount=backups, encoding='utf-8')
+    return logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+
+
+def start_log_listener(handlers, json_lines=False):
+    """Запускает запись логов в handlers из отдельного потока.
+    Возвращает обработчик, который нужно подключить к логгеру: он только
+    кладёт записи в очередь. Поток останавливается при выходе из процесса.
+    """
+    formatter = JsonFormatter() if json_lines else logging.Formatter(
+        TEXT_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    handler = LocalQueueHandler(records)
+    handler.addFilter(TenantFilter())
+    return handler
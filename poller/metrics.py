@@ -0,0 +1,221 @@
+import bisect
+import threading
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"').replace('\n', r'\n'))
+        for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Metric:
+    """Базовый класс метрики с метками."""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self):
+        """Строки HELP и TYPE."""
+        return [f'# HELP {self.name} {self.documentation}',
+                f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    """Монотонно растущий счётчик."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """Увеличивает счётчик с указанными метками."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Текущее значение счётчика."""
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        """Строки в текстовом формате Prometheus."""
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f'{self.name}{_labels(self.labelnames, key)} {value}'
+            for key, value in items]
+
+
+class Gauge(Metric):
+    """Значение, которое читается функцией в момент выдачи метрик."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, function):
+        super().__init__(name, documentation)
+        self.function = function
+
+    def render(self):
+        """Строки в текстовом формате Prometheus."""
+        return self.header() + [f'{self.name} {self.function()}']
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам (например, задержек)."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """Учитывает одно наблюдение."""
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(
+                key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        """Число наблюдений с указанными метками."""
+        counts, _ = self._values.get(self._key(labels), ((), 0.0))
+        return sum(counts)
+
+    def render(self):
+        """Строки в текстовом формате Prometheus."""
+        with self._lock:
+            items = sorted(
+                (key, (list(counts), total))
+                for key, (counts, total) in self._values.items())
+        lines = self.header()
+        names = self.labelnames + ('le',)
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket'
+                             f'{_labels(names, key + (bound,))} {cumulative}')
+            labels = _labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Набор метрик, выдаваемых одной страницей."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        """Добавляет метрику; повторная регистрация заменяет прежнюю."""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """Создаёт и регистрирует счётчик."""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, function):
+        """Создаёт и регистрирует показатель, читаемый функцией."""
+        return self.register(Gauge(name, documentation, function))
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        """Создаёт и регистрирует гистограмму."""
+        return self.register(
+            Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def serve(registry, port, host='127.0.0.1'):
+    """Выдаёт метрики по HTTP на /metrics из фонового потока."""
+    from http import HTTPStatus
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):  # noqa: N802
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(HTTPStatus.NOT_FOUND)
+                return
+            body = registry.render().encode()
+            self.send_response(HTTPStatus.OK)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics',
+                     daemon=True).start()
+    return server
+
+
+REGISTRY = Registry()
+
+API_REQUESTS = REGISTRY.histogram(
+    'homework_api_request_seconds',
+    'Длительность запросов к API Практикума по коду ответа или исключению.',
+    ('outcome',))
+CHECK_FAILURES = REGISTRY.counter(
+    'homework_check_response_failures_total',
+    'Ответы API, не прошедшие check_response.', ('error',))
+PARSE_OUTCOMES = REGISTRY.counter(
+    'homework_parse_status_total',
+    'Результаты parse_status: статус работы или тип исключения.',
+    ('outcome',))
+MESSAGES = REGISTRY.counter(
+    'homework_send_message_total',
+    'Отправленные в Telegram сообщения.', ('result',))
+LOOP_SECONDS = REGISTRY.histogram(
+    'homework_loop_iteration_seconds', 'Длительность цикла опроса.')
+DEADLINES = REGISTRY.counter(
+    'homework_deadline_exceeded_total',
+    'Этапы опроса, отменённые по дедлайну цикла.', ('stage',))
+ERRORS = REGISTRY.counter(
+    'homework_poll_errors_total',
+    'Сбои опроса по виду ошибки.', ('kind',))
+BREAKER_TRANSITIONS = REGISTRY.counter(
+    'homework_api_breaker_transitions_total',
+    'Переходы автомата защиты API по адресу и новому состоянию.',
+    ('endpoint', 'state'))
+BREAKER_REJECTED = REGISTRY.counter(
+    'homework_api_breaker_rejected_total',
+    'Запросы к API, не отправленные из-за разомкнутого автомата.',
+    ('endpoint',))
+COALESCED = REGISTRY.counter(
+    'homework_api_requests_coalesced_total',
+    'Опросы, получившие ответ API из запроса другого подписчика токена.')
+TELEGRAM_QUEUE_WAIT = REGISTRY.histogram(
+    'telegram_queue_wait_seconds',
+    'Время от постановки сообщения в очередь Telegram до его отправки.')
@@ -0,0 +1,246 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from poller.metrics import TELEGRAM_QUEUE_WAIT
+
+
+SEND_OK = 'Сообщение доставлено в чат {chat_id} через {wait:.3f} с.'
+SEND_RETRY_AFTER = ('Telegram просит подождать {seconds} с '
+                    'перед отправкой в чат {chat_id}.')
+SEND_RETRY = 'Ошибка отправки в чат {chat_id}, попытка {attempt}: {error}'
+SEND_DROPPED = ('Сообщение в чат {chat_id} не доставлено '
+                'за {attempts} попыток: {text}')
+SEND_ABANDONED = 'Сообщение в чат {chat_id} не отправлено до остановки: {text}'
+QUEUE_STATS = ('Очередь Telegram: в очереди {depth}, отправлено {sent}, '
+               'не доставлено {failed}, ожидание среднее {wait_avg:.3f} с, '
+               'максимальное {wait_max:.3f} с.')
+
+
+class TokenBucket:
+    """Ведро токенов: не больше rate событий в секунду, всплеск до capacity."""
+
+    def __init__(self, rate, capacity=None, now=0.0):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now):
+        """Через сколько секунд появится свободный токен."""
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        """Забирает токен."""
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, now, seconds):
+        """Запрещает события на ближайшие seconds секунд."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class OutboundQueue:
+    """Очередь исходящих сообщений Telegram с ограничением скорости.
+    Общее ведро токенов ограничивает скорость бота в целом, отдельные
+    вёдра - скорость в каждый чат. Очередь разбирает отдельный поток,
+    поэтому медленный Telegram не задерживает опрос API. Ответ 429
+    (исключение с атрибутом retry_after) приостанавливает отправку
+    в чат на указанное время, сообщение при этом не теряется.
+    Функция send(chat_id, text) должна выбрасывать исключение при ошибке.
+    put возвращает квитанцию (Future): True - сообщение доставлено,
+    False - отброшено после retries попыток или при остановке.
+    """
+
+    def __init__(self, send, rate=30, chat_rate=1, retries=3, backoff=1.0,
+                 report_period=60, clock=time.monotonic):
+        self.send = send
+        self.rate = rate
+        self.chat_rate = chat_rate
+        self.retries = retries
+        self.backoff = backoff
+        self.report_period = report_period
+        self.clock = clock
+        self.global_bucket = TokenBucket(rate, now=clock())
+        self._condition = threading.Condition()
+        self._chats = {}
+        self._buckets = {}
+        self._ready = []
+        self._counter = itertools.count()
+        self._stopping = False
+        self._thread = None
+        self._reported = clock()
+        self.depth = 0
+        self.sent = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def start(self):
+        """Запускает поток, разбирающий очередь."""
+        self._thread = threading.Thread(
+            target=self._run, name='telegram-outbound', daemon=True)
+        self._thread.start()
+        return self
+
+    def put(self, chat_id, text):
+        """Ставит сообщение в очередь чата и возвращает его квитанцию."""
+        receipt = Future()
+        with self._condition:
+            now = self.clock()
+            if chat_id not in self._chats:
+                self._chats[chat_id] = deque()
+                self._schedule(chat_id, now)
+            self._chats[chat_id].append([now, text, 0, receipt])
+            self.depth += 1
+            self._condition.notify()
+        return receipt
+
+    def _schedule(self, chat_id, when):
+        heapq.heappush(self._ready, (when, next(self._counter), chat_id))
+
+    def _bucket(self, chat_id, now):
+        if chat_id not in self._buckets:
+            self._buckets[chat_id] = TokenBucket(
+                self.chat_rate, capacity=1, now=now)
+        return self._buckets[chat_id]
+
+    def _next(self):
+        """Ждёт, пока какой-либо чат сможет принять сообщение."""
+        with self._condition:
+            while True:
+                if self._stopping and not self._ready:
+                    return None
+                now = self.clock()
+                timeout = None
+                if self._ready:
+                    when, _, chat_id = self._ready[0]
+                    timeout = max(when - now, self.global_bucket.delay(now))
+                    if timeout <= 0:
+                        heapq.heappop(self._ready)
+                        bucket = self._bucket(chat_id, now)
+                        chat_delay = bucket.delay(now)
+                        if chat_delay > 0:
+                            self._schedule(chat_id, now + chat_delay)
+                            continue
+                        bucket.take(now)
+                        self.global_bucket.take(now)
+                        return chat_id, self._chats[chat_id].popleft()
+                self._condition.wait(timeout)
+
+    def _done(self, chat_id, item, error):
+        """Учитывает результат отправки и планирует следующее сообщение."""
+        with self._condition:
+            now = self.clock()
+            retry_after = getattr(error, 'retry_after', None)
+            if error is None:
+                self.depth -= 1
+                self.sent += 1
+                item[3].set_result(True)
+            elif retry_after is not None:
+                logging.warning(SEND_RETRY_AFTER.format(
+                    seconds=retry_after, chat_id=chat_id))
+                self._bucket(chat_id, now).pause(now, retry_after)
+                self._chats[chat_id].appendleft(item)
+            elif item[2] + 1 < self.retries:
+                item[2] += 1
+                logging.warning(SEND_RETRY.format(
+                    chat_id=chat_id, attempt=item[2], error=error))
+                self._bucket(chat_id, now).pause(
+                    now, self.backoff * 2 ** (item[2] - 1))
+                self._chats[chat_id].appendleft(item)
+            else:
+                logging.error(SEND_DROPPED.format(
+                    chat_id=chat_id, attempts=self.retries, text=item[1]))
+                self.depth -= 1
+                self.failed += 1
+                item[3].set_result(False)
+            if self._chats.get(chat_id):
+                self._schedule(chat_id, now)
+            else:
+                self._chats.pop(chat_id, None)
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            task = self._next()
+            if task is None:
+                return
+            chat_id, item = task
+            wait = self.clock() - item[0]
+            error = None
+            try:
+                self.send(chat_id, item[1])
+            except Exception as exception:
+                error = exception
+            else:
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+                TELEGRAM_QUEUE_WAIT.observe(wait)
+                logging.debug(SEND_OK.format(chat_id=chat_id, wait=wait))
+            self._done(chat_id, item, error)
+            if self.clock() - self._reported >= self.report_period:
+                self._reported = self.clock()
+                logging.info(QUEUE_STATS.format(**self.stats()))
+
+    def stats(self):
+        """Глубина очереди, счётчики и время ожидания отправки."""
+        return dict(
+            depth=self.depth,
+            sent=self.sent,
+            failed=self.failed,
+            wait_avg=self.wait_total / self.sent if self.sent else 0.0,
+            wait_max=self.wait_max,
+        )
+
+    def close(self, timeout=None):
+        """Дожидается отправки сообщений из очереди и останавливает поток.
+        Возвращает True, если очередь успела опустеть за timeout секунд.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        return self.depth == 0
+
+    def abandon(self):
+        """Снимает неотправленные сообщения с очереди.
+        Их квитанции получают False, чтобы изменения можно было вернуть
+        и отправить после перезапуска. Сообщение, которое отправляется
+        прямо сейчас, доотправляется.
+        """
+        with self._condition:
+            self._ready.clear()
+            for chat_id, items in self._chats.items():
+                while items:
+                    item = items.popleft()
+                    logging.error(SEND_ABANDONED.format(
+                        chat_id=chat_id, text=item[1]))
+                    self.depth -= 1
+                    self.failed += 1
+                    item[3].set_result(False)
+
+
+class QueuedBot:
+    """Замена telegram.Bot для send_message: ставит сообщение в очередь."""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def send_message(self, chat_id, text, **kwargs):
+        """Ставит сообщение в очередь отправки и возвращает квитанцию."""
+        return self.queue.put(chat_id, text)
@@ -0,0 +1,174 @@
+import json
+import logging
+import sqlite3
+from typing import NamedTuple, Optional
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    tenant_id TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_at REAL NOT NULL,
+    sent_at REAL,
+    transition TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_unsent ON outbox (sent_at, seq);
+'''
+OUTBOX_RETRY = ('Сообщение {key} в чат {chat_id} не доставлено, '
+                'попытка {attempts}; следующая через {delay:.0f} с.')
+OUTBOX_SENT = 'Сообщение {key} доставлено с попытки {attempts}.'
+# Больше удвоений пауза всё равно упирается в max_backoff.
+MAX_DOUBLINGS = 32
+# На сколько секунд воркер захватывает сообщение для отправки: если он
+# упадёт посреди отправки, сообщение потом отправит другой воркер.
+CLAIM_SECONDS = 60
+
+
+class OutboxEntry(NamedTuple):
+    """Сообщение из outbox, ожидающее подтверждения отправки."""
+
+    seq: int
+    key: str
+    tenant_id: str
+    chat_id: str
+    text: str
+    attempts: int
+    transition: Optional[tuple] = None
+
+
+class Outbox:
+    """Очередь уведомлений в SQLite, которая переживает перезапуск.
+    Уведомление считается принятым, как только записано в базу: движок
+    сдвигает статус работы сразу, а отправкой занимается сам outbox.
+    Неудачная отправка повторяется через backoff * 2 ** n секунд (не
+    больше max_backoff) без нового запроса к API. Сообщения одного чата
+    уходят по порядку: пока первое не доставлено, следующие ждут.
+    Ключ идемпотентности key не даёт поставить одно уведомление дважды,
+    например если после падения то же изменение пришло из API снова.
+    Поэтому доставленные сообщения хранятся ещё keep секунд.
+    Сообщение, доставленное прямо перед падением процесса, может уйти
+    повторно: Telegram не принимает ключей идемпотентности.
+    Базу могут делить несколько воркеров: перед отправкой сообщение
+    захватывается (claim), и отправляет его только захвативший воркер.
+    """
+
+    def __init__(self, path, backoff=30.0, max_backoff=3600.0,
+                 keep=7 * 24 * 3600):
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.keep = keep
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        columns = {row[1] for row in self.connection.execute(
+            'PRAGMA table_info(outbox)')}
+        if 'transition' not in columns:
+            # База, созданная до появления журнала переходов.
+            self.connection.execute(
+                'ALTER TABLE outbox ADD COLUMN transition TEXT')
+        # Число недоставленных сообщений на момент последнего due();
+        # его читает и поток метрик, которому соединение недоступно.
+        self.depth, = self.connection.execute(
+            'SELECT COUNT(*) FROM outbox WHERE sent_at IS NULL').fetchone()
+
+    def put(self, key, tenant, text, now, transition=None):
+        """Ставит сообщение в очередь; возвращает False, если ключ уже был.
+        Запись фиксируется сразу. transition - переход статуса, о котором
+        сообщение: его возвращает entry.transition при отправке.
+        """
+        if transition is not None:
+            transition = json.dumps(transition, ensure_ascii=False)
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT OR IGNORE INTO outbox '
+                '(key, tenant_id, chat_id, text, created, next_at, '
+                'transition) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, tenant.id, str(tenant.chat_id), text, now, now,
+                 transition))
+        added = cursor.rowcount == 1
+        self.depth += added
+        return added
+
+    def due(self, now):
+        """Недоставленные сообщения чатов, время отправки которых подошло.
+        Сообщения идут в порядке постановки; чат, первое сообщение
+        которого ещё ждёт повтора, пропускается целиком.
+        """
+        waiting = set()
+        entries = []
+        rows = self.connection.execute(
+            'SELECT seq, key, tenant_id, chat_id, text, attempts, '
+            'transition, next_at '
+            'FROM outbox WHERE sent_at IS NULL ORDER BY seq')
+        self.depth = 0
+        for *fields, transition, next_at in rows:
+            self.depth += 1
+            entry = OutboxEntry(*fields, transition and tuple(
+                json.loads(transition)))
+            if entry.chat_id in waiting:
+                continue
+            if next_at > now:
+                waiting.add(entry.chat_id)
+                continue
+            entries.append(entry)
+        return entries
+
+    def claim(self, entry, now):
+        """Захватывает сообщение для отправки на CLAIM_SECONDS секунд.
+        Возвращает False, если его уже захватил или отправил другой
+        воркер.
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                'UPDATE outbox SET next_at = ? '
+                'WHERE seq = ? AND sent_at IS NULL AND next_at <= ?',
+                (now + CLAIM_SECONDS, entry.seq, now))
+        return cursor.rowcount == 1
+
+    def done(self, entry, delivered, now):
+        """Подтверждает доставку или планирует повтор отправки."""
+        attempts = entry.attempts + 1
+        with self.connection:
+            if delivered:
+                self.connection.execute(
+                    'UPDATE outbox SET attempts = ?, sent_at = ? '
+                    'WHERE seq = ?', (attempts, now, entry.seq))
+                self.depth -= 1
+                logging.debug(OUTBOX_SENT.format(key=entry.key,
+                                                 attempts=attempts))
+                return
+            delay = min(self.max_backoff, self.backoff * 2 ** min(
+                entry.attempts, MAX_DOUBLINGS))
+            self.connection.execute(
+                'UPDATE outbox SET attempts = ?, next_at = ? WHERE seq = ?',
+                (attempts, now + delay, entry.seq))
+        logging.warning(OUTBOX_RETRY.format(
+            key=entry.key, chat_id=entry.chat_id, attempts=attempts,
+            delay=delay))
+
+    def next_time(self):
+        """Время ближайшей отправки или None, если очередь пуста.
+        Учитываются только первые сообщения чатов: остальные ждут их.
+        SQLite берёт next_at из строки с MIN(seq) каждой группы.
+        """
+        next_at, = self.connection.execute(
+            'SELECT MIN(next_at) FROM (SELECT next_at, MIN(seq) '
+            'FROM outbox WHERE sent_at IS NULL GROUP BY chat_id)'
+        ).fetchone()
+        return next_at
+
+    def prune(self, now):
+        """Удаляет сообщения, доставленные больше keep секунд назад."""
+        with self.connection:
+            self.connection.execute(
+                'DELETE FROM outbox WHERE sent_at < ?', (now - self.keep,))
+
+    def close(self):
+        """Закрывает базу."""
+        self.connection.close()
@@ -0,0 +1,83 @@
+import hashlib
+import re
+from http import HTTPStatus
+
+
+# Метка времени сервера меняется в каждом ответе, поэтому в отпечаток
+# тела она не входит: одинаковые списки работ дают одинаковый отпечаток.
+CURRENT_DATE = re.compile(rb'"current_date"\s*:\s*(-?\d+)')
+
+
+class Payload(dict):
+    """Ответ API вместе с валидаторами для проверки его неизменности.
+    unchanged=True означает, что тело совпало с последним обработанным
+    ответом тенанта: его не декодировали, и обрабатывать его не нужно.
+    streamed=True означает, что работы разбираются и проверяются по мере
+    чтения тела (см. poller.stream).
+    """
+
+    def __init__(self, data=(), etag=None, digest=None, unchanged=False,
+                 streamed=False):
+        super().__init__(data)
+        self.etag = etag
+        self.digest = digest
+        self.unchanged = unchanged
+        self.streamed = streamed
+
+
+def body_digest(content):
+    """Отпечаток тела ответа без current_date и сама current_date."""
+    match = CURRENT_DATE.search(content)
+    current_date = int(match.group(1)) if match else None
+    digest = hashlib.blake2b(
+        CURRENT_DATE.sub(b'', content), digest_size=16).hexdigest()
+    return digest, current_date
+
+
+class PayloadCache:
+    """Быстрый путь для ответов, не изменившихся с прошлого опроса.
+    Если API отдаёт ETag, запрос делается с If-None-Match и ответ 304
+    считается совпадением. Иначе сравнивается отпечаток сырого тела.
+    Валидаторы хранятся в тенанте и обновляются движком только после
+    полной обработки ответа, чтобы недоставленные изменения не терялись.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def headers(tenant):
+        """Заголовки условного запроса для тенанта."""
+        return {'If-None-Match': tenant.etag} if tenant.etag else {}
+
+    def match(self, tenant, response, digest=True):
+        """Проверяет ответ на совпадение с последним обработанным.
+        Возвращает пару (payload, validators): payload - готовый ответ
+        с unchanged=True при совпадении или None, validators - ETag и
+        отпечаток нового тела. При digest=False тело не читается
+        (потоковый разбор), и совпадение определяется только по ETag.
+        """
+        if response.status_code == HTTPStatus.NOT_MODIFIED:
+            self.hits += 1
+            return Payload(etag=tenant.etag, digest=tenant.digest,
+                           unchanged=True), None
+        headers = getattr(response, 'headers', None) or {}
+        content = getattr(response, 'content', None) if digest else None
+        etag = headers.get('ETag')
+        if not isinstance(content, bytes):
+            self.misses += 1
+            return None, (etag, None)
+        digest, current_date = body_digest(content)
+        if tenant.digest is not None and digest == tenant.digest:
+            self.hits += 1
+            data = {} if current_date is None else {
+                'current_date': current_date}
+            return Payload(data, etag, digest, unchanged=True), None
+        self.misses += 1
+        return None, (etag, digest)
+
+    def ratio(self):
+        """Доля ответов, обработанных по быстрому пути."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
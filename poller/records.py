@@ -0,0 +1,57 @@
+import sys
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+
+class Homework(NamedTuple):
+    """Работа из ответа API: только поля, которые нужны боту.
+    Кортеж без словаря атрибутов занимает в несколько раз меньше памяти,
+    чем словарь из ответа API со всеми его полями. date_updated хранится
+    в секундах. Запись читается так же, как словарь: homework['status']
+    и homework.get('status').
+    """
+
+    id: Optional[str]
+    homework_name: Optional[str]
+    status: Optional[str]
+    date_updated: Optional[int]
+
+    def get(self, key, default=None):
+        """Значение поля key, а для отсутствующего поля - default."""
+        value = getattr(self, key) if key in self._fields else None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            return tuple.__getitem__(self, key)
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+
+def timestamp(value):
+    """Время в секундах из строки ISO 8601 или None."""
+    if isinstance(value, int):
+        return value
+    try:
+        return int(datetime.fromisoformat(
+            value.replace('Z', '+00:00')).timestamp())
+    except (TypeError, AttributeError, ValueError):
+        return None
+
+
+def to_record(homework):
+    """Компактная запись из словаря работы; запись возвращается как есть.
+    Строки статусов интернируются: у всех работ с одним статусом
+    в памяти остаётся одна строка.
+    """
+    if isinstance(homework, Homework):
+        return homework
+    key = homework.get('id')
+    status = homework.get('status')
+    return Homework(
+        id=str(key) if key is not None else None,
+        homework_name=homework.get('homework_name'),
+        status=sys.intern(status) if isinstance(status, str) else status,
+        date_updated=timestamp(homework.get('date_updated')),
+    )
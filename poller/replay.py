@@ -0,0 +1,182 @@
+import bisect
+import builtins
+import functools
+import json
+import threading
+import time
+from http import HTTPStatus
+
+from poller.breaker import CircuitOpen, UpstreamError
+from poller.payload import Payload
+from poller.tenants import current_tenant
+
+
+# Наименьший шаг виртуальных часов между циклами: движок, которому
+# нечего ждать, не должен крутиться на месте.
+MIN_STEP = 1.0
+
+
+class VirtualClock:
+    """Виртуальные часы: время идёт, только когда его переводят."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        """Текущее виртуальное время."""
+        return self.now
+
+    def sleep(self, seconds):
+        """Переводит часы на seconds секунд вперёд."""
+        self.now += max(seconds, 0)
+
+
+class Recorder:
+    """Записывает ответы и сбои fetch в трассу формата JSON Lines.
+    Строка трассы: время запроса, тенант, from_date и ответ API
+    (answer), признак неизменившегося ответа (unchanged) или тип
+    и текст исключения (error, message). Токены в трассу не пишутся.
+    Потоковые ответы (STREAM_PARSE) записать нельзя: их тело читается
+    позже, уже движком.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.clock = clock
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, timestamp, answer=None, error=None):
+        """Дописывает в трассу один запрос к API."""
+        tenant = current_tenant.get()
+        entry = {'time': self.clock(),
+                 'tenant': tenant.id if tenant is not None else None,
+                 'from_date': timestamp}
+        if error is not None:
+            entry.update(error=type(error).__name__, message=str(error))
+        elif getattr(answer, 'unchanged', False):
+            entry.update(unchanged=True,
+                         current_date=answer.get('current_date'))
+        else:
+            entry['answer'] = answer
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def wrap(self, fetch):
+        """Функция fetch, запросы которой записываются в трассу.
+        Поддерживаются и обычные, и асинхронные функции.
+        """
+        import inspect
+
+        if inspect.iscoroutinefunction(fetch):
+            @functools.wraps(fetch)
+            async def recorded_async(timestamp):
+                try:
+                    answer = await fetch(timestamp)
+                except Exception as error:
+                    self.write(timestamp, error=error)
+                    raise
+                self.write(timestamp, answer)
+                return answer
+            return recorded_async
+
+        @functools.wraps(fetch)
+        def recorded(timestamp):
+            try:
+                answer = fetch(timestamp)
+            except Exception as error:
+                self.write(timestamp, error=error)
+                raise
+            self.write(timestamp, answer)
+            return answer
+        return recorded
+
+    def close(self):
+        """Закрывает файл трассы."""
+        self._file.close()
+
+
+def load_trace(lines):
+    """Записи трассы из строк JSON Lines; пустые строки пропускаются."""
+    return [json.loads(line) for line in lines if line.strip()]
+
+
+class ReplayApi:
+    """Замена get_api_answer, отвечающая записанной трассой.
+    Тенант получает последний ответ, записанный для него не позже
+    текущего времени виртуальных часов; до первой записи - пустой
+    список работ. Неизменившийся ответ отдаётся как последний полный
+    ответ с новым current_date, поэтому повторно его отсеивает уже
+    сам конвейер. Записанные сбои возбуждаются снова.
+    """
+
+    def __init__(self, trace, clock):
+        self.clock = clock
+        self.requests = 0
+        self.start = min((entry['time'] for entry in trace), default=0)
+        self.end = max((entry['time'] for entry in trace), default=0)
+        self._times = {}
+        self._entries = {}
+        last = {}
+        for entry in sorted(trace, key=lambda entry: entry['time']):
+            tenant = entry['tenant']
+            if 'answer' in entry:
+                last[tenant] = entry['answer']
+            elif entry.get('unchanged') and tenant in last:
+                entry = dict(entry, answer=dict(
+                    last[tenant], current_date=entry.get('current_date')))
+            self._times.setdefault(tenant, []).append(entry['time'])
+            self._entries.setdefault(tenant, []).append(entry)
+
+    def tenants(self):
+        """Идентификаторы тенантов из трассы."""
+        return sorted(tenant for tenant in self._entries
+                      if tenant is not None)
+
+    def __call__(self, timestamp):
+        """Записанный ответ API текущему тенанту на момент часов."""
+        self.requests += 1
+        tenant = current_tenant.get()
+        tenant_id = tenant.id if tenant is not None else None
+        index = bisect.bisect_right(
+            self._times.get(tenant_id, []), self.clock()) - 1
+        if index < 0:
+            return Payload({'homeworks': [],
+                            'current_date': int(self.clock())})
+        entry = self._entries[tenant_id][index]
+        if 'error' in entry:
+            raise self.error(entry)
+        if 'answer' not in entry:
+            return Payload({'homeworks': [],
+                            'current_date': entry.get('current_date')})
+        answer = entry['answer']
+        return Payload(answer) if isinstance(answer, dict) else answer
+
+    @staticmethod
+    def error(entry):
+        """Исключение записанного типа с записанным текстом."""
+        name, message = entry['error'], entry['message']
+        if name == 'UpstreamError':
+            return UpstreamError(message, HTTPStatus.INTERNAL_SERVER_ERROR)
+        if name == 'CircuitOpen':
+            return CircuitOpen(message)
+        error_type = getattr(builtins, name, None)
+        if isinstance(error_type, type) and issubclass(error_type, Exception):
+            return error_type(message)
+        return ConnectionError(message)
+
+
+def replay(engine, clock, until, cap=None):
+    """Гоняет циклы движка под виртуальными часами до момента until.
+    Между циклами часы переводятся на задержку, которую вернул движок
+    (не больше cap, не меньше MIN_STEP). Возвращает число циклов.
+    """
+    cycles = 0
+    while clock() <= until:
+        delay = engine.run_once()
+        cycles += 1
+        if cap is not None:
+            delay = min(delay, cap)
+        clock.sleep(max(delay, MIN_STEP))
+    return cycles
@@ -0,0 +1,104 @@
+import heapq
+import itertools
+
+
+CHECK_INTERVAL = 'Неверно задан интервал опроса: {value}.'
+CHECK_INTERVAL_RANGE = ('Минимальный интервал опроса {minimum} больше '
+                        'максимального {maximum}.')
+
+DEFAULT_INTERVALS = {
+    'reviewing': 120,
+    'rejected': 600,
+    'approved': 3600,
+}
+
+
+class PollSchedule:
+    """Интервалы опроса в зависимости от последнего статуса работы.
+    Пока работа на ревью, опрашиваем часто; когда она проверена или
+    работ нет вовсе (idle), - редко. Пока изменение не доставлено,
+    опрос повторяется не реже чем через retry секунд. Интервалы
+    ограничены снизу и сверху значениями minimum и maximum.
+    """
+
+    def __init__(self, intervals=None, idle=1200, minimum=60, maximum=3600,
+                 retry=600):
+        if minimum > maximum:
+            raise ValueError(CHECK_INTERVAL_RANGE.format(
+                minimum=minimum, maximum=maximum))
+        self.intervals = dict(DEFAULT_INTERVALS, **(intervals or {}))
+        self.idle = idle
+        self.minimum = minimum
+        self.maximum = maximum
+        self.retry = retry
+
+    def interval(self, *statuses, pending=False):
+        """Через сколько секунд опрашивать работы с такими статусами.
+        Решает самая активная работа: берётся наименьший интервал.
+        С pending - не позже retry: есть недоставленные изменения.
+        """
+        seconds = min((self.intervals.get(status, self.idle)
+                       for status in set(statuses)), default=self.idle)
+        if pending:
+            seconds = min(seconds, self.retry)
+        return min(max(seconds, self.minimum), self.maximum)
+
+    @staticmethod
+    def parse(text):
+        """Разбирает строку вида 'reviewing=120,approved=3600'."""
+        intervals = {}
+        for item in filter(None, (part.strip() for part in text.split(','))):
+            status, _, seconds = item.partition('=')
+            try:
+                intervals[status.strip()] = float(seconds)
+            except ValueError:
+                raise ValueError(CHECK_INTERVAL.format(value=item))
+        return intervals
+
+
+class DueQueue:
+    """Очередь ключей, упорядоченная по времени следующего опроса.
+    Выборка наступивших ключей стоит O(log n) на ключ, поэтому цикл
+    не перебирает всех тенантов при каждом пробуждении.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+
+    def push(self, key, when):
+        """Планирует опрос ключа на момент when."""
+        heapq.heappush(self._heap, (when, next(self._counter), key))
+
+    def pop_due(self, now):
+        """Извлекает ключи, время опроса которых уже наступило."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def advance(self, key, when):
+        """Переносит опрос ключа на момент when, если он назначен позже.
+        Ключ, которого нет в очереди, добавляется. Стоит O(n): нужно
+        только для редких внеочередных опросов.
+        """
+        for index, (planned, order, queued) in enumerate(self._heap):
+            if queued == key:
+                if when < planned:
+                    self._heap[index] = (when, order, key)
+                    heapq.heapify(self._heap)
+                return
+        self.push(key, when)
+
+    def expedite(self, now):
+        """Переносит все запланированные на будущее опросы на момент now."""
+        self._heap = [(min(when, now), order, key)
+                      for when, order, key in self._heap]
+        heapq.heapify(self._heap)
+
+    def next_time(self):
+        """Время ближайшего опроса или None, если очередь пуста."""
+        return self._heap[0][0] if self._heap else None
+
+    def __len__(self):
+        return len(self._heap)
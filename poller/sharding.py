@@ -0,0 +1,159 @@
+import bisect
+import hashlib
+import sqlite3
+import time
+from contextlib import contextmanager
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    tenant_id TEXT PRIMARY KEY,
+    worker TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+'''
+
+
+def _hash(key):
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Консистентное хеширование ключей по узлам.
+    Каждый узел занимает replicas точек на кольце, поэтому при добавлении
+    или удалении узла переезжает лишь около 1/N ключей.
+    """
+
+    def __init__(self, nodes, replicas=64):
+        self.nodes = sorted(set(nodes))
+        points = sorted(
+            (_hash(f'{node}#{replica}'), node)
+            for node in self.nodes for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def owner(self, key):
+        """Узел, которому принадлежит ключ, или None для пустого кольца."""
+        if not self._nodes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+class LeaseBoard:
+    """Аренда тенантов воркерами в общей базе SQLite.
+    Воркер отмечается в таблице workers и берёт тенантов в аренду
+    на ttl секунд. Чужую аренду можно забрать только после её истечения,
+    поэтому тенанта в каждый момент опрашивает не больше одного воркера.
+    """
+
+    def __init__(self, path, worker, ttl=90, clock=time.time):
+        self.worker = worker
+        self.ttl = ttl
+        self.clock = clock
+        self.connection = sqlite3.connect(path, timeout=30,
+                                          isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+
+    def heartbeat(self):
+        """Продлевает присутствие воркера и возвращает живых воркеров."""
+        now = self.clock()
+        with self._transaction():
+            self.connection.execute(
+                'INSERT OR REPLACE INTO workers (id, heartbeat) '
+                'VALUES (?, ?)', (self.worker, now))
+            self.connection.execute(
+                'DELETE FROM workers WHERE heartbeat < ?', (now - self.ttl,))
+            rows = self.connection.execute('SELECT id FROM workers')
+            return [worker for worker, in rows]
+
+    def acquire(self, tenant_ids):
+        """Берёт или продлевает аренду тенантов, свободных или своих.
+        Возвращает множество тенантов, аренда которых за воркером.
+        """
+        now = self.clock()
+        with self._transaction():
+            self.connection.executemany(
+                'INSERT INTO leases (tenant_id, worker, expires) '
+                'VALUES (?, ?, ?) ON CONFLICT (tenant_id) DO UPDATE SET '
+                'worker = excluded.worker, expires = excluded.expires '
+                'WHERE leases.worker = excluded.worker '
+                'OR leases.expires < ?',
+                [(tenant_id, self.worker, now + self.ttl, now)
+                 for tenant_id in tenant_ids])
+            rows = self.connection.execute(
+                'SELECT tenant_id FROM leases WHERE worker = ?',
+                (self.worker,))
+            return {tenant_id for tenant_id, in rows}
+
+    def release(self, tenant_ids):
+        """Отдаёт аренду тенантов другим воркерам."""
+        with self._transaction():
+            self.connection.executemany(
+                'DELETE FROM leases WHERE tenant_id = ? AND worker = ?',
+                [(tenant_id, self.worker) for tenant_id in tenant_ids])
+
+    def leave(self):
+        """Снимает воркера и все его аренды."""
+        with self._transaction():
+            self.connection.execute(
+                'DELETE FROM leases WHERE worker = ?', (self.worker,))
+            self.connection.execute(
+                'DELETE FROM workers WHERE id = ?', (self.worker,))
+
+    def close(self):
+        """Закрывает соединение с базой."""
+        self.connection.close()
+
+    @contextmanager
+    def _transaction(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+
+class Shard:
+    """Доля тенантов, которую опрашивает этот воркер.
+    Желаемая доля вычисляется по кольцу живых воркеров, фактическая -
+    по аренде: тенанта, который переехал к другому воркеру, прежний
+    владелец отпускает на следующем цикле, и только тогда новый
+    владелец может его взять.
+    """
+
+    def __init__(self, board, replicas=64):
+        self.board = board
+        self.replicas = replicas
+
+    @property
+    def renew_every(self):
+        """Как часто продлевать аренду, секунд."""
+        return self.board.ttl / 3
+
+    def assign(self, tenant_ids, key=None):
+        """Обновляет аренду и возвращает тенантов этого воркера.
+        Место тенанта на кольце задаёт key(tenant_id), по умолчанию сам
+        id: тенанты с одинаковым ключом достаются одному воркеру.
+        """
+        key = key or str
+        ring = HashRing(self.board.heartbeat(), self.replicas)
+        wanted = {tenant_id for tenant_id in tenant_ids
+                  if ring.owner(key(tenant_id)) == self.board.worker}
+        held = self.board.acquire(wanted)
+        extra = held - wanted
+        if extra:
+            self.board.release(extra)
+        return held - extra
+
+    def leave(self):
+        """Отпускает всех тенантов при остановке воркера."""
+        self.board.leave()
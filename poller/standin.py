@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+HOMEWORKS_PATH = '/api/user_api/homework_statuses/'
+STATUSES = ('reviewing', 'rejected', 'approved')
+
+
+class StandInServer(ThreadingHTTPServer):
+    """HTTP-сервер с длинной очередью соединений.
+    При стандартной очереди из 5 соединений параллельные запросы пула
+    потоков теряют SYN и ждут его повтора целую секунду.
+    """
+
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class StandIn:
+    """Локальная замена API Практикум.Домашки и Telegram Bot API.
+    Отвечает на GET homework_statuses и POST /bot<токен>/sendMessage
+    с задержкой latency (и telegram_latency). Каждый токен получает
+    homeworks работ с комментарием ревьюера длиной comment_size символов;
+    при change_every > 0 статус первой работы меняется каждые
+    change_every запросов этого токена. Параметр from_date не учитывается:
+    размер ответа задаётся только homeworks и comment_size. Счётчики
+    запросов доступны в polls и messages.
+    """
+
+    def __init__(self, latency=0.0, homeworks=1, comment_size=0,
+                 change_every=0, telegram_latency=0.0,
+                 host='127.0.0.1', port=0):
+        self.latency = latency
+        self.homeworks = homeworks
+        self.comment_size = comment_size
+        self.change_every = change_every
+        self.telegram_latency = telegram_latency
+        self.polls = 0
+        self.messages = 0
+        self.sent = []
+        self._counters = {}
+        self._lock = threading.Lock()
+        self.server = StandInServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        """Базовый адрес сервера."""
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def endpoint(self):
+        """Адрес, подставляемый вместо ENDPOINT."""
+        return self.url + HOMEWORKS_PATH
+
+    @property
+    def telegram_url(self):
+        """Значение base_url для telegram.Bot."""
+        return self.url + '/bot'
+
+    def start(self):
+        """Запускает сервер в фоновом потоке."""
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name='standin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Останавливает сервер."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def homeworks_body(self, token):
+        """Тело ответа homework_statuses для токена."""
+        with self._lock:
+            self.polls += 1
+            count = self._counters.get(token, 0)
+            self._counters[token] = count + 1
+        status = 'approved'
+        if self.change_every:
+            status = STATUSES[count // self.change_every % len(STATUSES)]
+        homeworks = [{
+            'id': number,
+            'homework_name': f'{token}__homework_{number}.zip',
+            'status': status if number == 0 else 'approved',
+            'reviewer_comment': 'x' * self.comment_size,
+            'date_updated': '2020-02-13T14:40:57Z',
+            'lesson_name': f'Спринт {number}',
+        } for number in range(self.homeworks)]
+        return {'homeworks': homeworks, 'current_date': int(time.time())}
+
+    def message_body(self, chat_id, text):
+        """Тело ответа sendMessage в формате Telegram Bot API."""
+        with self._lock:
+            self.messages += 1
+            self.sent.append((chat_id, text))
+            message_id = self.messages
+        return {'ok': True, 'result': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id) if str(chat_id).lstrip('-').isdigit()
+                     else 0, 'type': 'private'},
+            'text': text,
+        }}
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def reply(self, status, data):
+                body = json.dumps(data, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):  # noqa: N802
+                url = urlparse(self.path)
+                if url.path != HOMEWORKS_PATH:
+                    return self.reply(HTTPStatus.NOT_FOUND, {})
+                authorization = self.headers.get('Authorization', '')
+                if not authorization.startswith('OAuth '):
+                    return self.reply(HTTPStatus.UNAUTHORIZED, {
+                        'code': 'not_authenticated',
+                        'message': 'Учетные данные не были предоставлены.'})
+                time.sleep(standin.latency)
+                self.reply(HTTPStatus.OK, standin.homeworks_body(
+                    authorization[len('OAuth '):]))
+
+            def do_POST(self):  # noqa: N802
+                if not self.path.endswith('/sendMessage'):
+                    return self.reply(HTTPStatus.NOT_FOUND, {'ok': False})
+                length = int(self.headers.get('Content-Length', 0))
+                raw = self.rfile.read(length).decode()
+                if self.headers.get('Content-Type', '').startswith(
+                        'application/json'):
+                    data = json.loads(raw or '{}')
+                else:
+                    data = {key: values[0]
+                            for key, values in parse_qs(raw).items()}
+                time.sleep(standin.telegram_latency)
+                self.reply(HTTPStatus.OK, standin.message_body(
+                    data.get('chat_id'), data.get('text')))
+
+        return Handler
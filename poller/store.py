@@ -0,0 +1,115 @@
+import sqlite3
+import sys
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tenants (
+    id TEXT PRIMARY KEY,
+    timestamp INTEGER NOT NULL,
+    last_status TEXT,
+    last_error TEXT
+);
+CREATE TABLE IF NOT EXISTS statuses (
+    tenant_id TEXT NOT NULL,
+    homework TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (tenant_id, homework)
+);
+'''
+
+
+class StateStore:
+    """Хранилище состояния тенантов в SQLite.
+    Хранит водяной знак (с учётом недоставленных изменений), последний
+    статус каждой работы и отпечаток последней ошибки, чтобы после
+    перезапуска не повторять уведомления и не пропускать изменения,
+    случившиеся во время простоя.
+    Строки статусов интернируются, как и в записях работ из ответа API.
+    Изменения копятся в транзакции и фиксируются пачками: по batch_size
+    записей или при вызове flush().
+    """
+
+    def __init__(self, path, batch_size=100):
+        self.batch_size = batch_size
+        self.pending = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def load(self, registry):
+        """Восстанавливает состояние зарегистрированных тенантов.
+        Каждая таблица читается одним запросом, поэтому стоимость
+        загрузки - O(1) на тенанта.
+        """
+        rows = self.connection.execute(
+            'SELECT id, timestamp, last_status, last_error FROM tenants')
+        for tenant_id, timestamp, last_status, last_error in rows:
+            tenant = registry.get(tenant_id)
+            if tenant is not None:
+                tenant.timestamp = timestamp
+                tenant.last_status = last_status
+                tenant.last_error = last_error
+        rows = self.connection.execute(
+            'SELECT tenant_id, homework, status FROM statuses')
+        for tenant_id, homework, status in rows:
+            tenant = registry.get(tenant_id)
+            if tenant is not None:
+                tenant.statuses[homework] = sys.intern(status)
+        return registry
+
+    def load_tenant(self, tenant):
+        """Перечитывает состояние одного тенанта из базы.
+        Нужно, когда тенанта до этого опрашивал другой воркер.
+        """
+        row = self.connection.execute(
+            'SELECT timestamp, last_status, last_error FROM tenants '
+            'WHERE id = ?', (tenant.id,)).fetchone()
+        if row is not None:
+            tenant.timestamp, tenant.last_status, tenant.last_error = row
+        tenant.statuses = {
+            homework: sys.intern(status)
+            for homework, status in self.connection.execute(
+                'SELECT homework, status FROM statuses WHERE tenant_id = ?',
+                (tenant.id,))}
+        tenant.pending.clear()
+        tenant.etag = tenant.digest = None
+        return tenant
+
+    def save_tenant(self, tenant):
+        """Сохраняет водяной знак, последний статус и ошибку тенанта."""
+        self._write(
+            'INSERT OR REPLACE INTO tenants '
+            '(id, timestamp, last_status, last_error) VALUES (?, ?, ?, ?)',
+            (tenant.id, tenant.since(), tenant.last_status,
+             tenant.last_error))
+
+    def save_status(self, tenant, homework, status):
+        """Сохраняет последний доставленный статус работы тенанта.
+        status=None - о работе ещё ничего не доставлено.
+        """
+        if status is None:
+            self._write(
+                'DELETE FROM statuses WHERE tenant_id = ? AND homework = ?',
+                (tenant.id, homework))
+            return
+        self._write(
+            'INSERT OR REPLACE INTO statuses (tenant_id, homework, status) '
+            'VALUES (?, ?, ?)', (tenant.id, homework, status))
+
+    def _write(self, query, parameters):
+        self.connection.execute(query, parameters)
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Фиксирует накопленные изменения."""
+        if self.pending:
+            self.connection.commit()
+            self.pending = 0
+
+    def close(self):
+        """Фиксирует изменения и закрывает базу."""
+        self.flush()
+        self.connection.close()
@@ -0,0 +1,164 @@
+import codecs
+import json
+
+from poller.payload import Payload
+
+
+STREAM_TYPE_DICT = 'Ответ API не соответствует словарю (dict).'
+STREAM_TYPE_LIST = ('В ответе API ключ homeworks не соответствует '
+                    'списку list(). Передан тип данных {type}')
+STREAM_NO_KEY = 'В ответе API нет ключа {value}.'
+STREAM_ERROR_KEY = 'Ошибка в ответе API: {name}: {value}.'
+STREAM_SYNTAX = ('Некорректный JSON в ответе API: ожидался {expected}, '
+                 'позиция {position}.')
+
+DECODER = json.JSONDecoder()
+WHITESPACE = ' \t\n\r'
+
+
+class _Reader:
+    """Буфер над потоком байтов с разбором JSON по одному значению.
+    Прочитанная часть буфера отбрасывается при подгрузке, поэтому
+    в памяти держится только текущее значение и последний кусок потока.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.consumed = 0
+        self.eof = False
+
+    def more(self):
+        """Подгружает следующий кусок. False - поток закончился."""
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        self.consumed += self.pos
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        if chunk is None:
+            self.eof = True
+            self.buffer += self.decoder.decode(b'', final=True)
+            return False
+        self.buffer += self.decoder.decode(chunk)
+        return True
+
+    def peek(self):
+        """Следующий значащий символ ('' в конце потока)."""
+        while True:
+            while (self.pos < len(self.buffer)
+                   and self.buffer[self.pos] in WHITESPACE):
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.more():
+                return ''
+
+    def take(self, expected):
+        """Забирает один из ожидаемых символов-разделителей."""
+        char = self.peek()
+        if not char or char not in expected:
+            raise ValueError(STREAM_SYNTAX.format(
+                expected=' или '.join(expected),
+                position=self.consumed + self.pos))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Разбирает очередное JSON-значение целиком."""
+        self.peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.more():
+                    raise
+                continue
+            # Число на границе куска могло оборваться: дочитываем поток.
+            if end == len(self.buffer) and not self.eof:
+                self.more()
+                continue
+            self.pos = end
+            return value
+
+
+def iter_homeworks(chunks, meta):
+    """Потоково разбирает ответ API и выдаёт работы по одной.
+    Проверяет форму ответа по ходу чтения: корень - словарь, homeworks -
+    список, ключей code и error нет. Остальные ключи верхнего уровня
+    (например, current_date) записываются в словарь meta.
+    Пиковая память не зависит от числа работ в ответе.
+    """
+    reader = _Reader(chunks)
+    if reader.peek() != '{':
+        raise TypeError(STREAM_TYPE_DICT)
+    reader.take('{')
+    has_homeworks = False
+    if reader.peek() == '}':
+        reader.take('}')
+    else:
+        while True:
+            key = reader.value()
+            reader.take(':')
+            if key == 'homeworks':
+                has_homeworks = True
+                yield from _iter_list(reader)
+            else:
+                meta[key] = reader.value()
+                if key in ('code', 'error'):
+                    raise ValueError(STREAM_ERROR_KEY.format(
+                        name=key, value=meta[key]))
+            if reader.take(',}') == '}':
+                break
+    if not has_homeworks:
+        raise TypeError(STREAM_NO_KEY.format(value='homeworks'))
+
+
+def _iter_list(reader):
+    if reader.peek() != '[':
+        raise TypeError(STREAM_TYPE_LIST.format(type=type(reader.value())))
+    reader.take('[')
+    if reader.peek() == ']':
+        reader.take(']')
+        return
+    while True:
+        yield reader.value()
+        if reader.take(',]') == ']':
+            return
+
+
+class StreamedPayload(Payload):
+    """Ответ API, который держит открытое HTTP-соединение до конца разбора."""
+
+    def __init__(self, response):
+        super().__init__(streamed=True)
+        self.response = response
+
+    def close(self):
+        """Закрывает ответ, если разбор прерван до конца тела."""
+        self.response.close()
+
+
+def stream_payload(response, chunk_size):
+    """Ответ API, работы которого разбираются по мере чтения тела.
+    Ключ homeworks содержит генератор; остальные ключи ответа появляются
+    в словаре после того, как генератор будет исчерпан. Ответ
+    закрывается, когда генератор исчерпан или прерван, либо вызовом
+    close().
+    """
+    payload = StreamedPayload(response)
+
+    def homeworks():
+        if hasattr(response, 'iter_content'):
+            chunks = response.iter_content(chunk_size)
+        else:
+            chunks = response.iter_bytes(chunk_size)
+        try:
+            yield from iter_homeworks(chunks, payload)
+        finally:
+            response.close()
+
+    payload['homeworks'] = homeworks()
+    return payload
@@ -0,0 +1,95 @@
+import contextvars
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional
+
+
+CHECK_TENANT_KEY = 'В описании тенанта нет ключа {key}: {line}.'
+CHECK_TENANT_DUPLICATE = 'Тенант {id} описан повторно.'
+
+# Тенант, для которого сейчас выполняется опрос. Через него функции
+# модуля homework узнают токен Практикума и чат для отправки сообщений.
+current_tenant = contextvars.ContextVar('current_tenant', default=None)
+
+
+@dataclass
+class Tenant:
+    """Пара токен Практикума / чат Telegram и состояние её опроса.
+    timestamp - current_date последнего проверенного ответа API,
+    pending - водяные знаки работ, изменения которых ещё не доставлены.
+    """
+
+    id: str
+    token: str
+    chat_id: str
+    timestamp: int = 0
+    last_status: Optional[str] = None
+    last_error: Optional[str] = None
+    statuses: Dict[str, str] = field(default_factory=dict)
+    etag: Optional[str] = None
+    digest: Optional[str] = None
+    pending: Dict[str, int] = field(default_factory=dict)
+
+    def since(self):
+        """Водяной знак, с которого нужно запрашивать работы.
+        Не позже самого раннего из недоставленных изменений.
+        """
+        return min([self.timestamp, *self.pending.values()])
+
+
+class TenantRegistry:
+    """Реестр тенантов с доступом по идентификатору за O(1)."""
+
+    def __init__(self):
+        self._tenants: Dict[str, Tenant] = {}
+
+    def add(self, tenant):
+        """Регистрирует тенанта. Идентификаторы не должны повторяться."""
+        if tenant.id in self._tenants:
+            raise ValueError(CHECK_TENANT_DUPLICATE.format(id=tenant.id))
+        self._tenants[tenant.id] = tenant
+        return tenant
+
+    def remove(self, tenant_id):
+        """Удаляет тенанта; возвращает его или None."""
+        return self._tenants.pop(tenant_id, None)
+
+    def get(self, tenant_id):
+        """Возвращает тенанта по идентификатору или None."""
+        return self._tenants.get(tenant_id)
+
+    def __iter__(self) -> Iterator[Tenant]:
+        return iter(list(self._tenants.values()))
+
+    def __len__(self):
+        return len(self._tenants)
+
+    def load(self, lines, timestamp):
+        """Загружает тенантов из строк формата JSON Lines.
+        Каждая строка - объект с ключами token, chat_id и необязательным id
+        (по умолчанию совпадает с chat_id). Пустые строки пропускаются.
+        chat_id может быть списком: тогда токен подписывает все эти чаты,
+        и для каждого заводится тенант с id вида <id>:<chat_id>.
+        """
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            for key in ('token', 'chat_id'):
+                if key not in data:
+                    raise KeyError(CHECK_TENANT_KEY.format(key=key, line=line))
+            chats = data['chat_id']
+            if not isinstance(chats, list):
+                chat_id = str(chats)
+                self.add(Tenant(id=str(data.get('id', chat_id)),
+                                token=data['token'], chat_id=chat_id,
+                                timestamp=timestamp))
+                continue
+            for chat in chats:
+                chat_id = str(chat)
+                self.add(Tenant(
+                    id=f'{data["id"]}:{chat_id}' if 'id' in data else chat_id,
+                    token=data['token'], chat_id=chat_id,
+                    timestamp=timestamp))
+        return self
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from functools import partial
+
+import httpx
+import pytest
+
+from poller.schedule import PollSchedule
+from poller.standin import STATUSES, StandIn
+from poller.tenants import Tenant, current_tenant
+from utils import make_engine, make_registry
+
+LATENCY = 0.1
+TENANTS = 10
+
+
+@pytest.fixture
+def standin(monkeypatch, homework_module):
+    with StandIn(latency=LATENCY, change_every=1) as standin:
+        monkeypatch.setattr(homework_module, 'ENDPOINT', standin.endpoint)
+        monkeypatch.setattr(homework_module, 'TELEGRAM_API_URL',
+                            standin.telegram_url)
+        yield standin
+
+
+def standin_engine(homework_module, client):
+    return make_engine(
+        make_registry(ids=[str(number) for number in range(TENANTS)]),
+        partial(homework_module.async_get_api_answer, client),
+        check=homework_module.check_response,
+        parse=homework_module.parse_status,
+        send=partial(homework_module.async_send_message, client),
+        schedule=PollSchedule(dict.fromkeys(STATUSES, 0), idle=0,
+                              minimum=0, maximum=0))
+
+
+class TestAsync:
+
+    def test_get_api_answer(self, standin, homework_module):
+        async def fetch():
+            async with httpx.AsyncClient() as client:
+                return await homework_module.async_get_api_answer(client, 0)
+
+        answer = asyncio.run(fetch())
+        homework_module.check_response(answer)
+        assert answer['homeworks'][0]['status'] == 'reviewing'
+
+    def test_get_api_answer_connection_error(self, homework_module,
+                                             monkeypatch):
+        monkeypatch.setattr(homework_module, 'ENDPOINT',
+                            'http://127.0.0.1:9/homework_statuses/')
+
+        async def fetch():
+            async with httpx.AsyncClient() as client:
+                return await homework_module.async_get_api_answer(client, 0)
+
+        with pytest.raises(ConnectionError):
+            asyncio.run(fetch())
+
+    def test_send_message(self, standin, homework_module):
+        async def send():
+            current_tenant.set(Tenant(id='7', token='x', chat_id='7'))
+            async with httpx.AsyncClient() as client:
+                return await homework_module.async_send_message(client, 'hi')
+
+        assert asyncio.run(send()) is True
+        assert standin.sent == [('7', 'hi')]
+
+    def test_concurrent_cycle(self, standin, homework_module):
+        async def cycle():
+            async with httpx.AsyncClient() as client:
+                engine = standin_engine(homework_module, client)
+                started = time.perf_counter()
+                await engine.run_once_async(concurrency=TENANTS)
+                return time.perf_counter() - started
+
+        elapsed = asyncio.run(cycle())
+        assert standin.polls == TENANTS
+        assert standin.messages == TENANTS
+        assert {chat for chat, _ in standin.sent} == {
+            str(number) for number in range(TENANTS)}
+        assert elapsed < LATENCY * TENANTS / 2
+
+
+class TestSameSteps:
+
+    def run_both(self, answers):
+        """Журналы событий обычного и асинхронного движков."""
+        logs = []
+        for asynchronous in (False, True):
+            events = []
+            results = iter(answers)
+            now = [0]
+
+            def fetch(timestamp):
+                events.append('fetch')
+                result = next(results)
+                if result is None:
+                    raise ConnectionError('down')
+                return result
+
+            def send(message):
+                events.append(message.split()[0])
+                return True
+
+            async def fetch_async(timestamp):
+                return fetch(timestamp)
+
+            async def send_async(message):
+                return send(message)
+
+            engine = make_engine(
+                make_registry(), fetch_async if asynchronous else fetch,
+                parse=lambda homework: f'status: {homework["status"]}',
+                send=send_async if asynchronous else send,
+                clock=lambda: now[0])
+            for _ in answers:
+                engine.expedite()
+                if asynchronous:
+                    asyncio.run(engine.run_once_async())
+                else:
+                    engine.run_once()
+                now[0] += 1800
+            logs.append(events)
+        return logs
+
+    def test_sync_and_async_share_order(self):
+        sync_events, async_events = self.run_both([
+            None, None,
+            {'homeworks': [{'id': 1, 'status': 'approved'}],
+             'current_date': 1}])
+        # Сводка ошибок уходит после запроса, перед уведомлениями.
+        assert sync_events == async_events == [
+            'fetch', 'Произошел', 'fetch', 'fetch', 'Ошибок', 'status:']
@@ -0,0 +1,86 @@
+import pytest
+
+from poller.breaker import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker,
+                            CircuitOpen, UpstreamError)
+from poller.metrics import BREAKER_TRANSITIONS
+from poller.replay import VirtualClock
+from utils import make_engine, make_registry
+
+
+def make_breaker(clock, threshold=3, jitter=1.0):
+    return CircuitBreaker('api', threshold=threshold, backoff=10,
+                          max_backoff=60, clock=clock,
+                          jitter=lambda: jitter)
+
+
+def down(timestamp):
+    raise ConnectionError('down')
+
+
+class TestCircuitBreaker:
+
+    def test_opens_after_threshold_and_rejects(self):
+        clock = VirtualClock()
+        breaker = make_breaker(clock)
+        fetch = breaker.wrap(down)
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                fetch(0)
+        assert breaker.state == OPEN
+        assert breaker.retry_at == 10
+        with pytest.raises(CircuitOpen):
+            fetch(0)
+
+    def test_single_probe_then_close(self):
+        clock = VirtualClock()
+        breaker = make_breaker(clock, threshold=1)
+        with pytest.raises(ConnectionError):
+            breaker.wrap(down)(0)
+        clock.now = 10
+        breaker.allow()
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpen):
+            breaker.allow()
+        breaker.record()
+        assert breaker.state == CLOSED
+        assert breaker.wrap(lambda timestamp: 'ok')(0) == 'ok'
+
+    def test_failed_probe_doubles_backoff_with_jitter(self):
+        clock = VirtualClock()
+        breaker = make_breaker(clock, threshold=1, jitter=0.5)
+        fetch = breaker.wrap(down)
+        delays = []
+        for _ in range(4):
+            with pytest.raises(ConnectionError):
+                fetch(0)
+            delays.append(breaker.retry_at - clock.now)
+            clock.now = breaker.retry_at
+        assert delays == [5, 10, 20, 30]
+
+    def test_client_errors_do_not_trip(self):
+        breaker = make_breaker(VirtualClock(), threshold=1)
+        breaker.record(ValueError('401'))
+        assert breaker.state == CLOSED
+        breaker.record(UpstreamError('503', 503))
+        assert breaker.state == OPEN
+        assert BREAKER_TRANSITIONS.value(endpoint='api', state=OPEN) >= 1
+
+
+class TestEngineBreaker:
+
+    def test_outage_costs_threshold_requests(self):
+        registry = make_registry(10)
+        calls = []
+
+        def fetch(timestamp):
+            calls.append(timestamp)
+            raise ConnectionError('down')
+
+        clock = VirtualClock()
+        breaker = make_breaker(clock)
+        sent = []
+        engine = make_engine(registry, breaker.wrap(fetch), sent, clock=clock)
+        engine.run_once()
+        assert len(calls) == 3
+        assert len(sent) == 10
+        assert breaker.state == OPEN
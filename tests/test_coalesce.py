@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import time
+
+from homework import request_key
+from poller.coalesce import SingleFlight
+from poller.metrics import COALESCED
+from poller.tenants import Tenant, TenantRegistry, current_tenant
+from utils import make_engine
+
+
+def subscriptions():
+    return TenantRegistry().load([
+        '{"id": "anna", "token": "a", "chat_id": ["mum", "group", "anna"]}',
+        '{"token": "b", "chat_id": "boris"}',
+    ], timestamp=10)
+
+
+class CountingApi:
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def answer(self, timestamp):
+        token = current_tenant.get().token
+        with self.lock:
+            self.calls.append(token)
+        return {'homeworks': [{'homework_name': f'hw-{token}',
+                               'status': 'approved'}],
+                'current_date': timestamp + 100}
+
+    def __call__(self, timestamp):
+        time.sleep(self.delay)
+        return self.answer(timestamp)
+
+
+def coalescing_engine(registry, fetch, sent=None, **options):
+    flights = SingleFlight(request_key)
+    return make_engine(
+        registry, flights.wrap(fetch), sent,
+        parse=lambda homework: homework['homework_name'], flights=flights,
+        **options)
+
+
+class TestSubscriptions:
+
+    def test_chat_list_expands_to_subscriptions(self):
+        registry = subscriptions()
+        assert sorted(tenant.id for tenant in registry) == [
+            'anna:anna', 'anna:group', 'anna:mum', 'boris']
+        assert registry.get('anna:mum').token == 'a'
+
+
+class TestSingleFlight:
+
+    def test_one_request_per_token_per_cycle(self):
+        registry = subscriptions()
+        api = CountingApi()
+        sent = []
+        engine = coalescing_engine(registry, api, sent)
+        before = COALESCED.value()
+        engine.run_once()
+        assert sorted(api.calls) == ['a', 'b']
+        assert COALESCED.value() - before == 2
+        assert sorted(sent) == [('anna', 'hw-a'), ('boris', 'hw-b'),
+                                ('group', 'hw-a'), ('mum', 'hw-a')]
+
+    def test_subscribers_stay_together_across_cycles(self):
+        registry = subscriptions()
+        now = [0.0]
+
+        def fetch(timestamp):
+            now[0] += 0.05
+            return api.answer(timestamp)
+
+        def send(message):
+            now[0] += 0.1
+            return True
+
+        api = CountingApi()
+        engine = coalescing_engine(registry, fetch, send=send,
+                                   clock=lambda: now[0])
+        while now[0] < 3 * 3600 + 60:
+            now[0] += engine.run_once()
+        assert api.calls.count('a') == api.calls.count('b') == 4
+
+    def test_subscribers_realigned_after_failed_send(self):
+        registry = subscriptions()
+        now = [0.0]
+        failed = []
+
+        def fetch(timestamp):
+            now[0] += 1
+            return api.answer(timestamp)
+
+        def send(message):
+            chat = current_tenant.get().chat_id
+            if chat == 'mum' and not failed:
+                failed.append(chat)
+                return False
+            return True
+
+        api = CountingApi()
+        engine = coalescing_engine(registry, fetch, send=send,
+                                   clock=lambda: now[0])
+        cycles = []
+        while now[0] < 6 * 3600:
+            api.calls.clear()
+            now[0] += engine.run_once()
+            cycles.append(api.calls.count('a'))
+        active = [calls for calls in cycles if calls]
+        # Отдельно mum опрашивается только при повторе отправки.
+        assert failed == ['mum']
+        assert active[-3:] == [1, 1, 1]
+
+    def test_diverged_subscribers_fetch_separately(self):
+        registry = subscriptions()
+        registry.get('anna:mum').timestamp = 5
+        api = CountingApi()
+        coalescing_engine(registry, api).run_once()
+        assert sorted(api.calls) == ['a', 'a', 'b']
+
+    def test_concurrent_callers_share_request(self):
+        registry = subscriptions()
+        api = CountingApi(delay=0.05)
+        sent = []
+        coalescing_engine(registry, api, sent, workers=4).run_once()
+        assert sorted(api.calls) == ['a', 'b']
+        assert len(sent) == 4
+
+    def test_error_shared_with_subscribers(self):
+        registry = subscriptions()
+        calls = []
+
+        def fetch(timestamp):
+            calls.append(current_tenant.get().token)
+            raise ConnectionError('down')
+
+        sent = []
+        coalescing_engine(registry, fetch, sent).run_once()
+        assert sorted(calls) == ['a', 'b']
+        assert len(sent) == 4
+
+    def test_async_callers_share_request(self):
+        registry = TenantRegistry()
+        for chat in ('one', 'two', 'three'):
+            registry.add(Tenant(id=chat, token='a', chat_id=chat))
+        api = CountingApi()
+
+        async def fetch(timestamp):
+            await asyncio.sleep(0.01)
+            return api.answer(timestamp)
+
+        async def send(message):
+            return True
+
+        engine = coalescing_engine(registry, fetch, send=send)
+        asyncio.run(engine.run_once_async())
+        assert api.calls == ['a']
+        assert all(tenant.statuses for tenant in registry)
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+
+from poller import metrics
+from poller.deadline import (Deadline, DeadlineExceeded, bounded,
+                             current_deadline)
+from poller.replay import VirtualClock
+from poller.schedule import PollSchedule
+from poller.standin import StandIn
+from utils import make_engine, make_registry
+
+
+class TestDeadline:
+
+    def test_remaining_and_check(self):
+        clock = VirtualClock()
+        deadline = Deadline(10, clock)
+        clock.now = 4
+        assert deadline.remaining() == 6
+        deadline.check('fetch')
+        clock.now = 11
+        assert deadline.remaining() == 0
+        before = metrics.DEADLINES.value(stage='fetch')
+        with pytest.raises(DeadlineExceeded):
+            deadline.check('fetch')
+        assert metrics.DEADLINES.value(stage='fetch') == before + 1
+
+    def test_bounded(self):
+        assert bounded(30) == 30
+        clock = VirtualClock()
+        token = current_deadline.set(Deadline(5, clock))
+        try:
+            assert bounded(30) == 5
+            clock.now = 10
+            assert 0 < bounded(30) < 0.01
+        finally:
+            current_deadline.reset(token)
+
+
+class TestEngineDeadline:
+
+    SCHEDULE = PollSchedule(idle=100, minimum=100, maximum=100)
+
+    def test_overrun_tenants_are_deferred(self):
+        clock = VirtualClock()
+        registry = make_registry(3)
+
+        def slow_fetch(timestamp):
+            clock.now += 6
+            return {'homeworks': [{'homework_name': 'hw',
+                                   'status': 'approved'}],
+                    'current_date': 1}
+
+        sent = []
+        engine = make_engine(registry, slow_fetch, sent, clock=clock,
+                             schedule=self.SCHEDULE, budget=10)
+        assert engine.run_once() == 0
+        # t0 уложился в бюджет, у t1 отменена проверка, t2 не опрошен.
+        assert sent == [('chat0', 'approved')]
+        assert registry.get('t0').timestamp == 1
+        assert registry.get('t1').timestamp == 0
+        assert registry.get('t2').timestamp == 0
+        assert registry.get('t2').last_error is None
+
+        assert engine.run_once() == 0
+        assert [chat for chat, _ in sent] == ['chat0', 'chat1']
+        engine.run_once()
+        assert [chat for chat, _ in sent] == ['chat0', 'chat1', 'chat2']
+
+    def test_async_overrun_is_cancelled(self):
+        registry = make_registry(2)
+
+        async def hanging_fetch(timestamp):
+            await asyncio.sleep(60)
+
+        sent = []
+        engine = make_engine(registry, hanging_fetch, sent,
+                             schedule=self.SCHEDULE, budget=0.1,
+                             clock=time.monotonic)
+        before = metrics.DEADLINES.value(stage='poll')
+        asyncio.run(engine.run_once_async())
+        assert metrics.DEADLINES.value(stage='poll') == before + 2
+        assert sent == []
+        assert len(engine.queue) == 2
+
+    def test_async_send_finishes_after_deadline(self):
+        registry = make_registry()
+
+        async def fetch(timestamp):
+            return {'homeworks': [
+                {'homework_name': name, 'status': name}
+                for name in ('third', 'second', 'first')],
+                'current_date': 1}
+
+        sent = []
+
+        async def send(message):
+            if message == 'second':
+                await asyncio.sleep(0.2)
+            sent.append(message)
+            return True
+
+        engine = make_engine(registry, fetch, send=send,
+                             schedule=self.SCHEDULE, budget=0.1,
+                             clock=time.monotonic)
+        asyncio.run(engine.run_once_async())
+        # Отправка, начатая до дедлайна, запоминается; после него
+        # следующая откладывается до нового цикла.
+        assert sent == ['first', 'second']
+        engine.expedite()
+        asyncio.run(engine.run_once_async())
+        assert sent == ['first', 'second', 'third']
+
+
+class TestRequestTimeouts:
+
+    def test_hung_api_times_out(self, monkeypatch, homework_module):
+        monkeypatch.setattr(homework_module, 'HTTP_READ_TIMEOUT', 0.1)
+        with StandIn(latency=2) as standin:
+            monkeypatch.setattr(homework_module, 'ENDPOINT', standin.endpoint)
+            with pytest.raises(ConnectionError):
+                homework_module.get_api_answer(0)
@@ -0,0 +1,332 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from poller.diff import changed, homework_key
+from poller.replay import VirtualClock
+from poller.schedule import DueQueue, PollSchedule
+from poller.tenants import Tenant, TenantRegistry, current_tenant
+from utils import make_engine, make_registry
+
+
+class FakeApi:
+    """Отвечает каждому тенанту его собственным списком работ."""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.calls = []
+
+    def __call__(self, timestamp):
+        tenant = current_tenant.get()
+        self.calls.append((tenant.id, timestamp))
+        homeworks = []
+        if tenant.id in self.statuses:
+            homeworks.append({'homework_name': f'hw-{tenant.id}',
+                              'status': self.statuses[tenant.id]})
+        return {'homeworks': homeworks, 'current_date': timestamp + 1}
+
+
+class TestTenantRegistry:
+
+    def test_load_json_lines(self):
+        registry = TenantRegistry().load([
+            '{"token": "a", "chat_id": 1}',
+            '',
+            '{"id": "second", "token": "b", "chat_id": "2"}',
+        ], timestamp=10)
+        assert len(registry) == 2
+        assert registry.get('1').chat_id == '1'
+        assert registry.get('second').token == 'b'
+        assert registry.get('second').timestamp == 10
+
+    def test_load_without_token(self):
+        with pytest.raises(KeyError):
+            TenantRegistry().load(['{"chat_id": 1}'], timestamp=0)
+
+    def test_duplicate_id(self):
+        registry = make_registry(1)
+        with pytest.raises(ValueError):
+            registry.add(Tenant(id='t0', token='x', chat_id='y'))
+
+
+class TestPollingEngine:
+
+    def test_every_tenant_polled_with_own_state(self):
+        registry = make_registry(3, timestamp=100)
+        api = FakeApi({'t0': 'approved', 't2': 'reviewing'})
+        sent = []
+        make_engine(registry, api, sent).run_once()
+        assert [tenant for tenant, _ in api.calls] == ['t0', 't1', 't2']
+        assert sent == [('chat0', 'approved'), ('chat2', 'reviewing')]
+        assert registry.get('t0').last_status == 'approved'
+        assert registry.get('t1').last_status is None
+        assert registry.get('t0').timestamp == 101
+        assert current_tenant.get() is None
+
+    def test_unchanged_status_not_resent(self):
+        registry = make_registry(1)
+        sent = []
+        clock = VirtualClock()
+        api = FakeApi({'t0': 'approved'})
+        engine = make_engine(registry, api, sent, clock=clock)
+        engine.run_once()
+        clock.now += 3600
+        engine.run_once()
+        assert len(api.calls) == 2
+        assert len(sent) == 1
+
+    def test_error_reported_to_tenant_chat_once(self):
+        registry = make_registry(2)
+
+        def failing_fetch(timestamp):
+            if current_tenant.get().id == 't1':
+                raise ConnectionError('down')
+            return {'homeworks': []}
+
+        sent = []
+        clock = VirtualClock()
+        engine = make_engine(registry, failing_fetch, sent, clock=clock)
+        engine.run_once()
+        clock.now += 3600
+        engine.run_once()
+        assert sent == [('chat1', 'Произошел сбой: down')]
+
+    def test_interval_follows_status(self):
+        registry = make_registry(3)
+        api = FakeApi({'t0': 'reviewing', 't1': 'approved'})
+        clock = VirtualClock()
+        engine = make_engine(registry, api, clock=clock)
+        assert engine.run_once() == 120
+        api.calls.clear()
+        clock.now = 120
+        assert engine.run_once() == 120
+        assert [tenant for tenant, _ in api.calls] == ['t0']
+        clock.now = 1200
+        engine.run_once()
+        assert [tenant for tenant, _ in api.calls] == ['t0', 't0', 't2']
+
+    def test_undelivered_change_retried_soon(self):
+        registry = make_registry(1)
+        registry.get('t0').statuses = {'hw-old': 'approved'}
+        clock = VirtualClock()
+        results = iter([False, True])
+
+        def fetch(timestamp):
+            return {'homeworks': [{'homework_name': 'hw-new',
+                                   'status': 'reviewing',
+                                   'date_updated': '1970-01-01T00:00:50Z'}],
+                    'current_date': 100}
+
+        engine = make_engine(registry, fetch, clock=clock,
+                             send=lambda message: next(results))
+        assert engine.run_once() == 600
+        clock.now = 600
+        assert engine.run_once() == 120
+        assert registry.get('t0').pending == {}
+
+    def test_every_transition_in_one_window_sent(self):
+        registry = make_registry(1)
+
+        def fetch(timestamp):
+            return {'homeworks': [
+                {'id': 2, 'homework_name': 'hw2', 'status': 'reviewing'},
+                {'id': 1, 'homework_name': 'hw1', 'status': 'approved'},
+            ], 'current_date': 50}
+
+        sent = []
+        make_engine(registry, fetch, sent).run_once()
+        assert sent == [('chat0', 'approved'), ('chat0', 'reviewing')]
+        tenant = registry.get('t0')
+        assert tenant.statuses == {'1': 'approved', '2': 'reviewing'}
+        assert tenant.timestamp == 50
+
+    def test_watermark_kept_until_all_delivered(self):
+        registry = make_registry(1, timestamp=10)
+
+        def fetch(timestamp):
+            return {'homeworks': [
+                {'homework_name': 'hw2', 'status': 'reviewing'},
+                {'homework_name': 'hw1', 'status': 'approved'},
+            ], 'current_date': 50}
+
+        engine = make_engine(
+            registry, fetch, parse=lambda homework: homework['homework_name'],
+            send=lambda message: message == 'hw1')
+        engine.run_once()
+        tenant = registry.get('t0')
+        assert tenant.statuses == {'hw1': 'approved'}
+        assert tenant.timestamp == 50
+        assert tenant.since() == 10
+
+    def test_pool_polls_concurrently_and_sends_in_order(self):
+        registry = make_registry(3)
+        barrier = threading.Barrier(3, timeout=5)
+        api = FakeApi({'t0': 'approved', 't1': 'rejected', 't2': 'reviewing'})
+        threads = set()
+
+        def fetch(timestamp):
+            threads.add(threading.get_ident())
+            barrier.wait()
+            # Первый по расписанию тенант отвечает последним.
+            time.sleep(0.05 * (2 - int(current_tenant.get().id[1])))
+            return api(timestamp)
+
+        sent = []
+        make_engine(registry, fetch, sent, workers=3).run_once()
+        assert len(threads) == 3
+        assert sent == [('chat0', 'approved'), ('chat1', 'rejected'),
+                        ('chat2', 'reviewing')]
+        assert registry.get('t2').last_status == 'reviewing'
+        assert current_tenant.get() is None
+
+    def test_pool_reports_errors_in_tenant_chat(self):
+        registry = make_registry(2)
+
+        def fetch(timestamp):
+            if current_tenant.get().id == 't0':
+                raise ConnectionError('down')
+            return {'homeworks': [], 'current_date': 5}
+
+        sent = []
+        clock = VirtualClock()
+        engine = make_engine(registry, fetch, sent, clock=clock, workers=2)
+        engine.run_once()
+        clock.now += 3600
+        engine.run_once()
+        assert sent == [('chat0', 'Произошел сбой: down')]
+        assert registry.get('t1').timestamp == 5
+
+
+class WeekApi:
+    """API, в котором каждые 6 часов меняется статус одной из работ."""
+
+    STATUSES = ('reviewing', 'rejected', 'approved')
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.homeworks = {}
+        self.changes = 0
+        self.sizes = []
+
+    def advance(self):
+        while self.changes * 6 * 3600 <= self.clock.now:
+            name = f'hw{self.changes // 3}'
+            self.homeworks[name] = (self.STATUSES[self.changes % 3],
+                                    self.changes * 6 * 3600)
+            self.changes += 1
+
+    def __call__(self, timestamp):
+        self.advance()
+        homeworks = [
+            {'homework_name': name, 'status': status,
+             'date_updated': datetime.fromtimestamp(
+                 updated, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}
+            for name, (status, updated) in sorted(
+                self.homeworks.items(), key=lambda item: -item[1][1])
+            if updated >= timestamp]
+        self.sizes.append(len(homeworks))
+        return {'homeworks': homeworks, 'current_date': int(self.clock.now)}
+
+
+class TestWatermark:
+
+    def test_from_date_uses_overlap(self):
+        registry = make_registry(1, timestamp=1000)
+        api = FakeApi({})
+        engine = make_engine(registry, api, overlap=60)
+        engine.run_once()
+        assert api.calls == [('t0', 940)]
+        assert registry.get('t0').timestamp == 941
+
+    def test_pending_homework_keeps_its_watermark(self):
+        registry = make_registry(1, timestamp=0)
+
+        def fetch(timestamp):
+            return {'homeworks': [
+                {'homework_name': 'hw2', 'status': 'approved',
+                 'date_updated': '1970-01-01T00:01:40Z'},
+                {'homework_name': 'hw1', 'status': 'approved',
+                 'date_updated': '1970-01-01T00:00:50Z'},
+            ], 'current_date': 200}
+
+        engine = make_engine(
+            registry, fetch, parse=lambda homework: homework['homework_name'],
+            send=lambda message: message == 'hw1')
+        engine.run_once()
+        tenant = registry.get('t0')
+        assert tenant.timestamp == 200
+        assert tenant.pending == {'hw2': 100}
+        assert engine.since(tenant) == 100
+
+    def test_payload_bounded_over_week(self):
+        clock = VirtualClock()
+        api = WeekApi(clock)
+        registry = make_registry(1)
+        attempts = []
+
+        def flaky_send(message):
+            attempts.append(message)
+            return len(attempts) % 4 != 0
+
+        engine = make_engine(
+            registry, api, send=flaky_send,
+            schedule=PollSchedule(dict.fromkeys(WeekApi.STATUSES, 600),
+                                  idle=600, minimum=600, maximum=600),
+            clock=clock, overlap=60)
+        while clock.now < 7 * 24 * 3600:
+            clock.now += engine.run_once()
+        assert len(api.homeworks) == 10
+        assert max(api.sizes) <= 2
+        assert registry.get('t0').statuses == {
+            name: status for name, (status, _) in api.homeworks.items()}
+
+
+class TestDiff:
+
+    def test_only_changed_homeworks(self):
+        index = {'1': 'reviewing', 'hw3': 'approved'}
+        homeworks = [
+            {'homework_name': 'hw3', 'status': 'approved'},
+            {'id': 2, 'homework_name': 'hw2', 'status': 'reviewing'},
+            {'id': 1, 'homework_name': 'hw1', 'status': 'approved'},
+        ]
+        assert [key for key, _ in changed(index, homeworks)] == ['1', '2']
+
+    def test_key_prefers_id(self):
+        assert homework_key({'id': 7, 'homework_name': 'hw'}) == '7'
+        assert homework_key({'homework_name': 'hw'}) == 'hw'
+
+
+class TestPollSchedule:
+
+    def test_interval_bounds(self):
+        schedule = PollSchedule({'reviewing': 10, 'approved': 10 ** 6},
+                                idle=900, minimum=30, maximum=7200)
+        assert schedule.interval('reviewing') == 30
+        assert schedule.interval('approved') == 7200
+        assert schedule.interval('rejected') == 600
+        assert schedule.interval(None) == 900
+        assert schedule.interval() == 900
+        assert schedule.interval('approved', 'rejected', 'reviewing') == 30
+
+    def test_parse(self):
+        assert PollSchedule.parse('reviewing=60, approved=1800,') == {
+            'reviewing': 60, 'approved': 1800}
+        assert PollSchedule.parse('') == {}
+        with pytest.raises(ValueError):
+            PollSchedule.parse('reviewing=often')
+
+    def test_invalid_range(self):
+        with pytest.raises(ValueError):
+            PollSchedule(minimum=100, maximum=10)
+
+    def test_due_queue_order(self):
+        queue = DueQueue()
+        queue.push('late', 50)
+        queue.push('early', 10)
+        queue.push('middle', 20)
+        assert queue.pop_due(20) == ['early', 'middle']
+        assert queue.next_time() == 50
+        assert len(queue) == 1
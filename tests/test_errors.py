@@ -0,0 +1,68 @@
+from poller.errors import ErrorDigest, fingerprint
+from poller.replay import VirtualClock
+from poller.schedule import PollSchedule
+from utils import make_engine, make_registry
+
+
+def fail(text):
+    raise ConnectionError(text)
+
+
+def catch(function, *args):
+    try:
+        function(*args)
+    except Exception as error:
+        return error
+
+
+class TestErrorDigest:
+
+    def test_fingerprint_ignores_text(self):
+        first = catch(fail, 'reset by peer')
+        second = catch(fail, 'timed out')
+        assert fingerprint(first) == fingerprint(second)
+        assert fingerprint(first) != fingerprint(catch(int, 'x'))
+
+    def test_repeats_go_to_digest(self):
+        digest = ErrorDigest(period=3600)
+        assert digest.record('t0', catch(fail, 'a'), now=0)
+        assert not digest.record('t0', catch(fail, 'b'), now=10)
+        assert not digest.record('t0', catch(fail, 'c'), now=20)
+        assert digest.record('t1', catch(fail, 'a'), now=20)
+        assert digest.due('t0', now=1000) == []
+        assert digest.due('t0', now=3600) == [
+            'Ошибок вида ConnectionError в fail за последние 60 мин.: 2.']
+        assert digest.due('t0', now=3700) == []
+        assert digest.due('t0', now=7200) == []
+        assert digest.record('t0', catch(fail, 'd'), now=7300)
+
+    def test_lru_bounded(self):
+        digest = ErrorDigest(maxsize=2)
+        for owner in ('t0', 't1', 't2'):
+            digest.record(owner, catch(fail, owner), now=0)
+        assert len(digest) == 2
+        assert digest.record('t0', catch(fail, 'again'), now=0)
+
+
+class TestEngineErrors:
+
+    def test_flapping_error_reported_once_then_digest(self):
+        registry = make_registry()
+        clock = VirtualClock()
+        attempts = []
+
+        def fetch(timestamp):
+            attempts.append(timestamp)
+            fail(f'attempt {len(attempts)}')
+
+        sent = []
+        engine = make_engine(
+            registry, fetch, send=lambda message: sent.append(message) or True,
+            schedule=PollSchedule(idle=600, minimum=600, maximum=600),
+            clock=clock)
+        for _ in range(7):
+            clock.now += engine.run_once()
+        assert sent == [
+            'Произошел сбой: attempt 1',
+            'Ошибок вида ConnectionError в fail за последние 60 мин.: 5.',
+        ]
@@ -0,0 +1,88 @@
+from poller.history import (RECORD, HistoryLog, HistoryReader, Transition,
+                            main)
+from poller.tenants import Tenant, TenantRegistry
+from utils import make_engine
+
+DAY = 24 * 3600
+# 2026-10-01T00:00:00Z
+OCTOBER = 1790812800
+
+
+def write_history(path):
+    history = HistoryLog(path)
+    history.append('anna', 'hw1', None, 'reviewing', OCTOBER, OCTOBER + 5)
+    history.append('boris', 'hw1', None, 'reviewing', OCTOBER, OCTOBER + 5)
+    history.append('anna', 'hw1', 'reviewing', 'rejected',
+                   OCTOBER + DAY, OCTOBER + DAY + 5)
+    history.append('boris', 'hw1', 'reviewing', 'approved',
+                   OCTOBER + 3 * DAY, OCTOBER + 3 * DAY + 5)
+    history.append('anna', 'hw1', 'rejected', 'reviewing',
+                   OCTOBER + 4 * DAY, OCTOBER + 4 * DAY + 5)
+    history.close()
+
+
+class TestHistory:
+
+    def test_select_filters(self, tmp_path):
+        path = str(tmp_path / 'history.bin')
+        write_history(path)
+        with HistoryReader(path) as reader:
+            assert len(reader) == 5
+            assert list(reader.select('anna', status='rejected')) == [
+                Transition('anna', 'hw1', 'reviewing', 'rejected',
+                           OCTOBER + DAY, OCTOBER + DAY + 5)]
+            assert [row.tenant for row in reader.select(
+                since=OCTOBER + 2 * DAY)] == ['boris', 'anna']
+            assert list(reader.select('nobody')) == []
+            assert reader.count() == {'reviewing': 3, 'rejected': 1,
+                                      'approved': 1}
+
+    def test_time_in_status(self, tmp_path):
+        path = str(tmp_path / 'history.bin')
+        write_history(path)
+        with HistoryReader(path) as reader:
+            assert sorted(reader.time_in('reviewing')) == [DAY, 3 * DAY]
+            assert reader.time_in('reviewing', tenant='anna') == [DAY]
+            assert reader.time_in('reviewing', until=OCTOBER + DAY) == []
+
+    def test_reopen_appends_and_drops_torn_record(self, tmp_path):
+        path = str(tmp_path / 'history.bin')
+        write_history(path)
+        with open(path, 'ab') as file:
+            file.write(b'\x01\x02\x03')
+        with open(path + '.strings', 'a', encoding='utf-8') as file:
+            file.write('"torn')
+        history = HistoryLog(path)
+        history.append('clara', 'hw2', None, 'reviewing', OCTOBER, 0)
+        history.close()
+        with HistoryReader(path) as reader:
+            assert len(reader) == 6
+            assert list(reader.select('clara'))[0].homework == 'hw2'
+
+    def test_cli(self, tmp_path, capsys):
+        path = str(tmp_path / 'history.bin')
+        write_history(path)
+        main(['time-in', path, 'reviewing', '--month', '2026-10'])
+        assert 'работ 2, медиана 48.0 ч' in capsys.readouterr().out
+        main(['list', path, '--tenant', 'anna', '--status', 'rejected'])
+        assert capsys.readouterr().out == (
+            '2026-10-02T00:00:00Z\t2026-10-02T00:00:05Z\tanna\thw1\t'
+            'reviewing -> rejected\n')
+
+    def test_engine_appends_delivered_transitions(self, tmp_path):
+        path = str(tmp_path / 'history.bin')
+        registry = TenantRegistry()
+        registry.add(Tenant(id='anna', token='token', chat_id='1'))
+        history = HistoryLog(path)
+
+        def fetch(timestamp):
+            return {'homeworks': [{'id': 1, 'status': 'approved',
+                                   'date_updated': '2026-10-01T00:00:00Z'}],
+                    'current_date': OCTOBER + 60}
+
+        make_engine(registry, fetch, clock=lambda: OCTOBER + 90,
+                    history=history).run_once()
+        with HistoryReader(path) as reader:
+            assert list(reader.select()) == [Transition(
+                'anna', '1', None, 'approved', OCTOBER, OCTOBER + 90)]
+        assert RECORD.size == 32
@@ -0,0 +1,71 @@
+import httpx
+import pytest
+import requests
+
+from poller.http import HttpxSession, build_session
+
+
+class TestBuildSession:
+
+    def test_requests_pool(self):
+        session = build_session(pool_size=8)
+        adapter = session.get_adapter('https://practicum.yandex.ru/')
+        assert adapter._pool_connections == 8
+        assert adapter._pool_maxsize == 8
+        assert session.headers['Connection'] == 'keep-alive'
+
+    def test_requests_without_keep_alive(self):
+        session = build_session(pool_size=2, keep_alive=0)
+        assert session.headers['Connection'] == 'close'
+
+    def test_http2_uses_httpx(self):
+        session = build_session(pool_size=4, http2=True)
+        assert isinstance(session, HttpxSession)
+        session.close()
+
+    def test_httpx_errors_become_request_exception(self):
+        def handler(request):
+            raise httpx.ConnectError('refused', request=request)
+
+        session = HttpxSession(
+            httpx.Client(transport=httpx.MockTransport(handler)))
+        with pytest.raises(requests.RequestException):
+            session.get('https://practicum.yandex.ru/', params={'a': 1})
+
+
+class TestSharedSession:
+
+    def test_pool_reused_between_polls(self, monkeypatch, homework_module):
+        sessions = []
+
+        class Session:
+            def __init__(self):
+                sessions.append(self)
+
+            def get(self, **kwargs):
+                return requests.models.Response()
+
+        monkeypatch.setattr(homework_module, 'HTTP_POOL_SIZE', 4)
+        monkeypatch.setattr(homework_module, '_session', None)
+        monkeypatch.setattr(homework_module, 'build_session',
+                            lambda *args: Session())
+        for _ in range(3):
+            homework_module.http_get(url=homework_module.ENDPOINT)
+        assert len(sessions) == 1
+
+    def test_network_error_becomes_connection_error(self, monkeypatch,
+                                                    homework_module):
+        def refuse(**kwargs):
+            raise requests.ConnectionError('refused')
+
+        monkeypatch.setattr(homework_module, 'http_get', refuse)
+        with pytest.raises(ConnectionError, match='Ошибка при запросе к API'):
+            homework_module.get_api_answer(0)
+
+    def test_http2_without_pool_rejected(self, monkeypatch,
+                                         homework_module):
+        monkeypatch.setattr(homework_module, 'HTTP2', True)
+        monkeypatch.setattr(homework_module, 'HTTP_POOL_SIZE', 0)
+        monkeypatch.setattr(homework_module, 'check_tokens', lambda: None)
+        with pytest.raises(ValueError, match='HTTP_POOL_SIZE'):
+            homework_module.main()
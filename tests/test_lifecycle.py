@@ -0,0 +1,107 @@
+import os
+import signal
+import sqlite3
+import threading
+import time
+from functools import partial
+
+import telegram
+
+from poller.deadline import Deadline
+from poller.lifecycle import Lifecycle
+from poller.replay import VirtualClock
+from poller.schedule import DueQueue
+from poller.standin import StandIn
+from utils import make_engine, make_registry
+
+
+class TestLifecycle:
+
+    def test_signal_interrupts_sleep(self):
+        timer = threading.Timer(0.1, os.kill,
+                                (os.getpid(), signal.SIGUSR1))
+        with Lifecycle() as lifecycle:
+            started = time.monotonic()
+            timer.start()
+            with lifecycle.interruptible():
+                time.sleep(5)
+        assert time.monotonic() - started < 2
+        assert lifecycle.take('poll_now')
+        assert not lifecycle.poll_now
+
+    def test_signal_before_sleep(self):
+        with Lifecycle() as lifecycle:
+            os.kill(os.getpid(), signal.SIGHUP)
+            started = time.monotonic()
+            with lifecycle.interruptible():
+                time.sleep(5)
+        assert time.monotonic() - started < 2
+        assert lifecycle.reload
+
+    def test_previous_handlers_restored(self):
+        before = signal.getsignal(signal.SIGTERM)
+        with Lifecycle():
+            assert signal.getsignal(signal.SIGTERM) != before
+        assert signal.getsignal(signal.SIGTERM) == before
+
+
+class TestEngineControl:
+
+    def test_expedite(self):
+        queue = DueQueue()
+        queue.push('a', 500)
+        queue.push('b', 50)
+        queue.expedite(100)
+        assert queue.pop_due(100) == ['b', 'a']
+
+    def test_sync_keeps_state(self):
+        engine = make_engine(make_registry(ids=['a', 'b']),
+                             lambda timestamp: {'homeworks': []},
+                             clock=VirtualClock(100))
+        engine.registry.get('a').timestamp = 42
+        engine.run_once()
+        fresh = make_registry(ids=['a', 'c'])
+        fresh.get('a').token = 'new'
+        engine.sync(fresh)
+        assert [tenant.id for tenant in engine.registry] == ['a', 'c']
+        assert engine.registry.get('a').token == 'new'
+        assert engine.registry.get('a').timestamp != 0
+        assert engine.queue.pop_due(100) == ['c']
+
+    def test_drain_shortens_deadline(self):
+        engine = make_engine(make_registry(ids=['a']),
+                             lambda timestamp: {'homeworks': []},
+                             clock=VirtualClock(100))
+        engine.deadline = Deadline(300, clock=lambda: 0)
+        engine.drain(10)
+        assert engine.deadline.remaining() == 10
+
+
+class TestGracefulShutdown:
+
+    def test_sigterm_drains_queue_and_state(self, monkeypatch, tmp_path,
+                                            homework_module):
+        with StandIn(homeworks=2, change_every=1) as standin:
+            monkeypatch.setattr(homework_module, 'ENDPOINT', standin.endpoint)
+            monkeypatch.setattr(homework_module, 'TELEGRAM_QUEUE', True)
+            monkeypatch.setattr(homework_module, 'STATE_DB',
+                                str(tmp_path / 'state.db'))
+            monkeypatch.setattr(telegram, 'Bot', partial(
+                telegram.Bot, base_url=standin.telegram_url))
+            sleep = time.sleep
+
+            def terminate_while_sleeping(seconds):
+                if threading.current_thread() is not threading.main_thread():
+                    return sleep(seconds)
+                threading.Timer(0.1, os.kill,
+                                (os.getpid(), signal.SIGTERM)).start()
+                sleep(5)
+
+            monkeypatch.setattr(time, 'sleep', terminate_while_sleeping)
+            started = time.monotonic()
+            homework_module.main()
+            assert time.monotonic() - started < 4
+            assert standin.messages == 2
+        rows = sqlite3.connect(tmp_path / 'state.db').execute(
+            'SELECT COUNT(*) FROM statuses').fetchone()
+        assert rows == (2,)
@@ -0,0 +1,73 @@
+import json
+import logging
+import threading
+
+from poller.logs import file_handler, start_log_listener
+from poller.tenants import Tenant, current_tenant
+
+
+class SlowHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.records = []
+
+    def emit(self, record):
+        self.gate.wait(5)
+        self.records.append(self.format(record))
+
+
+def make_logger(handler):
+    logger = logging.getLogger(f'test-logs-{id(handler)}')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    return logger
+
+
+class TestLogPipeline:
+
+    def test_io_off_caller_thread(self):
+        slow = SlowHandler()
+        handler = start_log_listener([slow])
+        logger = make_logger(handler)
+        logger.info('не ждёт записи %s', 1)
+        assert slow.records == []
+        slow.gate.set()
+        for _ in range(100):
+            if slow.records:
+                break
+            threading.Event().wait(0.01)
+        assert slow.records[0].endswith('не ждёт записи 1')
+
+    def test_json_lines_with_tenant(self, tmp_path):
+        path = tmp_path / 'bot.log'
+        target = file_handler(str(path), max_bytes=10 ** 6)
+        record_handler = start_log_listener([target], json_lines=True)
+        logger = make_logger(record_handler)
+        token = current_tenant.set(Tenant(id='t7', token='x', chat_id='c'))
+        try:
+            logger.debug('опрос', extra={'elapsed': 0.25})
+        finally:
+            current_tenant.reset(token)
+        logger.handlers.clear()
+        for _ in range(100):
+            if path.read_text(encoding='utf-8'):
+                break
+            threading.Event().wait(0.01)
+        data = json.loads(path.read_text(encoding='utf-8').splitlines()[0])
+        assert data['tenant'] == 't7'
+        assert data['elapsed'] == 0.25
+        assert data['message'] == 'опрос'
+        assert data['level'] == 'DEBUG'
+
+    def test_size_rotation(self, tmp_path):
+        path = tmp_path / 'bot.log'
+        handler = file_handler(str(path), max_bytes=200, backups=2)
+        logger = make_logger(handler)
+        for number in range(50):
+            logger.info('строка %s', number)
+        handler.close()
+        assert sorted(item.name for item in tmp_path.iterdir()) == [
+            'bot.log', 'bot.log.1', 'bot.log.2']
@@ -0,0 +1,102 @@
+import requests
+
+from poller import metrics
+from poller.metrics import Registry, serve
+from utils import make_engine, make_registry
+
+
+class TestRegistry:
+
+    def test_counter_render(self):
+        registry = Registry()
+        counter = registry.counter('sent_total', 'Sent.', ('result',))
+        counter.inc(result='ok')
+        counter.inc(2, result='ok')
+        counter.inc(result='say "hi"')
+        assert registry.render() == (
+            '# HELP sent_total Sent.\n'
+            '# TYPE sent_total counter\n'
+            'sent_total{result="ok"} 3\n'
+            'sent_total{result="say \\"hi\\""} 1\n'
+        )
+
+    def test_histogram_buckets_cumulative(self):
+        registry = Registry()
+        histogram = registry.histogram('latency_seconds', 'Latency.',
+                                       buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+        lines = registry.render().splitlines()
+        assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+        assert 'latency_seconds_bucket{le="1"} 3' in lines
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+        assert 'latency_seconds_sum 3.65' in lines
+        assert 'latency_seconds_count 4' in lines
+
+    def test_gauge_reads_function(self):
+        registry = Registry()
+        depth = []
+        registry.gauge('queue_depth', 'Depth.', lambda: len(depth))
+        depth.append(1)
+        assert 'queue_depth 1' in registry.render().splitlines()
+
+    def test_http_endpoint(self):
+        registry = Registry()
+        registry.counter('polls_total', 'Polls.').inc()
+        server = serve(registry, port=0)
+        try:
+            port = server.server_address[1]
+            response = requests.get(f'http://127.0.0.1:{port}/metrics')
+            assert response.status_code == 200
+            assert response.headers['Content-Type'].startswith('text/plain')
+            assert 'polls_total 1' in response.text
+            missing = requests.get(f'http://127.0.0.1:{port}/other')
+            assert missing.status_code == 404
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestPipelineMetrics:
+
+    def test_engine_counts_outcomes(self):
+        registry = make_registry()
+        answers = [
+            {'homeworks': [{'homework_name': 'hw', 'status': 'approved'}]},
+            [],
+        ]
+
+        def check(answer):
+            if not isinstance(answer, dict):
+                raise TypeError('not a dict')
+
+        engine = make_engine(registry, lambda timestamp: answers.pop(0),
+                             check=check)
+        before = (
+            metrics.PARSE_OUTCOMES.value(outcome='approved'),
+            metrics.CHECK_FAILURES.value(error='TypeError'),
+            metrics.MESSAGES.value(result='ok'),
+            metrics.LOOP_SECONDS.count(),
+        )
+        engine.run_once()
+        engine.poll(registry.get('t0'))
+        after = (
+            metrics.PARSE_OUTCOMES.value(outcome='approved'),
+            metrics.CHECK_FAILURES.value(error='TypeError'),
+            metrics.MESSAGES.value(result='ok'),
+            metrics.LOOP_SECONDS.count(),
+        )
+        assert [a - b for a, b in zip(after, before)] == [1, 1, 2, 1]
+
+    def test_api_requests_by_outcome(self, monkeypatch, homework_module):
+        def failing_get(**kwargs):
+            raise requests.ConnectionError('refused')
+
+        monkeypatch.setattr(requests, 'get', failing_get)
+        before = metrics.API_REQUESTS.count(outcome='ConnectionError')
+        try:
+            homework_module.get_api_answer(0)
+        except ConnectionError:
+            pass
+        assert metrics.API_REQUESTS.count(
+            outcome='ConnectionError') == before + 1
@@ -0,0 +1,176 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from poller.history import HistoryLog, HistoryReader, Transition
+from poller.metrics import TELEGRAM_QUEUE_WAIT
+from poller.outbound import OutboundQueue, QueuedBot, TokenBucket
+from poller.tenants import Tenant, TenantRegistry
+from utils import make_engine
+
+
+class RetryAfter(Exception):
+    def __init__(self, retry_after):
+        super().__init__('Flood control exceeded')
+        self.retry_after = retry_after
+
+
+class Recorder:
+    """Запоминает отправленные сообщения и момент отправки."""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def __call__(self, chat_id, text):
+        with self.lock:
+            if self.failures:
+                raise self.failures.pop(0)
+            self.sent.append((chat_id, text, time.monotonic()))
+
+
+class TestTokenBucket:
+
+    def test_rate(self):
+        bucket = TokenBucket(rate=2, capacity=1)
+        assert bucket.delay(0) == 0
+        bucket.take(0)
+        assert bucket.delay(0) == 0.5
+        assert bucket.delay(0.5) == 0
+
+    def test_pause(self):
+        bucket = TokenBucket(rate=10)
+        bucket.pause(0, 3)
+        assert bucket.delay(0) == 3
+        assert bucket.delay(3) == 0
+
+
+class TestOutboundQueue:
+
+    def test_per_chat_rate_does_not_block_other_chats(self):
+        recorder = Recorder()
+        queue = OutboundQueue(recorder, rate=1000, chat_rate=20).start()
+        started = time.monotonic()
+        for number in range(3):
+            queue.put('slow', f'slow {number}')
+        queue.put('other', 'other')
+        assert queue.close(timeout=5)
+        texts = [text for _, text, _ in recorder.sent]
+        assert texts.index('other') < texts.index('slow 2')
+        slow = [moment for chat, _, moment in recorder.sent if chat == 'slow']
+        assert slow[-1] - started >= 0.09
+        assert [text for chat, text, _ in recorder.sent if chat == 'slow'] == [
+            'slow 0', 'slow 1', 'slow 2']
+
+    def test_retry_after_honoured(self):
+        recorder = Recorder(failures=[RetryAfter(0.1)])
+        queue = OutboundQueue(recorder, rate=1000, chat_rate=1000).start()
+        started = time.monotonic()
+        queue.put('chat', 'hello')
+        assert queue.close(timeout=5)
+        assert [text for _, text, _ in recorder.sent] == ['hello']
+        assert recorder.sent[0][2] - started >= 0.1
+
+    def test_failed_message_dropped_after_retries(self):
+        recorder = Recorder(failures=[ValueError('a'), ValueError('b')])
+        queue = OutboundQueue(recorder, rate=1000, chat_rate=1000,
+                              retries=2, backoff=0.01).start()
+        lost = queue.put('chat', 'lost')
+        queue.put('chat', 'next')
+        assert queue.close(timeout=10)
+        assert lost.result() is False
+        assert [text for _, text, _ in recorder.sent] == ['next']
+        stats = queue.stats()
+        assert stats['depth'] == 0
+        assert stats['sent'] == 1
+        assert stats['failed'] == 1
+
+    def test_queued_bot_with_send_message(self, homework_module):
+        recorder = Recorder()
+        queue = OutboundQueue(recorder, rate=1000, chat_rate=1000)
+        assert homework_module.send_message(QueuedBot(queue), 'queued')
+        assert queue.stats()['depth'] == 1
+        queue.start()
+        assert queue.close(timeout=5)
+        assert recorder.sent[0][:2] == (homework_module.TELEGRAM_CHAT_ID,
+                                        'queued')
+
+    def test_wait_time_observed(self):
+        queue = OutboundQueue(Recorder(), rate=1000, chat_rate=1000).start()
+        before = TELEGRAM_QUEUE_WAIT.count()
+        assert queue.put('chat', 'hello').result(timeout=5)
+        queue.close(timeout=5)
+        assert TELEGRAM_QUEUE_WAIT.count() == before + 1
+
+    def test_abandoned_messages_resolved(self):
+        queue = OutboundQueue(Recorder())
+        receipt = queue.put('chat', 'late')
+        assert not queue.close(timeout=0)
+        queue.abandon()
+        assert receipt.result() is False
+        assert queue.stats()['depth'] == 0
+
+
+class TestUndeliveredTransitions:
+
+    def test_dropped_message_reopens_transition(self):
+        registry = TenantRegistry()
+        registry.add(Tenant(id='anna', token='token', chat_id='1',
+                            statuses={'1': 'reviewing'}))
+        queue = OutboundQueue(Recorder())
+        bot = QueuedBot(queue)
+        sent = []
+
+        def send(message):
+            sent.append(message)
+            return bot.send_message('1', message)
+
+        def fetch(timestamp):
+            return {'homeworks': [{'id': 1, 'status': 'approved',
+                                   'date_updated': '2026-10-01T00:00:00Z'}],
+                    'current_date': 1790900000}
+
+        engine = make_engine(registry, fetch, send=send,
+                             clock=lambda: 1790900000)
+        engine.run_once()
+        tenant = registry.get('anna')
+        assert tenant.statuses == {'1': 'approved'}
+        queue.abandon()
+        engine.restore()
+        assert tenant.statuses == {'1': 'reviewing'}
+        assert tenant.etag is None and '1' in tenant.pending
+        engine.run_once()
+        assert tenant.statuses == {'1': 'approved'}
+        assert sent == ['approved', 'approved']
+        assert tenant.pending == {}
+
+    def test_history_written_once_receipt_delivered(self, tmp_path):
+        registry = TenantRegistry()
+        registry.add(Tenant(id='anna', token='token', chat_id='1',
+                            statuses={'1': 'reviewing'}))
+        path = str(tmp_path / 'history.bin')
+        receipts = []
+
+        def send(message):
+            receipts.append(Future())
+            return receipts[-1]
+
+        def fetch(timestamp):
+            return {'homeworks': [{'id': 1, 'status': 'approved',
+                                   'date_updated': '2026-10-01T00:00:00Z'}],
+                    'current_date': 1790900000}
+
+        engine = make_engine(registry, fetch, send=send,
+                             clock=lambda: 1790900000,
+                             history=HistoryLog(path))
+        engine.run_once()
+        receipts[0].set_result(False)
+        engine.run_once()
+        receipts[1].set_result(True)
+        engine.restore()
+        engine.history.flush()
+        with HistoryReader(path) as reader:
+            assert list(reader.select()) == [Transition(
+                'anna', '1', 'reviewing', 'approved', 1790812800,
+                1790900000)]
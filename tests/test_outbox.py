@@ -0,0 +1,139 @@
+import sqlite3
+
+from poller.history import HistoryLog, HistoryReader, Transition
+from poller.outbox import SCHEMA, Outbox
+from poller.tenants import Tenant, TenantRegistry, current_tenant
+from utils import make_engine
+
+OCTOBER = 1790812800
+
+
+def outbox_engine(outbox, results, sent, now, fetches, **options):
+    registry = TenantRegistry()
+    registry.add(Tenant(id='anna', token='token', chat_id='1'))
+
+    def fetch(timestamp):
+        fetches.append(timestamp)
+        return {'homeworks': [{'id': 1, 'status': 'approved',
+                               'date_updated': '2026-10-01T00:00:00Z'}],
+                'current_date': OCTOBER}
+
+    def send(message):
+        delivered = next(results)
+        if isinstance(delivered, Exception):
+            raise delivered
+        if delivered:
+            sent.append((current_tenant.get().chat_id, message))
+        return delivered
+
+    return make_engine(registry, fetch, send=send, clock=lambda: now[0],
+                       outbox=outbox, **options)
+
+
+class TestOutbox:
+
+    def test_failed_send_retried_without_polling_api(self, tmp_path):
+        outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), backoff=30)
+        now = [OCTOBER]
+        sent, fetches = [], []
+        engine = outbox_engine(outbox, iter([False, True]), sent, now,
+                               fetches)
+        assert engine.run_once() == 30
+        tenant = engine.registry.get('anna')
+        assert tenant.statuses == {'1': 'approved'}
+        assert tenant.pending == {}
+        assert sent == [] and outbox.depth == 1
+        now[0] += 30
+        engine.run_once()
+        assert sent == [('1', 'approved')]
+        assert outbox.depth == 0
+        assert len(fetches) == 1
+
+    def test_same_key_queued_once_across_restart(self, tmp_path):
+        path = str(tmp_path / 'outbox.sqlite3')
+        tenant = Tenant(id='anna', token='token', chat_id=1)
+        outbox = Outbox(path)
+        assert outbox.put('anna/1/approved/0', tenant, 'ok', OCTOBER)
+        outbox.close()
+        outbox = Outbox(path)
+        assert outbox.depth == 1
+        assert not outbox.put('anna/1/approved/0', tenant, 'ok', OCTOBER)
+        entry, = outbox.due(OCTOBER)
+        outbox.done(entry, True, OCTOBER)
+        assert not outbox.put('anna/1/approved/0', tenant, 'ok', OCTOBER)
+        outbox.prune(OCTOBER + outbox.keep + 1)
+        assert outbox.put('anna/1/approved/0', tenant, 'ok', OCTOBER)
+
+    def test_chat_order_kept_while_head_waits(self, tmp_path):
+        outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), backoff=10,
+                        max_backoff=15)
+        anna = Tenant(id='anna', token='token', chat_id=1)
+        boris = Tenant(id='boris', token='token', chat_id=2)
+        outbox.put('a1', anna, 'first', OCTOBER)
+        outbox.put('b1', boris, 'other', OCTOBER)
+        head, _ = outbox.due(OCTOBER)
+        outbox.done(head, False, OCTOBER)
+        outbox.put('a2', anna, 'second', OCTOBER + 1)
+        assert [entry.key for entry in outbox.due(OCTOBER + 1)] == ['b1']
+        outbox.done(outbox.due(OCTOBER + 1)[0], True, OCTOBER + 1)
+        assert outbox.next_time() == OCTOBER + 10
+        head, = outbox.due(OCTOBER + 10)[:1]
+        outbox.done(head, False, OCTOBER + 10)
+        assert outbox.next_time() == OCTOBER + 25
+        assert [entry.text for entry in outbox.due(OCTOBER + 25)] == [
+            'first', 'second']
+
+    def test_shared_outbox_sends_claimed_rows_once(self, tmp_path):
+        path = str(tmp_path / 'outbox.sqlite3')
+        first, second = Outbox(path), Outbox(path)
+        tenant = Tenant(id='anna', token='token', chat_id='1')
+        first.put('a1', tenant, 'one', OCTOBER)
+        first.put('a2', tenant, 'two', OCTOBER)
+        assert [entry.key for entry in second.due(OCTOBER)] == ['a1', 'a2']
+        head, _ = first.due(OCTOBER)
+        assert first.claim(head, OCTOBER)
+        sent, fetches = [], []
+        engine = outbox_engine(second, iter([True]), sent, [OCTOBER], fetches)
+        engine.dispatch()
+        assert sent == []
+        first.done(head, True, OCTOBER)
+        engine.dispatch()
+        assert sent == [('1', 'two')]
+
+    def test_send_error_counts_as_failed_attempt(self, tmp_path):
+        outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), backoff=30)
+        outbox.put('a1', Tenant(id='anna', token='token', chat_id='1'),
+                   'one', OCTOBER)
+        engine = outbox_engine(outbox, iter([ConnectionError('down')]), [],
+                               [OCTOBER], [])
+        engine.dispatch()
+        assert outbox.next_time() == OCTOBER + 30
+
+    def test_history_written_when_sent(self, tmp_path):
+        outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), backoff=30)
+        path = str(tmp_path / 'history.bin')
+        history = HistoryLog(path)
+        now = [OCTOBER]
+        engine = outbox_engine(outbox, iter([False, True]), [], now, [],
+                               history=history)
+        engine.run_once()
+        assert outbox.depth == 1
+        with HistoryReader(path) as reader:
+            assert list(reader.select()) == []
+        now[0] += 30
+        engine.run_once()
+        with HistoryReader(path) as reader:
+            assert list(reader.select()) == [Transition(
+                'anna', '1', None, 'approved', OCTOBER, OCTOBER + 30)]
+
+    def test_old_database_gets_transition_column(self, tmp_path):
+        path = str(tmp_path / 'outbox.sqlite3')
+        connection = sqlite3.connect(path)
+        connection.executescript(SCHEMA.replace(',\n    transition TEXT', ''))
+        connection.close()
+        outbox = Outbox(path)
+        tenant = Tenant(id='anna', token='token', chat_id='1')
+        assert outbox.put('a1', tenant, 'one', OCTOBER,
+                          transition=('1', None, 'approved', OCTOBER))
+        assert outbox.due(OCTOBER)[0].transition == (
+            '1', None, 'approved', OCTOBER)
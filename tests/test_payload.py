@@ -0,0 +1,132 @@
+import json
+
+import pytest
+import requests
+
+from poller.payload import Payload, PayloadCache, body_digest
+from poller.tenants import Tenant, current_tenant
+from utils import make_engine, make_registry
+
+
+class RawResponse:
+    """Ответ API с сырым телом, как у requests.Response."""
+
+    def __init__(self, data, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = json.dumps(data).encode() if data is not None else b''
+        self.decoded = 0
+
+    def json(self):
+        self.decoded += 1
+        return json.loads(self.content)
+
+
+@pytest.fixture
+def tenant():
+    tenant = Tenant(id='t0', token='token', chat_id='chat')
+    token = current_tenant.set(tenant)
+    yield tenant
+    current_tenant.reset(token)
+
+
+@pytest.fixture
+def cache(monkeypatch, homework_module):
+    cache = PayloadCache()
+    monkeypatch.setattr(homework_module, 'PAYLOAD_CACHE', cache)
+    return cache
+
+
+def serve(monkeypatch, *responses):
+    calls = []
+    responses = list(responses)
+
+    def get(**kwargs):
+        calls.append(kwargs)
+        return responses.pop(0)
+
+    monkeypatch.setattr(requests, 'get', get)
+    return calls
+
+
+HOMEWORKS = [{'homework_name': 'hw1', 'status': 'reviewing'}]
+
+
+class TestBodyDigest:
+
+    def test_current_date_ignored(self):
+        first, first_date = body_digest(
+            b'{"homeworks": [], "current_date": 100}')
+        second, second_date = body_digest(
+            b'{"homeworks": [], "current_date": 200}')
+        assert first == second
+        assert (first_date, second_date) == (100, 200)
+
+    def test_homeworks_change_digest(self):
+        first, _ = body_digest(b'{"homeworks": [], "current_date": 1}')
+        second, _ = body_digest(b'{"homeworks": [{}], "current_date": 1}')
+        assert first != second
+
+
+class TestUnchangedPayload:
+
+    def test_same_body_not_decoded(self, monkeypatch, tenant, cache,
+                                   homework_module):
+        second = RawResponse({'homeworks': HOMEWORKS, 'current_date': 20})
+        serve(monkeypatch,
+              RawResponse({'homeworks': HOMEWORKS, 'current_date': 10}),
+              second)
+        result = homework_module.get_api_answer(0)
+        assert isinstance(result, Payload) and not result.unchanged
+        tenant.digest = result.digest
+
+        result = homework_module.get_api_answer(0)
+        assert result.unchanged
+        assert result == {'current_date': 20}
+        assert second.decoded == 0
+        assert cache.ratio() == 0.5
+
+    def test_etag_sent_and_not_modified(self, monkeypatch, tenant, cache,
+                                        homework_module):
+        tenant.etag = '"v1"'
+        tenant.digest = 'digest'
+        calls = serve(monkeypatch, RawResponse(None, status_code=304))
+        result = homework_module.get_api_answer(0)
+        assert calls[0]['headers']['If-None-Match'] == '"v1"'
+        assert result.unchanged
+        assert cache.hits == 1
+
+    def test_new_etag_returned(self, monkeypatch, tenant, cache,
+                               homework_module):
+        serve(monkeypatch, RawResponse(
+            {'homeworks': [], 'current_date': 1}, headers={'ETag': '"v2"'}))
+        result = homework_module.get_api_answer(0)
+        assert result.etag == '"v2"'
+        assert not result.unchanged
+
+
+class TestEngineFastPath:
+
+    def cached_engine(self, responses, send):
+        checked = []
+        engine = make_engine(make_registry(),
+                             lambda timestamp: responses.pop(0),
+                             check=checked.append, send=send)
+        return engine, engine.registry.get('t0'), checked
+
+    def test_unchanged_skips_validation(self):
+        responses = [Payload({'homeworks': HOMEWORKS}, digest='d1'),
+                     Payload(digest='d1', unchanged=True)]
+        engine, tenant, checked = self.cached_engine(
+            responses, lambda message: True)
+        engine.poll(tenant)
+        engine.poll(tenant)
+        assert len(checked) == 1
+        assert tenant.digest == 'd1'
+
+    def test_validators_kept_until_delivered(self):
+        responses = [Payload({'homeworks': HOMEWORKS}, digest='d1')]
+        engine, tenant, _ = self.cached_engine(responses,
+                                               lambda message: False)
+        engine.poll(tenant)
+        assert tenant.digest is None
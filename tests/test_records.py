@@ -0,0 +1,72 @@
+import pytest
+
+from poller.diff import changed, homework_key, updated_at
+from poller.records import Homework, to_record
+from utils import make_engine, make_registry
+
+API_HOMEWORK = {
+    'id': 7,
+    'status': 'approved',
+    'homework_name': 'student__hw7.zip',
+    'reviewer_comment': 'Отлично!',
+    'date_updated': '2026-10-18T10:00:00Z',
+    'lesson_name': 'Спринт 7',
+}
+
+
+class TestHomework:
+
+    def test_keeps_only_needed_fields(self):
+        record = to_record(API_HOMEWORK)
+        assert record == Homework('7', 'student__hw7.zip', 'approved',
+                                  1792317600)
+        assert not hasattr(record, '__dict__')
+        assert to_record(record) is record
+
+    def test_reads_like_dict(self):
+        record = to_record(API_HOMEWORK)
+        assert record['status'] == 'approved'
+        assert record.get('homework_name') == 'student__hw7.zip'
+        assert record.get('reviewer_comment', 'нет') == 'нет'
+        assert record[2] == 'approved'
+        with pytest.raises(KeyError):
+            record['lesson_name']
+
+    def test_statuses_interned(self):
+        first = to_record({'status': ''.join(['appr', 'oved'])})
+        second = to_record({'status': ''.join(['approv', 'ed'])})
+        assert first.status is second.status
+
+    def test_diff_accepts_records(self):
+        record = to_record(API_HOMEWORK)
+        assert homework_key(record) == '7'
+        assert updated_at(record, 0) == 1792317600
+        assert updated_at(to_record({'id': 1}), 5) == 5
+        assert list(changed({'7': 'reviewing'}, [record])) == [('7', record)]
+
+
+class TestCheckResponse:
+
+    def test_returns_records(self, homework_module):
+        records = homework_module.check_response(
+            {'homeworks': [API_HOMEWORK], 'current_date': 0})
+        assert records == [to_record(API_HOMEWORK)]
+        assert homework_module.parse_status(records[0]).startswith(
+            'Изменился статус проверки работы "student__hw7.zip"')
+
+    def test_rejects_non_dict_homework(self, homework_module):
+        with pytest.raises(TypeError):
+            homework_module.check_response({'homeworks': ['hw']})
+
+    def test_engine_keeps_records(self, homework_module):
+        answer = {'homeworks': [dict(API_HOMEWORK)], 'current_date': 100}
+        sent = []
+        engine = make_engine(
+            make_registry(), lambda timestamp: answer, sent,
+            check=homework_module.check_response,
+            parse=homework_module.parse_status)
+        tenant = engine.registry.get('t0')
+        engine.run_once()
+        assert answer['homeworks'] == [to_record(API_HOMEWORK)]
+        assert tenant.statuses == {'7': 'approved'}
+        assert len(sent) == 1
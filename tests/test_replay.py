@@ -0,0 +1,131 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+import homework
+from poller.breaker import UpstreamError
+from poller.payload import Payload
+from poller.replay import (Recorder, ReplayApi, VirtualClock, load_trace,
+                           replay)
+from poller.tenants import Tenant, current_tenant
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+
+from bench_replay import build_engine, run, synthetic_trace  # noqa: E402
+
+OCTOBER = 1790812800
+
+
+def answer(status, current_date):
+    return {'homeworks': [{'id': 1, 'homework_name': 'hw1',
+                           'status': status,
+                           'date_updated': '2026-10-01T00:00:00Z'}],
+            'current_date': current_date}
+
+
+class TestReplay:
+
+    def test_recorder_round_trip(self, tmp_path):
+        path = tmp_path / 'trace.jsonl'
+        clock = VirtualClock(OCTOBER)
+        recorder = Recorder(str(path), clock=clock)
+        results = iter([answer('reviewing', OCTOBER),
+                        Payload({'current_date': OCTOBER + 600},
+                                unchanged=True),
+                        ConnectionError('нет сети')])
+
+        def fetch(timestamp):
+            result = next(results)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        recorded = recorder.wrap(fetch)
+        token = current_tenant.set(Tenant(id='anna', token='secret',
+                                          chat_id='1'))
+        try:
+            recorded(0)
+            clock.sleep(600)
+            recorded(OCTOBER)
+            clock.sleep(600)
+            with pytest.raises(ConnectionError):
+                recorded(OCTOBER)
+        finally:
+            current_tenant.reset(token)
+            recorder.close()
+        text = path.read_text(encoding='utf-8')
+        assert 'secret' not in text
+        trace = load_trace(text.splitlines())
+        assert [entry['time'] for entry in trace] == [
+            OCTOBER, OCTOBER + 600, OCTOBER + 1200]
+        assert trace[1] == {'time': OCTOBER + 600, 'tenant': 'anna',
+                            'from_date': OCTOBER, 'unchanged': True,
+                            'current_date': OCTOBER + 600}
+        assert trace[2]['error'] == 'ConnectionError'
+
+        api = ReplayApi(trace, VirtualClock(OCTOBER - 1))
+        token = current_tenant.set(Tenant(id='anna', token='', chat_id='1'))
+        try:
+            assert api(0)['homeworks'] == []
+            api.clock.now = OCTOBER + 700
+            replayed = api(OCTOBER)
+            assert replayed['homeworks'][0]['status'] == 'reviewing'
+            assert replayed['current_date'] == OCTOBER + 600
+            api.clock.now = OCTOBER + 1200
+            with pytest.raises(ConnectionError, match='нет сети'):
+                api(OCTOBER)
+        finally:
+            current_tenant.reset(token)
+        assert ReplayApi.error({'error': 'UpstreamError',
+                                'message': '502'}).__class__ is UpstreamError
+
+    def test_trace_has_every_subscriber(self, tmp_path, monkeypatch,
+                                        homework_module):
+        tenants = tmp_path / 'tenants.jsonl'
+        tenants.write_text('{"id": "anna", "token": "a", '
+                           '"chat_id": ["mum", "dad"]}\n', encoding='utf-8')
+        path = tmp_path / 'trace.jsonl'
+        monkeypatch.setattr(homework_module, 'TENANTS_FILE', str(tenants))
+        monkeypatch.setattr(homework_module, 'TELEGRAM_CHAT_ID', None)
+        monkeypatch.setattr(homework_module, 'TRACE_FILE', str(path))
+        calls = []
+
+        def fetch(timestamp):
+            calls.append(timestamp)
+            return answer('approved', OCTOBER)
+
+        engine = homework_module.create_engine(fetch, lambda message: True)
+        engine.run_once()
+        trace = load_trace(path.read_text(encoding='utf-8').splitlines())
+        assert len(calls) == 1
+        assert sorted(entry['tenant'] for entry in trace) == [
+            'anna:dad', 'anna:mum']
+
+    def test_week_replays_in_seconds_without_duplicates(self):
+        result = run(synthetic_trace(tenants=5, days=7))
+        # Статус меняется каждые 6 часов: 28 переходов за неделю.
+        assert result['messages'] == 5 * 28
+        assert result['duplicates'] == 0
+        assert result['wall'] < 10
+        for tenant in result['engine'].registry:
+            assert tenant.timestamp == (OCTOBER + 7 * 86400 - 600)
+
+    def test_errors_are_replayed_through_engine(self):
+        trace = [{'time': OCTOBER, 'tenant': 'anna', 'from_date': 0,
+                  'answer': answer('reviewing', OCTOBER)},
+                 {'time': OCTOBER + 600, 'tenant': 'anna',
+                  'from_date': OCTOBER, 'error': 'ConnectionError',
+                  'message': 'нет сети'},
+                 {'time': OCTOBER + 1200, 'tenant': 'anna',
+                  'from_date': OCTOBER, 'answer': answer('approved',
+                                                         OCTOBER + 1200)}]
+        clock = VirtualClock(OCTOBER)
+        api = ReplayApi(trace, clock)
+        sent = []
+        replay(build_engine(api, clock, sent), clock, api.end,
+               homework.RETRY_PERIOD)
+        messages = [message for chat, message in sent]
+        assert messages[0].startswith('Изменился статус проверки работы')
+        assert any('нет сети' in message for message in messages)
+        assert homework.HOMEWORK_VERDICTS['approved'] in messages[-1]
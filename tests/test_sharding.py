@@ -0,0 +1,126 @@
+import json
+
+from poller.replay import VirtualClock
+from poller.schedule import PollSchedule
+from poller.sharding import HashRing, LeaseBoard, Shard
+from poller.store import StateStore
+from poller.tenants import TenantRegistry
+from utils import make_engine, make_registry
+
+TENANTS = [f't{number}' for number in range(200)]
+
+
+def make_shard(path, worker, clock, ttl=90):
+    return Shard(LeaseBoard(str(path), worker, ttl, clock))
+
+
+class TestHashRing:
+
+    def test_balanced_and_stable(self):
+        two = HashRing(['a', 'b'])
+        three = HashRing(['a', 'b', 'c'])
+        owners = [two.owner(key) for key in TENANTS]
+        assert 60 < owners.count('a') < 140
+        moved = [key for key in TENANTS if two.owner(key) != three.owner(key)]
+        assert all(three.owner(key) == 'c' for key in moved)
+        assert len(moved) < len(TENANTS) / 2
+
+    def test_empty(self):
+        assert HashRing([]).owner('t0') is None
+
+
+class TestLeases:
+
+    def test_foreign_lease_taken_after_expiry(self, tmp_path):
+        clock = VirtualClock()
+        first = LeaseBoard(str(tmp_path / 'leases.db'), 'a', 30, clock)
+        second = LeaseBoard(str(tmp_path / 'leases.db'), 'b', 30, clock)
+        assert first.acquire(['t0']) == {'t0'}
+        assert second.acquire(['t0']) == set()
+        clock.now = 31
+        assert second.acquire(['t0']) == {'t0'}
+        assert first.acquire(['t0']) == set()
+
+    def test_rebalance_without_overlap(self, tmp_path):
+        clock = VirtualClock()
+        path = tmp_path / 'leases.db'
+        first = make_shard(path, 'a', clock)
+        assert first.assign(TENANTS) == set(TENANTS)
+
+        second = make_shard(path, 'b', clock)
+        taken = second.assign(TENANTS)
+        assert taken == set()
+        kept = first.assign(TENANTS)
+        taken = second.assign(TENANTS)
+        assert kept | taken == set(TENANTS)
+        assert not kept & taken
+        assert taken
+
+        second.leave()
+        assert first.assign(TENANTS) == set(TENANTS)
+
+
+class TestShardedEngines:
+
+    def test_each_tenant_notified_once(self, tmp_path):
+        clock = VirtualClock()
+        sent = []
+
+        def fetch(timestamp):
+            return {'homeworks': [{'homework_name': 'hw',
+                                   'status': 'approved'}],
+                    'current_date': timestamp + 1}
+
+        engines = []
+        for worker in ('a', 'b', 'c'):
+            engines.append(make_engine(
+                make_registry(ids=TENANTS[:30]), fetch, sent,
+                schedule=PollSchedule(idle=10, minimum=10, maximum=10),
+                clock=clock,
+                store=StateStore(str(tmp_path / 'state.db'), batch_size=1),
+                shard=make_shard(tmp_path / 'leases.db', worker, clock)))
+        for _ in range(6):
+            for engine in engines:
+                engine.run_once()
+            clock.now += 30
+        assert sorted(chat for chat, _ in sent) == sorted(TENANTS[:30])
+        assert all(engine.owned for engine in engines)
+
+    def test_subscribers_of_token_share_worker(self, tmp_path):
+        clock = VirtualClock()
+        lines = [json.dumps({'id': f'student-{number}',
+                             'token': f'token-{number}',
+                             'chat_id': ['mum', 'dad', 'me']})
+                 for number in range(20)]
+        engines = [
+            make_engine(TenantRegistry().load(lines, timestamp=0),
+                        lambda timestamp: {'homeworks': []}, clock=clock,
+                        shard=make_shard(tmp_path / 'leases.db', worker,
+                                         clock))
+            for worker in ('a', 'b', 'c')]
+        for _ in range(3):
+            for engine in engines:
+                engine.claim()
+        owners = {}
+        for engine in engines:
+            for tenant_id in engine.owned:
+                token = engine.registry.get(tenant_id).token
+                owners.setdefault(token, set()).add(engine.shard.board.worker)
+        assert len(owners) == 20
+        assert all(len(workers) == 1 for workers in owners.values())
+        assert sum(len(engine.owned) for engine in engines) == 60
+
+    def test_worker_writes_own_history(self, tmp_path, monkeypatch,
+                                       homework_module):
+        path = str(tmp_path / 'history.bin')
+        monkeypatch.setattr(homework_module, 'HISTORY_FILE', path)
+        monkeypatch.setattr(homework_module, 'STATE_DB',
+                            str(tmp_path / 'state.db'))
+        monkeypatch.setattr(homework_module, 'SHARD_DB',
+                            str(tmp_path / 'leases.db'))
+        logs = []
+        for worker in ('a', 'b'):
+            monkeypatch.setattr(homework_module, 'SHARD_WORKER', worker)
+            logs.append(homework_module.open_history(
+                homework_module.open_shard()))
+        assert [log.path for log in logs] == [f'{path}.a', f'{path}.b']
@@ -0,0 +1,47 @@
+from functools import partial
+
+import pytest
+import requests
+import telegram
+
+from poller.standin import StandIn
+from utils import make_engine, make_registry
+
+
+@pytest.fixture
+def standin(monkeypatch, homework_module):
+    with StandIn(homeworks=3, change_every=1) as standin:
+        monkeypatch.setattr(homework_module, 'ENDPOINT', standin.endpoint)
+        yield standin
+
+
+class TestStandIn:
+
+    def test_homework_statuses(self, standin, homework_module):
+        answer = homework_module.get_api_answer(0)
+        homework_module.check_response(answer)
+        assert len(answer['homeworks']) == 3
+        assert answer['homeworks'][0]['status'] == 'reviewing'
+        assert homework_module.get_api_answer(0)['homeworks'][0][
+            'status'] == 'rejected'
+        assert standin.polls == 2
+
+    def test_unauthorized(self, standin):
+        response = requests.get(standin.endpoint, params={'from_date': 0})
+        assert response.status_code == 401
+        assert response.json()['code'] == 'not_authenticated'
+
+    def test_pipeline_end_to_end(self, standin, homework_module):
+        bot = telegram.Bot(token='1234:abcdefg',
+                           base_url=standin.telegram_url)
+        engine = make_engine(
+            make_registry(ids=['42']), homework_module.get_api_answer,
+            check=homework_module.check_response,
+            parse=homework_module.parse_status,
+            send=partial(homework_module.send_message, bot))
+        engine.poll(engine.registry.get('42'))
+        assert standin.messages == 3
+        chats = {chat for chat, _ in standin.sent}
+        assert chats == {'42'}
+        assert standin.sent[-1][1].endswith(
+            homework_module.HOMEWORK_VERDICTS['reviewing'])
@@ -0,0 +1,23 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+
+from bench_startup import measure  # noqa: E402
+
+
+class TestStartup:
+
+    def test_import_loads_no_heavy_modules(self):
+        _, heavy = measure()
+        assert heavy == []
+
+    def test_check_tokens_before_telegram(self, monkeypatch,
+                                          homework_module):
+        monkeypatch.setattr(homework_module, 'TELEGRAM_TOKEN', None)
+        monkeypatch.delitem(sys.modules, 'telegram', raising=False)
+        with pytest.raises(ValueError):
+            homework_module.main()
+        assert 'telegram' not in sys.modules
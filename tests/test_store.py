@@ -0,0 +1,72 @@
+import sqlite3
+
+from poller.store import StateStore
+from poller.tenants import Tenant
+from utils import make_engine, make_registry
+
+
+class TestStateStore:
+
+    def test_state_survives_restart(self, tmp_path):
+        path = tmp_path / 'state.sqlite3'
+        store = StateStore(path)
+        tenant = make_registry().get('t0')
+        tenant.timestamp = 500
+        tenant.last_status = 'approved'
+        tenant.last_error = 'Произошел сбой: down'
+        store.save_tenant(tenant)
+        store.save_status(tenant, 'hw1', 'approved')
+        store.close()
+
+        registry = StateStore(path).load(make_registry(timestamp=900))
+        restored = registry.get('t0')
+        assert restored.timestamp == 500
+        assert restored.last_status == 'approved'
+        assert restored.last_error == 'Произошел сбой: down'
+        assert restored.statuses == {'hw1': 'approved'}
+
+    def test_unknown_tenants_ignored(self, tmp_path):
+        store = StateStore(tmp_path / 'state.sqlite3')
+        store.save_tenant(Tenant(id='gone', token='x', chat_id='y'))
+        store.flush()
+        registry = store.load(make_registry(timestamp=7))
+        assert registry.get('t0').timestamp == 7
+        assert registry.get('gone') is None
+
+    def test_writes_committed_in_batches(self, tmp_path):
+        path = tmp_path / 'state.sqlite3'
+        store = StateStore(path, batch_size=3)
+        tenant = make_registry().get('t0')
+
+        def committed():
+            connection = sqlite3.connect(path)
+            count, = connection.execute(
+                'SELECT COUNT(*) FROM statuses').fetchone()
+            connection.close()
+            return count
+
+        store.save_status(tenant, 'hw1', 'reviewing')
+        store.save_status(tenant, 'hw2', 'reviewing')
+        assert committed() == 0
+        store.save_status(tenant, 'hw3', 'reviewing')
+        assert committed() == 3
+        store.save_status(tenant, 'hw4', 'reviewing')
+        store.flush()
+        assert committed() == 4
+
+    def test_engine_persists_delivered_status(self, tmp_path):
+        path = tmp_path / 'state.sqlite3'
+        registry = make_registry(timestamp=100)
+
+        def fetch(timestamp):
+            return {'homeworks': [{'homework_name': 'hw1',
+                                   'status': 'reviewing'}],
+                    'current_date': 200}
+
+        engine = make_engine(registry, fetch, store=StateStore(path))
+        engine.run_once()
+
+        restored = StateStore(path).load(make_registry()).get('t0')
+        assert restored.timestamp == 200
+        assert restored.last_status == 'reviewing'
+        assert restored.statuses == {'hw1': 'reviewing'}
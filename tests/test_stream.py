@@ -0,0 +1,145 @@
+import json
+import tracemalloc
+
+import pytest
+
+from poller.deadline import Deadline, DeadlineExceeded, current_deadline
+from poller.metrics import CHECK_FAILURES
+from poller.stream import iter_homeworks, stream_payload
+from utils import make_engine, make_registry
+
+
+def chunked(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def generate_body(count):
+    """Тело большого ответа API, которое не держится в памяти целиком."""
+    yield b'{"homeworks": ['
+    for number in range(count):
+        separator = b',' if number else b''
+        yield separator + json.dumps({
+            'id': number,
+            'homework_name': f'user__homework_{number}.zip',
+            'status': 'approved',
+            'reviewer_comment': 'Всё нравится' * 5,
+            'date_updated': '2020-02-13T14:40:57Z',
+            'lesson_name': 'Итоговый проект',
+        }, ensure_ascii=False).encode()
+    yield b'], "current_date": 1581604970}'
+
+
+class ChunkedResponse:
+
+    def __init__(self, chunks, status_code=200):
+        self.chunks = chunks
+        self.status_code = status_code
+        self.headers = {}
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        return self.chunks
+
+    def close(self):
+        self.closed = True
+
+
+class TestIterHomeworks:
+
+    @pytest.mark.parametrize('size', [1, 7, 4096])
+    def test_same_as_json(self, size):
+        data = {
+            'current_date': 1581604970,
+            'homeworks': [
+                {'id': 1, 'homework_name': 'домашка', 'status': 'approved'},
+                {'id': 22, 'homework_name': 'hw2', 'status': 'reviewing'},
+            ],
+        }
+        meta = {}
+        body = json.dumps(data, ensure_ascii=False, indent=1).encode()
+        homeworks = list(iter_homeworks(chunked(body, size), meta))
+        assert homeworks == data['homeworks']
+        assert meta == {'current_date': 1581604970}
+
+    @pytest.mark.parametrize('body, error', [
+        (b'[{"homeworks": []}]', TypeError),
+        (b'{"current_date": 1}', TypeError),
+        (b'{"homeworks": {"status": "approved"}}', TypeError),
+        (b'{"code": "not_authenticated", "homeworks": []}', ValueError),
+        (b'{"homeworks": [{}', ValueError),
+    ])
+    def test_invalid_shape(self, body, error):
+        with pytest.raises(error):
+            list(iter_homeworks(chunked(body, 3), {}))
+
+    def test_peak_memory_bounded(self):
+        tracemalloc.start()
+        try:
+            count = 0
+            for _ in iter_homeworks(generate_body(20000), {}):
+                count += 1
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert count == 20000
+        # Целиком такой ответ занимает несколько мегабайт.
+        assert peak < 256 * 1024
+
+
+class TestStreamedPoll:
+
+    def test_engine_consumes_stream(self):
+        response = ChunkedResponse(generate_body(3))
+        checked = []
+        sent = []
+        engine = make_engine(
+            make_registry(), lambda timestamp: stream_payload(response, 64),
+            check=checked.append, parse=lambda homework: homework['id'],
+            send=lambda message: sent.append(message) or True)
+        tenant = engine.registry.get('t0')
+        engine.poll(tenant)
+        assert [answer['homeworks'][0]['id'] for answer in checked] == [
+            0, 1, 2]
+        assert sent == [2, 1, 0]
+        assert tenant.timestamp == 1581604970
+        assert response.closed
+
+    def streaming_engine(self, response, homework_module):
+        return make_engine(
+            make_registry(), lambda timestamp: stream_payload(response, 64),
+            check=homework_module.check_response,
+            parse=homework_module.parse_status)
+
+    def test_streamed_items_checked(self, homework_module):
+        response = ChunkedResponse(
+            [b'{"homeworks": [', b'"not a homework"], "current_date": 1}'])
+        engine = self.streaming_engine(response, homework_module)
+        before = CHECK_FAILURES.value(error='TypeError')
+        with pytest.raises(TypeError, match='homeworks'):
+            engine.prepare(engine.registry.get('t0'),
+                           stream_payload(response, 64))
+        assert CHECK_FAILURES.value(error='TypeError') == before + 1
+        assert response.closed
+
+    def test_stream_closed_when_deadline_cancels_check(self,
+                                                       homework_module):
+        response = ChunkedResponse(generate_body(3))
+        engine = self.streaming_engine(response, homework_module)
+        token = current_deadline.set(Deadline(0))
+        try:
+            with pytest.raises(DeadlineExceeded):
+                engine.prepare(engine.registry.get('t0'),
+                               stream_payload(response, 64))
+        finally:
+            current_deadline.reset(token)
+        assert response.closed
+
+    @pytest.mark.parametrize('status_code', [404, 502])
+    def test_stream_closed_on_error_status(self, homework_module,
+                                           status_code):
+        response = ChunkedResponse(iter(()), status_code)
+        with pytest.raises(ValueError):
+            homework_module.handle_response(
+                response, {'url': 'url', 'headers': {}, 'params': {}}, True)
+        assert response.closed
@@ -5,6 +5,10 @@ from http import HTTPStatus
 from inspect import signature
 from types import ModuleType
 
+from poller.engine import PollingEngine
+from poller.replay import VirtualClock
+from poller.tenants import Tenant, TenantRegistry, current_tenant
+
 
 def check_function(scope: ModuleType, func_name: str, params_qty: int = 0):
     """If scope has a function with specific name and params with qty."""
@@ -103,3 +107,40 @@ class MockTelegramBot:
 
 class BreakInfiniteLoop(Exception):
     pass
+
+
+def make_registry(count=1, timestamp=0, ids=None):
+    """Registry of tenants t0, t1, ... (or ids) with own tokens and chats.
+
+    Tenant tN gets token tokenN and chat chatN; a tenant from ids gets
+    token token-<id> and its id as the chat.
+    """
+    registry = TenantRegistry()
+    if ids is None:
+        for number in range(count):
+            registry.add(Tenant(id=f't{number}', token=f'token{number}',
+                                chat_id=f'chat{number}', timestamp=timestamp))
+        return registry
+    for tenant_id in ids:
+        registry.add(Tenant(id=tenant_id, token=f'token-{tenant_id}',
+                            chat_id=tenant_id, timestamp=timestamp))
+    return registry
+
+
+def make_engine(registry, fetch, sent=None, **options):
+    """PollingEngine with stub check and parse and a recording send.
+
+    send appends (chat_id, message) to sent and reports delivery; the
+    clock is a VirtualClock at 0. Any engine option can be overridden.
+    """
+    sent = [] if sent is None else sent
+
+    def send(message):
+        sent.append((current_tenant.get().chat_id, message))
+        return True
+
+    options.setdefault('check', lambda answer: None)
+    options.setdefault('parse', lambda homework: homework['status'])
+    options.setdefault('send', send)
+    options.setdefault('clock', VirtualClock())
+    return PollingEngine(registry, fetch=fetch, **options)